@@ -4,10 +4,15 @@ Photo Deduplication Tool - Flask Backend
 Stage 2: Core photo analysis with grouping and similarity detection
 """
 
-from flask import Flask, render_template_string, jsonify, request, send_file, session
+from flask import Flask, Response, render_template, jsonify, request, send_file, send_from_directory, session, url_for
 from flask_cors import CORS
+from werkzeug.security import safe_join
 from datetime import datetime
+from dataclasses import dataclass, fields, is_dataclass
 import traceback
+import logging
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import os
 import secrets
 import threading
@@ -15,16 +20,27 @@ import signal
 import sys
 import requests
 import time
-from photo_scanner import PhotoScanner
-from library_analyzer import LibraryAnalyzer
+from photo_scanner import PhotoScanner, PhotoData, PhotoGroup
+from library_analyzer import LibraryAnalyzer, LibraryStats, PhotoCluster
 from photo_tagger import PhotoTagger
 from lazy_photo_loader import LazyPhotoLoader
 from blur_detector import BlurDetector
 import json
 import os
+import re
 import tempfile
+import shutil
+import io
 from PIL import Image
+import numpy as np
 import hashlib
+from collections import deque, Counter
+import gzip
+import functools
+import heapq
+import sqlite3
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Enable HEIC/HEIF support
 try:
@@ -34,14 +50,167 @@ try:
 except ImportError:
     print("⚠️ pillow-heif not available - HEIC files may not work")
 
+# Fast thumbnail decoding - libvips shrinks JPEGs in the DCT domain while decoding
+try:
+    import pyvips
+    print("✅ pyvips thumbnail decoding enabled")
+except (ImportError, OSError):
+    pyvips = None
+    print("⚠️ pyvips not available - using OpenCV/PIL for thumbnails")
+
+# AVIF encoding for thumbnails (WebP is built into Pillow)
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF plugin with PIL
+except ImportError:
+    pass
+Image.init()
+AVIF_SUPPORTED = 'AVIF' in Image.SAVE or pyvips is not None
+if not AVIF_SUPPORTED:
+    print("⚠️ AVIF encoder not available - thumbnails will be served as WebP/JPEG")
+
+# Fast JSON serialization for large API payloads
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    print("⚠️ orjson not available - using standard JSON serialization")
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Serialize every jsonify() with orjson (Flask 2.2+ JSON providers)
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None
+
+if orjson is not None and DefaultJSONProvider is not None:
+    class OrjsonProvider(DefaultJSONProvider):
+        """orjson-backed jsonify() with the same output as Flask's default provider.
+        
+        Datetimes are passed through to Flask's default() so they keep the HTTP-date format.
+        dumps() calls with options orjson can't honour (e.g. the session serializer's
+        separators) go to the stdlib encoder instead.
+        """
+        # Quality scores can be numpy floats from the OpenCV analysis
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        
+        def dumps(self, obj, **kwargs):
+            if kwargs.keys() - {'sort_keys', 'indent', 'default'} or kwargs.get('indent') not in (None, 2):
+                return super().dumps(obj, **kwargs)
+            return self._orjson_dumps(obj, **kwargs).decode()
+        
+        def _orjson_dumps(self, obj, sort_keys=None, indent=None, default=None):
+            option = self.option
+            if self.sort_keys if sort_keys is None else sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return orjson.dumps(obj, default=default or self.default, option=option)
+        
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            # Same rule as DefaultJSONProvider.response: pretty-print in debug unless compact is set
+            indent = 2 if self.compact is False or (self.compact is None and self._app.debug) else None
+            return self._app.response_class(self._orjson_dumps(obj, indent=indent), mimetype=self.mimetype)
+    
+    app.json = OrjsonProvider(app)
+
+# Optional Celery offload for real photo analysis - enabled by CELERY_BROKER_URL (e.g. redis://localhost:6379/0)
+try:
+    from celery import Celery
+except ImportError:
+    Celery = None
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
+if Celery is not None and CELERY_BROKER_URL:
+    celery = Celery(app.name, broker=CELERY_BROKER_URL,
+                    backend=os.environ.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL))
+    # JSON only - PhotoGroup results go through encode_analysis_value(), so a worker never unpickles broker data
+    celery.conf.update(task_serializer='json', result_serializer='json', accept_content=['json'])
+else:
+    celery = None
+    if CELERY_BROKER_URL:
+        print("⚠️ CELERY_BROKER_URL set but celery not installed - analysis runs in-process")
+
+# Optional Redis mirror of analysis progress, readable from any worker process
+try:
+    import redis
+except ImportError:
+    redis = None
+PROGRESS_REDIS_URL = os.environ.get('PROGRESS_REDIS_URL') or CELERY_BROKER_URL
+progress_redis = redis.Redis.from_url(PROGRESS_REDIS_URL, decode_responses=True) if redis is not None and PROGRESS_REDIS_URL else None
+
+# Optional Redis copy of the cached_* analysis results, so worker processes share one analysis
+ANALYSIS_CACHE_REDIS_URL = os.environ.get('ANALYSIS_CACHE_REDIS_URL') or PROGRESS_REDIS_URL
+analysis_cache_redis = redis.Redis.from_url(ANALYSIS_CACHE_REDIS_URL) if redis is not None and ANALYSIS_CACHE_REDIS_URL else None
+
+# Brotli/gzip compression for JSON and HTML responses
+try:
+    from flask_compress import Compress
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_BR_LEVEL'] = 4
+    app.config['COMPRESS_LEVEL'] = 4  # gzip - /api/groups payloads are large and built per request
+    app.config['COMPRESS_MIN_SIZE'] = 512
+    # Text only - JPEG/WebP/AVIF thumbnails are already compressed
+    app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'text/javascript',
+                                        'application/javascript', 'application/json']
+    Compress(app)
+except ImportError:
+    print("⚠️ Flask-Compress not available - gzipping JSON responses with the standard library")
+    
+    @app.after_request
+    def gzip_json_response(response):
+        """Fallback for Flask-Compress: gzip JSON bodies (the /api/groups list can run to megabytes)."""
+        if (response.mimetype != 'application/json' or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or request.accept_encodings['gzip'] <= 0):
+            return response
+        body = response.get_data()
+        if len(body) < 1024:
+            return response
+        response.set_data(gzip.compress(body, compresslevel=4))
+        response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+
+# Per-client rate limiting for the endpoints that decode images on demand
+try:
+    from flask_limiter import Limiter
+    from flask_limiter.util import get_remote_address
+    app.config['RATELIMIT_HEADERS_ENABLED'] = True  # 429s carry Retry-After
+    limiter = Limiter(get_remote_address, app=app, default_limits=[])
+except ImportError:
+    limiter = None
+    print("⚠️ Flask-Limiter not available - thumbnail endpoints are not rate limited")
+
+def rate_limit(limit_value):
+    """Apply a Flask-Limiter limit to a route when the extension is installed."""
+    if limiter is None:
+        return lambda f: f
+    return limiter.limit(limit_value)
+
+# Structured error logging - tracebacks are only formatted when a handler accepts the record
+app.logger.setLevel(logging.INFO)
+log_handler = RotatingFileHandler(os.path.join(tempfile.gettempdir(), 'photo_dedup.log'),
+                                  maxBytes=5 * 1024 * 1024, backupCount=3)
+log_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(name)s] %(message)s'))
+app.logger.addHandler(log_handler)
+
+# Thumbnail hot-path logging is queued so worker threads never block on stdout; see start_background_services()
+thumbnail_log_queue = queue.Queue(-1)
+thumbnail_logger = logging.getLogger('thumbnail')
+thumbnail_logger.setLevel(logging.INFO)
+thumbnail_logger.addHandler(QueueHandler(thumbnail_log_queue))
+thumbnail_logger.propagate = False
+thumbnail_log_listener = QueueListener(thumbnail_log_queue, logging.StreamHandler(), log_handler)
+thumbnail_log_listener_pid = None  # Process the listener thread runs in
+
 # Configure session management for filter-to-dashboard data flow
 app.secret_key = secrets.token_hex(32)
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True for HTTPS in production
 app.config['PERMANENT_SESSION_LIFETIME'] = 3600  # 1 hour session timeout
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 3600  # Static files; thumbnails set their own max_age
 
 # Global instances
 scanner = PhotoScanner()
@@ -64,15 +233,88 @@ cached_library_stats = None
 cached_clusters = None
 cached_library_timestamp = None
 
+# Process-shared copy of the cached_* globals above (Redis, when configured)
+SHARED_ANALYSIS_CACHE_KEY = 'analysis:cached'
+SHARED_ANALYSIS_CACHE_TTL_SECONDS = 1800
+SHARED_ANALYSIS_CACHE_NAMES = ('cached_groups', 'cached_timestamp', 'cached_library_stats',
+                               'cached_clusters', 'cached_library_timestamp')
+shared_analysis_stamp = None  # Version of the shared copy this process last published or loaded
+
+def share_analysis_cache():
+    """Publish the cached_* analysis results so other worker processes reuse them instead of re-analyzing."""
+    global shared_analysis_stamp
+    if analysis_cache_redis is None:
+        return
+    stamp = str(time.time_ns()).encode()
+    try:
+        state = json.dumps(encode_analysis_value({name: globals()[name] for name in SHARED_ANALYSIS_CACHE_NAMES}))
+        pipe = analysis_cache_redis.pipeline()
+        pipe.setex(SHARED_ANALYSIS_CACHE_KEY, SHARED_ANALYSIS_CACHE_TTL_SECONDS, state)
+        pipe.setex(f"{SHARED_ANALYSIS_CACHE_KEY}:stamp", SHARED_ANALYSIS_CACHE_TTL_SECONDS, stamp)
+        pipe.execute()
+        shared_analysis_stamp = stamp
+    except (redis.RedisError, TypeError) as e:
+        app.logger.warning("Could not share analysis cache: %s", e)
+
+def load_shared_analysis_cache():
+    """Adopt cached_* results published by another worker since this process last looked.
+    
+    Only the small stamp key is read per request; the results are fetched when it changes, and
+    only the SHARED_ANALYSIS_CACHE_NAMES globals are replaced.
+    """
+    global shared_analysis_stamp
+    global cached_groups, cached_timestamp, cached_library_stats, cached_clusters, cached_library_timestamp
+    if analysis_cache_redis is None:
+        return
+    try:
+        stamp = analysis_cache_redis.get(f"{SHARED_ANALYSIS_CACHE_KEY}:stamp")
+        if stamp is None or stamp == shared_analysis_stamp:
+            return
+        data = analysis_cache_redis.get(SHARED_ANALYSIS_CACHE_KEY)
+        if data is None:
+            return
+        state = decode_analysis_value(json.loads(data))
+        cached_groups = state['cached_groups']
+        cached_timestamp = state['cached_timestamp']
+        cached_library_stats = state['cached_library_stats']
+        cached_clusters = state['cached_clusters']
+        cached_library_timestamp = state['cached_library_timestamp']
+        shared_analysis_stamp = stamp
+    except (redis.RedisError, ValueError, KeyError, TypeError) as e:
+        app.logger.warning("Could not load shared analysis cache: %s", e)
+
+def cached_analysis_response(endpoint, build_payload):
+    """JSON response built from the cached analysis, or a bodyless 304 if the client already has it.
+    
+    The ETag is the endpoint name plus cached_library_timestamp, which changes whenever the
+    analysis results are replaced, so polling clients skip rebuilding and re-serializing the JSON.
+    """
+    etag = f"{endpoint}-{int(cached_library_timestamp.timestamp() * 1000000)}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build_payload())
+    response.set_etag(etag)
+    response.last_modified = cached_library_timestamp.astimezone()
+    response.cache_control.no_cache = True  # Cache, but revalidate on every poll
+    return response
+
 # Analysis cache for streamlined workflow
 analysis_cache = {}
 CACHE_EXPIRY_MINUTES = 30
 MAX_CACHED_ANALYSES = 10
 
+# Real-analysis group results keyed by scan size, so a repeat run reuses its groups
+group_cache = {}
+GROUP_CACHE_TTL_SECONDS = 300
+MAX_CACHED_GROUP_RESULTS = 8
+
 # Server-side session storage to avoid large cookies
 server_side_sessions = {}
 
 # Progress tracking for long-running operations
+PROGRESS_LOG_SIZE = 50
+PROGRESS_REDIS_TTL_SECONDS = 3600
 progress_status = {
     'active': False,
     'cancelled': False,  # Flag to signal cancellation
@@ -81,8 +323,9 @@ progress_status = {
     'total': 0,
     'estimated_time': 0,
     'elapsed_time': 0,
-    'start_time': None,
-    'detail_log': [],
+    'start_time': None,  # time.monotonic() - local elapsed time
+    'started_at': None,  # time.time() - mirrored, so other processes can compute elapsed time
+    'detail_log': deque(maxlen=PROGRESS_LOG_SIZE),  # Capped ring - appends never reallocate
     'current_operation': '',
     'current_item': '',
     'items_processed': 0,
@@ -94,48 +337,174 @@ progress_status = {
 # Global thread reference for aggressive termination
 background_analysis_thread = None
 
+# Celery task running the current real analysis, when analysis is offloaded
+analysis_task_id = None
+
+# update_progress() coalesces per-item calls: stream subscribers and the Redis mirror are
+# refreshed at most every PROGRESS_FLUSH_INTERVAL_SECONDS, with the log lines collected in between
+PROGRESS_FLUSH_INTERVAL_SECONDS = 0.1
+PROGRESS_MIRROR_FIELDS = ('active', 'started_at', 'step', 'progress', 'total', 'tooltip', 'current_operation',
+                          'current_item', 'items_processed', 'total_items', 'sub_progress', 'sub_total')
+progress_last_flush = 0.0
+pending_progress_log = []
+
+# /api/progress/stream clients - each gets progress snapshots pushed onto its own queue
+progress_subscribers = set()
+progress_subscribers_lock = threading.Lock()
+PROGRESS_STREAM_KEEPALIVE_SECONDS = 15
+
 @app.route('/api/progress')
 def api_progress():
-    """API endpoint returning progress status for long-running operations."""
+    """API endpoint returning progress status for long-running operations.
+    
+    With Celery enabled, ?task_id= (default: the current analysis task) reports that task's state.
+    """
+    task_id = request.args.get('task_id') or analysis_task_id
+    if celery is not None and task_id:
+        result = celery.AsyncResult(task_id)
+        status = progress_snapshot()
+        status.update(read_progress(task_id) or (result.info if isinstance(result.info, dict) else {}))
+        status.update({'task_id': task_id, 'state': result.state, 'active': not result.ready()})
+        mirrored_progress_timing(status)
+        return jsonify(status)
+    
+    status = progress_snapshot()
+    if not status['active']:
+        # The analysis may be running in another worker process
+        mirrored = read_progress('local')
+        if mirrored and mirrored.get('active'):
+            status.update(mirrored)
+            mirrored_progress_timing(status)
+    return jsonify(status)
+
+@app.route('/api/progress/stream')
+def api_progress_stream():
+    """Server-Sent Events feed of progress_status, pushed whenever update_progress() changes it.
+    
+    Replaces per-second polling of /api/progress, which stays for older clients.
+    """
+    subscriber = queue.Queue(maxsize=32)
+    with progress_subscribers_lock:
+        progress_subscribers.add(subscriber)
+    
+    def event_stream():
+        try:
+            yield f"data: {json.dumps(progress_snapshot())}\n\n"
+            while True:
+                try:
+                    snapshot = subscriber.get(timeout=PROGRESS_STREAM_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(snapshot)}\n\n"
+        finally:
+            with progress_subscribers_lock:
+                progress_subscribers.discard(subscriber)
+    
+    response = Response(event_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx buffer the stream
+    return response
+
+def progress_snapshot():
+    """Copy of progress_status with elapsed and estimated remaining time filled in."""
     global progress_status
     
     if progress_status['active'] and progress_status['start_time']:
-        import time
-        elapsed = time.time() - progress_status['start_time']
-        progress_status['elapsed_time'] = elapsed
-        
-        # Estimate remaining time based on current progress
-        if progress_status['progress'] > 0:
-            rate = progress_status['progress'] / elapsed
-            remaining_items = progress_status['total'] - progress_status['progress']
-            estimated_remaining = remaining_items / rate if rate > 0 else 0
-            progress_status['estimated_time'] = estimated_remaining
+        progress_timing(progress_status, time.monotonic() - progress_status['start_time'])
     
-    return jsonify(progress_status)
+    snapshot = dict(progress_status)
+    snapshot['detail_log'] = list(progress_status['detail_log'])
+    return snapshot
+
+def progress_timing(status, elapsed):
+    """Set elapsed_time and, from the progress rate so far, estimated_time (seconds remaining)."""
+    status['elapsed_time'] = elapsed
+    
+    # Estimate remaining time based on current progress
+    if status.get('progress', 0) > 0 and elapsed > 0:
+        rate = status['progress'] / elapsed
+        remaining_items = status.get('total', 0) - status['progress']
+        status['estimated_time'] = remaining_items / rate if rate > 0 else 0
+
+def mirrored_progress_timing(status):
+    """progress_timing() for progress read from another process, via its wall-clock started_at.
+    
+    Monotonic clocks are per process, so only the wall-clock start is mirrored.
+    """
+    if status.get('active') and status.get('started_at'):
+        progress_timing(status, max(0.0, time.time() - status['started_at']))
+
+def progress_log_entry(step, tooltip="", current_operation="", current_item="", items_processed=0, total_items=0):
+    """One timestamped line for the progress detail log."""
+    timestamp = time.strftime("%H:%M:%S")
+    if current_item:
+        return f"{timestamp} - {current_operation}: {current_item} ({items_processed}/{total_items})"
+    return f"{timestamp} - {step}: {tooltip}"
+
+def mirror_progress(key, fields, log_entries=(), reset=False):
+    """Write progress fields into the Redis hash progress:<key> and cap its log at PROGRESS_LOG_SIZE."""
+    if progress_redis is None:
+        return
+    try:
+        pipe = progress_redis.pipeline()
+        if reset:
+            pipe.delete(f"progress:{key}", f"progress:{key}:log")
+        pipe.hset(f"progress:{key}", mapping={name: json.dumps(value) for name, value in fields.items()})
+        if log_entries:
+            pipe.lpush(f"progress:{key}:log", *log_entries)
+            pipe.ltrim(f"progress:{key}:log", 0, PROGRESS_LOG_SIZE - 1)
+        pipe.expire(f"progress:{key}", PROGRESS_REDIS_TTL_SECONDS)
+        pipe.expire(f"progress:{key}:log", PROGRESS_REDIS_TTL_SECONDS)
+        pipe.execute()
+    except redis.RedisError as e:
+        app.logger.warning("Could not mirror progress to Redis: %s", e)
+
+def read_progress(key):
+    """Progress fields and detail log mirrored under key, or None if Redis has nothing for it."""
+    if progress_redis is None:
+        return None
+    try:
+        fields = progress_redis.hgetall(f"progress:{key}")
+        if not fields:
+            return None
+        status = {name: json.loads(value) for name, value in fields.items()}
+        status['detail_log'] = progress_redis.lrange(f"progress:{key}:log", 0, -1)[::-1]
+        return status
+    except redis.RedisError as e:
+        app.logger.warning("Could not read progress from Redis: %s", e)
+        return None
+
+def publish_progress():
+    """Push the current progress to every /api/progress/stream client."""
+    with progress_subscribers_lock:
+        if not progress_subscribers:
+            return
+        subscribers = list(progress_subscribers)
+    snapshot = progress_snapshot()
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(snapshot)
+        except queue.Full:
+            pass  # Slow client - it will catch up from the next snapshot
 
 def update_progress(step, progress=0, total=0, tooltip="", current_operation="", current_item="", items_processed=0, total_items=0):
     """Update progress status for long-running operations with detailed logging."""
     global progress_status
-    import time
     
-    if not progress_status['active']:
-        progress_status['start_time'] = time.time()
+    starting = not progress_status['active']
+    if starting:
+        progress_status['start_time'] = time.monotonic()  # Elapsed time must not jump with the wall clock
+        progress_status['started_at'] = time.time()
         progress_status['active'] = True
-        progress_status['detail_log'] = []  # Clear previous logs
-    
-    # Add to detail log
-    timestamp = time.strftime("%H:%M:%S")
-    if current_item:
-        log_entry = f"{timestamp} - {current_operation}: {current_item} ({items_processed}/{total_items})"
-    else:
-        log_entry = f"{timestamp} - {step}: {tooltip}"
+        progress_status['detail_log'].clear()  # Clear previous logs
+        pending_progress_log.clear()
     
+    # Add to detail log - the deque drops the oldest entry past PROGRESS_LOG_SIZE
+    log_entry = progress_log_entry(step, tooltip, current_operation, current_item, items_processed, total_items)
     progress_status['detail_log'].append(log_entry)
-    # Keep only last 50 log entries to prevent memory issues
-    if len(progress_status['detail_log']) > 50:
-        progress_status['detail_log'] = progress_status['detail_log'][-50:]
     
-    progress_status.update({
+    fields = {
         'step': step,
         'progress': progress,
         'total': total,
@@ -146,1718 +515,782 @@ def update_progress(step, progress=0, total=0, tooltip="", current_operation="",
         'total_items': total_items,
         'sub_progress': items_processed,
         'sub_total': total_items
-    })
+    }
+    progress_status.update(fields)
+    pending_progress_log.append(log_entry)
     
-    if current_item:
-        print(f"📊 Progress: {step} ({progress}/{total}) - {current_operation}: {current_item} ({items_processed}/{total_items})")
-    else:
-        print(f"📊 Progress: {step} ({progress}/{total}) - {tooltip}")
+    # Per-item calls only touch the dict; subscribers and Redis see at most one update per interval
+    if starting or time.monotonic() - progress_last_flush >= PROGRESS_FLUSH_INTERVAL_SECONDS:
+        flush_progress(reset=starting)
+    app.logger.debug("Progress: %s (%s/%s) - %s", step, progress, total, log_entry)
+
+def flush_progress(reset=False):
+    """Push the latest progress to stream subscribers and the Redis mirror, with every log line since the last push."""
+    global progress_last_flush
+    progress_last_flush = time.monotonic()
+    log_entries = pending_progress_log[:]
+    pending_progress_log.clear()
+    
+    publish_progress()
+    mirror_progress('local', {name: progress_status.get(name) for name in PROGRESS_MIRROR_FIELDS},
+                    log_entries, reset=reset)
+
+def analyze_scanned_photos(photos, progress_callback=None):
+    """Steps 2-4 of real analysis: time/camera grouping, quality scoring, visual-similarity filtering."""
+    progress_callback = progress_callback or update_progress
+    progress_callback("Grouping photos", 2, 4, f"Creating groups from {len(photos):,} photos using 10-second windows and camera matching...")
+    groups = scanner.group_photos_by_time_and_camera(photos)
+    
+    progress_callback("Analyzing image quality", 3, 4, f"Computing quality scores for {len(groups):,} photo groups using sharpness and composition analysis...")
+    groups = scanner.enhanced_grouping_with_similarity(groups, progress_callback=progress_callback)
+    
+    progress_callback("Filtering by visual similarity", 4, 4, f"Comparing visual similarity to prevent unrelated photos in same group (70% threshold)...")
+    return scanner.filter_groups_by_visual_similarity(groups, similarity_threshold=50.0)
+
+if celery is not None:
+    @celery.task(bind=True)
+    def analyze_task(self, scan_limit):
+        """Real photo analysis on a Celery worker; progress is published through the task state."""
+        started_at = time.time()
+        
+        def report(step, progress=0, total=0, tooltip="", current_operation="", current_item="", items_processed=0, total_items=0):
+            fields = {
+                'step': step,
+                'progress': progress,
+                'total': total,
+                'tooltip': tooltip,
+                'current_operation': current_operation,
+                'current_item': current_item,
+                'items_processed': items_processed,
+                'total_items': total_items,
+                'started_at': started_at
+            }
+            self.update_state(state='PROGRESS', meta=fields)
+            mirror_progress(self.request.id, fields,
+                            [progress_log_entry(step, tooltip, current_operation, current_item, items_processed, total_items)])
+        
+        report("Scanning Photos library", 1, 4, "Scanning photos...")
+        photos = scanner.scan_photos(limit=scan_limit)
+        if not photos:
+            return []
+        return encode_analysis_value(analyze_scanned_photos(photos, progress_callback=report))
+
+# Fixed-shape payloads, built once at import rather than per call
+COMPLETE_PROGRESS_FIELDS = {
+    'active': False,
+    'cancelled': False,  # Reset cancellation flag when completing
+    'step': 'Complete',
+    'progress': 0,
+    'total': 0,
+    'estimated_time': 0,
+    'elapsed_time': 0,
+    'start_time': None,
+    'started_at': None,
+    'tooltip': ''
+}
+COMPLETE_PROGRESS_MIRROR = {'active': False, 'step': 'Complete', 'progress': 0, 'total': 0}
+CLEAR_CACHE_RESPONSE = (orjson.dumps if orjson is not None else lambda obj: json.dumps(obj).encode())(
+    {'success': True, 'message': 'All caches cleared for unified data consistency'})
 
 def complete_progress():
     """Mark progress as complete."""
     global progress_status
-    progress_status.update({
-        'active': False,
-        'cancelled': False,  # Reset cancellation flag when completing
-        'step': 'Complete',
-        'progress': 0,
-        'total': 0,
-        'estimated_time': 0,
-        'elapsed_time': 0,
-        'start_time': None,
-        'tooltip': ''
-    })
+    if pending_progress_log:
+        flush_progress()  # Last coalesced lines still belong in the mirrored log
+    progress_status.update(COMPLETE_PROGRESS_FIELDS)
+    publish_progress()
+    mirror_progress('local', COMPLETE_PROGRESS_MIRROR)
 
 @app.route('/api/clear-cache')
 def clear_cache():
-    """Clear all cached data to ensure unified data consistency."""
+    """Clear all cached data to ensure unified data consistency.
+    
+    ?group_id=, ?camera_model= and ?time_window=<start>/<end> (ISO 8601) instead evict only the
+    matching analysis groups, keeping the rest of the cached analysis.
+    """
     global cached_groups, cached_timestamp, cached_library_stats, cached_clusters, cached_library_timestamp
+    criteria = {name: request.args.get(name) for name in ('group_id', 'camera_model', 'time_window')}
+    if any(criteria.values()):
+        try:
+            if criteria['time_window']:
+                criteria['time_window'] = parse_time_window(criteria['time_window'])
+        except ValueError:
+            return jsonify({'error': 'time_window must be <start>/<end> in ISO 8601'}), 400
+        evicted = evict_cached_groups(**criteria)
+        return jsonify({'success': True, 'message': f'Evicted {evicted} cached groups', 'evicted_groups': evicted})
+    
     cached_groups = None
     cached_timestamp = None
     cached_library_stats = None
     cached_clusters = None
     cached_library_timestamp = None
-    return jsonify({'success': True, 'message': 'All caches cleared for unified data consistency'})
+    share_analysis_cache()  # Other workers pick up the cleared state
+    group_cache.clear()
+    scanner.reset_photosdb()
+    clear_library_snapshots()
+    photo_source_paths.cache_clear()
+    return app.response_class(CLEAR_CACHE_RESPONSE, mimetype='application/json')
+
+# Photos UUIDs - checked before any lookup or filesystem work, and before a uuid is used in a path
+UUID_RE = re.compile(r'[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}', re.IGNORECASE)
 
 # Thumbnail cache directory
 THUMBNAIL_DIR = os.path.join(tempfile.gettempdir(), 'photo_dedup_thumbnails')
 os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+# Sharded by the first two hex characters of the cache key - keeps each directory to a few hundred entries
+THUMBNAIL_SHARDS = [f"{i:02x}" for i in range(256)]
+THUMBNAIL_MANIFEST_PATH = os.path.join(THUMBNAIL_DIR, 'thumbnails.db')
+for shard in THUMBNAIL_SHARDS:
+    os.makedirs(os.path.join(THUMBNAIL_DIR, shard), exist_ok=True)
+    os.makedirs(os.path.join(THUMBNAIL_DIR, 'blur_analysis', shard), exist_ok=True)
+THUMBNAIL_SIZE = 600
+THUMBNAIL_WIDTHS = (300, 600, 1200)  # ?w= is snapped to one of these so the cache can't be flooded with sizes
+THUMBNAIL_MAX_AGE = 31536000  # Only for URLs that change with the content - let browsers keep them for a year
+THUMBNAIL_REVALIDATE_MAX_AGE = 300  # /api/thumbnail/<uuid> stays the same when the original is edited - recheck the ETag
+THUMBNAIL_WAIT_SECONDS = 90  # iCloud exports alone may take up to 60s
+VIDEO_EXTENSIONS = frozenset({'.mov', '.mp4', '.avi', '.m4v', '.hevc', '.3gp'})
+THUMBNAIL_DERIVATIVE_MAX_BYTES = 2_000_000  # Larger "derivatives" are near-original renders
+THUMBNAIL_WARM_GROUPS = 20  # Groups whose thumbnails are pre-generated right after analysis
+THUMBNAIL_MEMORY_CACHE_SIZE = 256  # Encoded thumbnails kept in memory (~50KB each)
+THUMBNAIL_RESAMPLE_MODES = ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'YCbCr')  # PIL filters these directly; palettes fall back to NEAREST
+HIGH_QUALITY_THUMBS = os.environ.get('HIGH_QUALITY_THUMBS', '').lower() in ('1', 'true', 'yes')
+# 600px tiles are displayed at 2x, so BICUBIC; the 200px blur-analysis thumbnails use BILINEAR
+THUMBNAIL_RESAMPLE = Image.Resampling.LANCZOS if HIGH_QUALITY_THUMBS else Image.Resampling.BICUBIC
+BLUR_THUMBNAIL_RESAMPLE = Image.Resampling.LANCZOS if HIGH_QUALITY_THUMBS else Image.Resampling.BILINEAR
+# Zero-copy delivery of cached thumbnails when fronted by a web server (see README "Serving behind nginx")
+THUMBNAIL_ACCEL_PREFIX = os.environ.get('THUMBNAIL_ACCEL_PREFIX')  # nginx internal location, e.g. /internal-thumbnails/
+app.use_x_sendfile = os.environ.get('USE_X_SENDFILE') == '1'  # Apache mod_xsendfile / lighttpd
+THUMBNAIL_RATE_LIMIT = '600 per minute'  # A results page requests a few hundred thumbnails at once
+THUMBNAIL_DECODE_WAIT_SECONDS = 5  # Request threads give up with 429 rather than pile up behind decodes
 
-@app.route('/')
-def index():
-    """Main blur detection interface for photo quality analysis."""
+# Background thumbnail generation, pre-warmed from /api/groups
+thumbnail_executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+thumbnail_futures = {}
+thumbnail_futures_lock = threading.Lock()
+_encode_buffers = threading.local()
+_manifest_connections = threading.local()
+# Caps full-size decodes across the thumbnail executor and request-thread thumbnailers
+_decode_semaphore = threading.BoundedSemaphore(os.cpu_count())
+
+def thumbnail_cache_key(photo_path, size=THUMBNAIL_SIZE):
+    """Name of a photo's cached thumbnail: hash of path, mtime, file size and thumbnail width.
+    
+    One stat instead of reading the file - an edited original gets a new key.
+    """
+    st = os.stat(photo_path)
+    return hashlib.blake2b(f"{photo_path}|{st.st_mtime}|{st.st_size}|{size}".encode(), digest_size=8).hexdigest()
+
+def thumbnail_width(requested):
+    """Snap a requested ?w= to the nearest supported thumbnail width."""
+    if not requested:
+        return THUMBNAIL_SIZE
+    return min(THUMBNAIL_WIDTHS, key=lambda width: abs(width - requested))
+
+def thumbnail_encode_buffer():
+    """This thread's reusable BytesIO, emptied - saves allocating a fresh buffer per encode."""
+    buffer = getattr(_encode_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _encode_buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return buffer
+
+def generate_photo_thumbnail(photo_path, size=THUMBNAIL_SIZE):
+    """Encode a JPEG thumbnail of photo_path in memory, avoiding a full-resolution decode where possible.
+    
+    Returns the JPEG bytes; writing them to the cache is left to write_thumbnail_cache().
+    """
+    with _decode_semaphore:
+        return _encode_photo_thumbnail(photo_path, size)
+
+def _encode_photo_thumbnail(photo_path, size):
+    # Method 1: libvips shrink-on-load
+    if pyvips is not None:
+        try:
+            thumb = pyvips.Image.thumbnail(photo_path, size, height=size, size='down')
+            return thumb.jpegsave_buffer(Q=85, strip=True)
+        except pyvips.Error as e:
+            thumbnail_logger.warning("pyvips could not thumbnail %s: %s", photo_path, e)
+    
+    # Method 2: OpenCV reduced decode (libjpeg-turbo scales 1/2, 1/4 or 1/8 during IDCT)
+    import cv2
+    with Image.open(photo_path) as probe:
+        longest_side = max(probe.size)
+    reduce_flag = cv2.IMREAD_COLOR
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if longest_side // factor >= size:
+            reduce_flag = flag
+            break
+    img = cv2.imread(photo_path, reduce_flag)
+    if img is not None:
+        height, width = img.shape[:2]
+        scale = size / max(height, width)
+        if scale < 1:
+            img = cv2.resize(img, (max(1, int(width * scale)), max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if ok:
+            return encoded.tobytes()
+    
+    # Method 3: PIL (HEIC and anything OpenCV can't decode)
+    with Image.open(photo_path) as img:
+        if img.format == 'JPEG':
+            # libjpeg scales 1/2, 1/4 or 1/8 in the DCT domain and decodes straight to RGB
+            img.draft('RGB', (size, size))
+        # Colour-convert after shrinking, so it touches thumbnail pixels rather than the full image
+        if img.mode not in THUMBNAIL_RESAMPLE_MODES:
+            img = img.convert('RGB')
+        img.thumbnail((size, size), THUMBNAIL_RESAMPLE)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        buffer = thumbnail_encode_buffer()
+        img.save(buffer, 'JPEG', quality=85, progressive=False, subsampling='4:2:0')
+        return buffer.getvalue()
+
+@functools.lru_cache(maxsize=THUMBNAIL_MEMORY_CACHE_SIZE)
+def cached_photo_thumbnail(photo_uuid, photo_path, mtime, size=THUMBNAIL_SIZE):
+    """Encoded thumbnail bytes memoised per (uuid, source mtime), so rebuilds skip the decode.
+    
+    Covers requests that arrive before the async cache write lands. Cleared on SIGHUP.
+    """
+    return generate_photo_thumbnail(photo_path, size)
+
+# Linux: write thumbnails into an unnamed O_TMPFILE inode and link it in once complete
+ATOMIC_TMPFILE = hasattr(os, 'O_TMPFILE') and os.path.isdir('/proc/self/fd')
+
+def atomic_write(path, data):
+    """Write bytes so readers never see a partial file.
+    
+    With O_TMPFILE the file has no name until it is fully written, so a crash leaves nothing behind;
+    elsewhere (macOS) it is a temp file in the same directory + os.replace.
+    """
+    if ATOMIC_TMPFILE:
+        try:
+            fd = os.open(os.path.dirname(path), os.O_TMPFILE | os.O_WRONLY, 0o644)
+        except OSError:
+            pass  # Filesystem without O_TMPFILE support - use the temp file below
+        else:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                try:
+                    os.link(f'/proc/self/fd/{fd}', path)
+                except FileExistsError:
+                    # link() won't replace - give it a unique name first, then rename over the old file
+                    temp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+                    os.link(f'/proc/self/fd/{fd}', temp_path)
+                    os.replace(temp_path, path)
+            return
+    
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
     try:
-        with open('blur_detection_interface.html', 'r') as f:
-            return f.read()
-    except Exception as e:
-        print(f"Error serving blur detection interface: {e}")
-        return f"Error loading blur detection interface: {e}", 500
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
 
-@app.route('/filters')
-def filters():
-    """Redirect to main blur detection interface."""
+def write_thumbnail_cache(photo_uuid, thumbnail_path, data, size=THUMBNAIL_SIZE):
+    """Persist freshly encoded thumbnail bytes and their AVIF/WebP variants."""
     try:
-        with open('blur_detection_interface.html', 'r') as f:
-            return f.read()
+        atomic_write(thumbnail_path, data)
+        encode_thumbnail_variants(thumbnail_path, data)
+        record_thumbnail(photo_uuid, thumbnail_path, size)
     except Exception as e:
-        print(f"Error serving blur detection interface: {e}")
-        return f"Error loading blur detection interface: {e}", 500
+        thumbnail_logger.warning("Could not write thumbnail cache %s: %s", thumbnail_path, e)
+    finally:
+        # Requests that arrived while the file was being written joined the in-flight job
+        with thumbnail_futures_lock:
+            thumbnail_futures.pop((photo_uuid, size), None)
 
-@app.route('/legacy')
-def legacy():
-    """Legacy interface for detailed photo analysis."""
-    html_template = '''
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Photo Dedup Tool</title>
-        <link rel="icon" type="image/svg+xml" href="data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 32 32'%3E%3Crect x='3' y='5' width='18' height='14' rx='2' fill='%23e0e0e0' stroke='%23999' stroke-width='1'/%3E%3Crect x='3' y='5' width='18' height='2' fill='%23999'/%3E%3Crect x='5' y='8' width='3' height='2' rx='1' fill='%23666'/%3E%3Ccircle cx='16' cy='12' r='2' fill='%23666'/%3E%3Crect x='11' y='13' width='18' height='14' rx='2' fill='%23fff' stroke='%23666' stroke-width='1'/%3E%3Crect x='11' y='13' width='18' height='2' fill='%23666'/%3E%3Crect x='13' y='16' width='3' height='2' rx='1' fill='%23333'/%3E%3Ccircle cx='24' cy='20' r='2' fill='%23333'/%3E%3C/svg%3E">
-        <style>
-            body { 
-                font-family: Arial, sans-serif; 
-                max-width: 1200px; 
-                margin: 0 auto; 
-                padding: 20px;
-                background-color: #f5f5f5;
-            }
-            .header {
-                background-color: white;
-                padding: 20px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                margin-bottom: 20px;
-            }
-            .stats {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                gap: 15px;
-                margin-top: 20px;
-            }
-            .stat-card {
-                background-color: white;
-                padding: 15px;
-                border-radius: 8px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                text-align: center;
-            }
-            .stat-number {
-                font-size: 2em;
-                font-weight: bold;
-                color: #2196F3;
-            }
-            .stat-label {
-                color: #666;
-                margin-top: 5px;
-            }
-            .status {
-                margin-top: 20px;
-                padding: 15px;
-                border-radius: 8px;
-                text-align: center;
-            }
-            .success { background-color: #dff0d8; color: #3c763d; border: 1px solid #d6e9c6; }
-            .error { background-color: #f2dede; color: #a94442; border: 1px solid #ebccd1; }
-            .loading { background-color: #d9edf7; color: #31708f; border: 1px solid #bce8f1; }
-            
-            .controls {
-                background-color: white;
-                padding: 15px;
-                border-radius: 8px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                margin-top: 20px;
-                text-align: center;
-            }
-            
-            .btn {
-                background-color: #2196F3;
-                color: white;
-                border: none;
-                padding: 10px 20px;
-                border-radius: 5px;
-                cursor: pointer;
-                margin: 5px;
-                font-size: 16px;
-            }
-            .btn:hover { background-color: #1976D2; }
-            .btn:disabled { background-color: #ccc; cursor: not-allowed; }
-            .btn-primary { background-color: #28a745; }
-            .btn-primary:hover { background-color: #218838; }
-            
-            .groups-container {
-                margin-top: 20px;
-            }
-            
-            .group-card {
-                background-color: white;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                margin-bottom: 20px;
-                overflow: hidden;
-            }
-            
-            .group-header {
-                background-color: #f8f9fa;
-                padding: 15px;
-                border-bottom: 1px solid #dee2e6;
-            }
-            
-            .group-title {
-                font-size: 18px;
-                font-weight: bold;
-                color: #333;
-                margin-bottom: 5px;
-            }
-            
-            .group-meta {
-                font-size: 14px;
-                color: #666;
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                gap: 10px;
-                margin-top: 10px;
-            }
-            
-            .photos-grid {
-                display: grid;
-                grid-template-columns: repeat(auto-fit, minmax(500px, 1fr));
-                gap: 20px;
-                padding: 20px;
-            }
-            
-            .photo-card {
-                border: 1px solid #e2e8f0;
-                border-radius: 12px;
-                padding: 20px;
-                margin: 12px;
-                text-align: center;
-                transition: all 0.3s ease;
-                background-color: white;
-                position: relative;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            }
-            
-            .photo-card:hover {
-                transform: translateY(-2px);
-                box-shadow: 0 8px 25px rgba(0,0,0,0.12);
-            }
-            
-            .photo-card.recommended {
-                border-color: #ffc107;
-                background-color: #fff9e6;
-                box-shadow: 0 4px 12px rgba(255, 193, 7, 0.2);
-            }
-            
-            .photo-card.recommended::before {
-                content: "⭐ RECOMMENDED";
-                position: absolute;
-                top: 12px;
-                left: 12px;
-                background: #ffc107;
-                color: #212529;
-                padding: 4px 8px;
-                border-radius: 4px;
-                font-size: 0.75rem;
-                font-weight: bold;
-                z-index: 2;
-                box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-            }
-            
-            .photo-card.selected {
-                border: 3px solid #ef4444;
-                background: linear-gradient(rgba(239, 68, 68, 0.03), rgba(239, 68, 68, 0.08));
-                box-shadow: 0 4px 16px rgba(239, 68, 68, 0.25);
-            }
-            
-            .photo-card.selected .photo-thumbnail {
-                opacity: 0.7;
-                position: relative;
-            }
-            
-            .photo-card.selected .photo-thumbnail::after {
-                content: "MARKED FOR DELETION";
-                position: absolute;
-                top: 50%;
-                left: 50%;
-                transform: translate(-50%, -50%);
-                background: rgba(239, 68, 68, 0.9);
-                color: white;
-                padding: 8px 16px;
-                border-radius: 6px;
-                font-weight: 600;
-                font-size: 0.9rem;
-                box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-            }
-            
-            .photo-action-button {
-                transition: all 0.2s ease;
-            }
-            
-            .photo-action-button:hover {
-                transform: scale(1.02);
-                box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-            }
-            
-            .photo-action-button.mark-delete:hover {
-                background: #dc2626 !important;
-                box-shadow: 0 4px 12px rgba(239, 68, 68, 0.3) !important;
-            }
-            
-            .photo-action-button.remove-mark:hover {
-                background: #4b5563 !important;
-                box-shadow: 0 4px 12px rgba(107, 114, 128, 0.3) !important;
-            }
-            
-            .photo-thumbnail {
-                width: 100%;
-                max-width: 500px;
-                height: 400px;
-                object-fit: contain;
-                border-radius: 8px;
-                margin-bottom: 10px;
-                background-color: #f5f5f5;
-            }
-            
-            .photo-loading {
-                width: 100%;
-                height: 400px;
-                background-color: #f0f0f0;
-                border-radius: 8px;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                color: #666;
-                margin-bottom: 10px;
-            }
-            
-            .photo-info {
-                font-size: 12px;
-                color: #666;
-                margin-top: 5px;
-            }
-            
-            .photo-filename {
-                font-weight: bold;
-                color: #333;
-                margin-bottom: 5px;
-                font-size: 14px;
-            }
-            
-            
-            .photo-filename {
-                cursor: pointer;
-                color: #2196F3;
-                text-decoration: underline;
-            }
-            
-            .photo-filename:hover {
-                color: #1976D2;
-            }
-            
-            .photo-thumbnail {
-                cursor: pointer;
-            }
-            
-            /* Full-screen preview modal */
-            .preview-modal {
-                display: none;
-                position: fixed;
-                top: 0;
-                left: 0;
-                width: 100vw;
-                height: 100vh;
-                background-color: rgba(0, 0, 0, 0.95);
-                z-index: 10000;
-                cursor: pointer;
-            }
-            
-            .preview-content {
-                position: relative;
-                width: 100%;
-                height: 100%;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                flex-direction: column;
-            }
-            
-            .preview-image {
-                max-width: 95vw;
-                max-height: 90vh;
-                width: auto;
-                height: auto;
-                object-fit: contain;
-                border: 2px solid #fff;
-                box-shadow: 0 4px 20px rgba(0, 0, 0, 0.8);
-                /* Ensure minimum size for tiny images */
-                min-width: 400px;
-                min-height: 300px;
-            }
-            
-            .preview-info {
-                color: white;
-                text-align: center;
-                margin-top: 20px;
-                font-size: 16px;
-            }
-            
-            .preview-controls {
-                position: absolute;
-                bottom: 30px;
-                left: 50%;
-                transform: translateX(-50%);
-                color: white;
-                text-align: center;
-                font-size: 14px;
-                opacity: 0.8;
-            }
-            
-            .preview-nav {
-                position: absolute;
-                top: 50%;
-                transform: translateY(-50%);
-                font-size: 40px;
-                color: white;
-                cursor: pointer;
-                user-select: none;
-                opacity: 0.6;
-                transition: opacity 0.3s;
-                width: 60px;
-                height: 60px;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                background: rgba(0, 0, 0, 0.5);
-                border-radius: 50%;
-            }
-            
-            .preview-nav:hover {
-                opacity: 1;
-            }
-            
-            .preview-nav.prev {
-                left: 30px;
-            }
-            
-            .preview-nav.next {
-                right: 30px;
-            }
-            
-            .preview-close {
-                position: absolute;
-                top: 20px;
-                right: 30px;
-                font-size: 40px;
-                color: white;
-                cursor: pointer;
-                opacity: 0.6;
-                transition: opacity 0.3s;
-            }
-            
-            .preview-close:hover {
-                opacity: 1;
-            }
-            
-            /* Photo interaction improvements - hover to show preview icon */
-            .photo-image-container:hover .preview-icon {
-                display: flex !important;
-            }
-            
-            .preview-icon:hover {
-                background: rgba(0,0,0,0.9) !important;
-                transform: scale(1.1);
-            }
-            
-            /* Improved photo card cursor and interaction */
-            .photo-thumbnail:hover {
-                opacity: 0.9;
-            }
-            
-            /* Fixed-height selection summary - prevents layout shifts */
-            .selection-summary-container {
-                height: 120px;
-                margin: 20px 0;
-                transition: all 0.3s ease;
-                position: relative;
-            }
-            
-            .selection-summary {
-                height: 100%;
-                padding: 20px;
-                border-radius: 10px;
-                box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-                opacity: 0;
-                transform: translateY(-10px);
-                transition: all 0.3s ease;
-                overflow: hidden;
-                display: flex;
-                flex-direction: column;
-                justify-content: center;
-                background: #fff3cd;
-                border: 2px solid #ffc107;
-            }
-            
-            .selection-summary.visible {
-                opacity: 1;
-                transform: translateY(0);
-                background: #fff3cd;
-                border-color: #ffc107;
-            }
-            
-            .selection-summary.empty {
-                opacity: 1;
-                background: #f8f9fa;
-                border: 2px dashed #dee2e6;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                color: #6c757d;
-            }
-            
-            .empty-state-content {
-                text-align: center;
-                font-style: italic;
-            }
-            
-            .selection-content {
-                display: flex;
-                flex-direction: column;
-                height: 100%;
-                justify-content: space-between;
-            }
-            
-            .selection-header {
-                display: flex;
-                align-items: center;
-                margin-bottom: 10px;
-            }
-            
-            .selection-stats {
-                font-size: 0.95rem;
-                color: #856404;
-                margin-bottom: 15px;
-            }
-            
-            .selection-actions {
-                display: flex;
-                gap: 10px;
-            }
-            
-            /* Responsive adjustments for mobile */
-            @media (max-width: 768px) {
-                .selection-summary-container {
-                    height: 140px;
-                }
-                
-                .selection-summary {
-                    padding: 15px;
-                    font-size: 0.9rem;
-                }
-            }
-            
-            @media (max-width: 480px) {
-                .selection-summary-container {
-                    height: 160px;
-                }
-                
-                .selection-summary {
-                    padding: 12px;
-                }
-                
-                .selection-actions {
-                    flex-direction: column;
-                }
-            }
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>🖼️ Photo Deduplication Tool</h1>
-            <p>Stage 3: Visual Interface</p>
-            <p><strong>Status:</strong> Interactive photo selection with thumbnails - click photos to select/deselect for keeping</p>
-        </div>
-
-        <div id="status" class="status loading">
-            📡 Loading photos...
-        </div>
-
-        <div id="stats" class="stats" style="display: none;">
-            <!-- Stats will be populated by JavaScript -->
-        </div>
-
-        <div class="controls" style="display: none;" id="controls">
-            <button class="btn" onclick="loadGroups()" id="loadGroupsBtn">🧪 Demo Mode</button>
-            <button class="btn btn-primary" onclick="loadRealGroups()" id="loadRealGroupsBtn">📸 Analyze My Photos</button>
-            <span id="groupStatus" style="margin-left: 15px;"></span>
-        </div>
-
-        <!-- Fixed-height selection summary container - prevents layout shifts -->
-        <div class="selection-summary-container" id="selectionSummaryContainer">
-            <div class="selection-summary empty" id="selectionSummary" aria-live="polite" aria-atomic="true">
-                <div class="empty-state-content">
-                    <span style="font-size: 1.2rem; color: #6c757d;">📋</span>
-                    <div style="margin-top: 8px;">Select photos to see deletion summary</div>
-                </div>
-            </div>
-        </div>
-
-        <div id="groupsContainer" class="groups-container">
-            <!-- Photo groups will be populated here -->
-        </div>
-
-        <!-- Pagination controls -->
-        <div id="paginationControls" class="controls" style="display: none;">
-            <button class="btn" onclick="loadMoreGroups()" id="loadMoreBtn">📄 Load More Groups</button>
-            <span id="paginationStatus" style="margin-left: 15px;"></span>
-        </div>
-
-        <!-- Full-screen preview modal -->
-        <div id="previewModal" class="preview-modal" onclick="closePreview()">
-            <div class="preview-content" onclick="event.stopPropagation()">
-                <div class="preview-close" onclick="closePreview()">&times;</div>
-                <div class="preview-nav prev" id="prevPhoto" onclick="navigatePhoto(-1)">&#8249;</div>
-                <div class="preview-nav next" id="nextPhoto" onclick="navigatePhoto(1)">&#8250;</div>
-                <img id="previewImage" class="preview-image" src="" alt="">
-                <div class="preview-info">
-                    <div id="previewFilename" style="font-weight: bold; margin-bottom: 10px;"></div>
-                    <div id="previewMetadata"></div>
-                </div>
-                <div class="preview-controls">
-                    Press ESC to close • Use arrow keys to navigate
-                </div>
-            </div>
-        </div>
-
-        <script>
-            let groupsLoaded = false;
-            let photoSelections = {}; // Track user selections by group_id
-            
-            // Pagination variables
-            let currentPage = 1;
-            let totalGroupsAvailable = 0;
-            let hasMoreGroups = false;
-            
-            // Toast notification system
-            function showToast(message, type = 'info', duration = 3000) {
-                const toast = document.createElement('div');
-                toast.className = `toast toast-${type}`;
-                toast.style.cssText = `
-                    position: fixed;
-                    top: 20px;
-                    right: 20px;
-                    z-index: 1000;
-                    padding: 12px 16px;
-                    border-radius: 8px;
-                    color: white;
-                    font-weight: 600;
-                    max-width: 400px;
-                    box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-                    background: ${type === 'success' ? '#10b981' : type === 'error' ? '#ef4444' : '#6b7280'};
-                    transform: translateX(100%);
-                    transition: transform 0.3s ease;
-                `;
-                toast.textContent = message;
-                
-                document.body.appendChild(toast);
-                
-                // Animate in
-                setTimeout(() => toast.style.transform = 'translateX(0)', 10);
-                
-                // Auto dismiss
-                setTimeout(() => {
-                    toast.style.transform = 'translateX(100%)';
-                    setTimeout(() => document.body.removeChild(toast), 300);
-                }, duration);
-            }
+def cache_thumbnail_async(photo_uuid, thumbnail_path, data, size=THUMBNAIL_SIZE):
+    """Write a thumbnail to the cache off the request path - the caller already has the bytes."""
+    threading.Thread(target=write_thumbnail_cache, args=(photo_uuid, thumbnail_path, data, size), daemon=True).start()
 
-            // Load stats immediately (working approach)
-            console.log('Script starting...');
-            
-            setTimeout(function() {
-                console.log('About to fetch stats...');
-                fetch('/api/stats')
-                .then(response => response.json())
-                .then(data => {
-                    const statusDiv = document.getElementById('status');
-                    const statsDiv = document.getElementById('stats');
-                    const controlsDiv = document.getElementById('controls');
-                    
-                    if (data.success) {
-                        statusDiv.className = 'status success';
-                        statusDiv.innerHTML = '✅ Photos library connected';
-                        
-                        // Show stats
-                        statsDiv.style.display = 'grid';
-                        statsDiv.innerHTML = `
-                            <div class="stat-card">
-                                <div class="stat-number">${data.estimated_savings}</div>
-                                <div class="stat-label">Potential Savings</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-number">${data.sample_photos || 0}</div>
-                                <div class="stat-label">Photos Scanned</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-number">${data.date_range_start && data.date_range_end ? 
-                                    new Date(data.date_range_start).getFullYear() + '-' + new Date(data.date_range_end).getFullYear() 
-                                    : '2020-2025'}</div>
-                                <div class="stat-label">Date Range</div>
-                            </div>
-                        `;
-                        
-                        // Show controls
-                        controlsDiv.style.display = 'block';
-                    } else {
-                        statusDiv.className = 'status error';
-                        statusDiv.innerHTML = `❌ Error: ${data.error}`;
-                    }
-                })
-                .catch(error => {
-                    const statusDiv = document.getElementById('status');
-                    statusDiv.className = 'status error';
-                    statusDiv.innerHTML = `❌ Connection failed`;                    
-                });
-            }, 1000); // End setTimeout
-
-            // Global functions accessible to HTML onclick handlers
-            let progressInterval = null;
-            
-            function formatTime(seconds) {
-                if (seconds < 60) return `${Math.round(seconds)}s`;
-                if (seconds < 3600) return `${Math.round(seconds / 60)}m ${Math.round(seconds % 60)}s`;
-                return `${Math.round(seconds / 3600)}h ${Math.round((seconds % 3600) / 60)}m`;
-            }
-            
-            function updateProgress() {
-                fetch('/api/progress')
-                    .then(response => response.json())
-                    .then(progress => {
-                        const status = document.getElementById('groupStatus');
-                        
-                        if (progress.active) {
-                            const percentage = progress.total > 0 ? Math.round((progress.progress / progress.total) * 100) : 0;
-                            const elapsed = formatTime(progress.elapsed_time);
-                            const remaining = progress.estimated_time > 0 ? formatTime(progress.estimated_time) : '';
-                            
-                            let statusText = `🔄 ${progress.step} (${percentage}%)`;
-                            if (elapsed) statusText += ` • ${elapsed} elapsed`;
-                            if (remaining) statusText += ` • ~${remaining} remaining`;
-                            
-                            status.innerHTML = statusText;
-                            status.title = progress.tooltip || '';
-                        }
-                    })
-                    .catch(error => {
-                        console.log('Progress polling error:', error);
-                    });
-            }
+def thumbnail_shard_path(base_dir, key):
+    """<base_dir>/<first two hex chars of key>/<key>_thumb.jpg"""
+    return os.path.join(base_dir, key[:2].lower(), f"{key}_thumb.jpg")
 
-            function loadGroups() {
-                if (groupsLoaded) return;
-                
-                const btn = document.getElementById('loadGroupsBtn');
-                const status = document.getElementById('groupStatus');
-                
-                btn.disabled = true;
-                btn.innerHTML = '⏳ Analyzing...';                
-                status.innerHTML = '🔄 Starting...';                
-                status.title = 'Analyzing photos';                
-                
-                // Start progress polling
-                progressInterval = setInterval(updateProgress, 1000);
-                
-                // Check for priority and limit parameters from URL
-                const urlParams = new URLSearchParams(window.location.search);
-                const priority = urlParams.get('priority');
-                const limit = urlParams.get('limit') || '10';
-                
-                let apiUrl;
-                if (priority) {
-                    // Use priority-filtered API endpoint (already analyzed)
-                    apiUrl = `/api/groups?priority=${priority}&limit=${limit}`;
-                } else {
-                    // Use full analysis API endpoint
-                    apiUrl = `/api/groups?limit=${limit}`;
-                }
-                
-                fetch(apiUrl)
-                    .then(response => response.json())
-                    .then(data => {
-                        // Stop progress polling
-                        if (progressInterval) {
-                            clearInterval(progressInterval);
-                            progressInterval = null;
-                        }
-                        
-                        if (data.success) {
-                            allGroups = data.groups; // Store for calculations
-                            displayGroups(data.groups);
-                            
-                            // Update pagination state
-                            totalGroupsAvailable = data.total_groups || data.groups.length;
-                            hasMoreGroups = data.has_next || false;
-                            
-                            status.innerHTML = `✅ Found ${data.total_groups} groups`;                
-                            status.title = 'Analysis complete';                
-                            btn.innerHTML = '✅ Complete';                
-                            groupsLoaded = true;
-                            
-                            // Show pagination controls if there are more groups
-                            if (hasMoreGroups) {
-                                const paginationControls = document.getElementById('paginationControls');
-                                const paginationStatus = document.getElementById('paginationStatus');
-                                paginationControls.style.display = 'block';
-                                paginationStatus.innerHTML = `Showing ${data.groups.length} of ${totalGroupsAvailable} groups`;
-                            }
-                        } else {
-                            status.innerHTML = `❌ Error: ${data.error}`;
-                            status.title = '';
-                            btn.disabled = false;
-                            btn.innerHTML = '🔍 Find Duplicates';
-                        }
-                    })
-                    .catch(error => {
-                        // Stop progress polling
-                        if (progressInterval) {
-                            clearInterval(progressInterval);
-                            progressInterval = null;
-                        }
-                        
-                        status.innerHTML = `❌ Couldn't load photos`;                        
-                        status.title = '';
-                        btn.disabled = false;
-                        btn.innerHTML = '🔍 Analyze Photos';
-                    });
-            }
-            
-            function loadRealGroups() {
-                if (groupsLoaded) return;
-                
-                const btn = document.getElementById('loadRealGroupsBtn');
-                const status = document.getElementById('groupStatus');
-                
-                btn.disabled = true;
-                btn.innerHTML = '⏳ Analyzing Your Photos...';
-                status.innerHTML = '🔄 Starting real photo analysis...';
-                status.title = 'Analyzing your photo library';
-                
-                // Start progress polling
-                progressInterval = setInterval(updateProgress, 1000);
-                
-                // Check for limit parameter from URL
-                const urlParams = new URLSearchParams(window.location.search);
-                const limit = urlParams.get('limit') || '10';
-                
-                // Use real photo analysis with real=true parameter
-                const apiUrl = `/api/groups?limit=${limit}&real=true`;
-                
-                fetch(apiUrl)
-                    .then(response => response.json())
-                    .then(data => {
-                        // Stop progress polling
-                        if (progressInterval) {
-                            clearInterval(progressInterval);
-                            progressInterval = null;
-                        }
-                        
-                        if (data.success) {
-                            allGroups = data.groups; // Store for calculations
-                            displayGroups(data.groups);
-                            groupsLoaded = true;
-                            
-                            // Store total groups for pagination if available
-                            if (data.total_groups !== undefined) {
-                                totalGroupsAvailable = data.total_groups;
-                                hasMoreGroups = data.has_next || false;
-                            }
-                            
-                            // Update pagination controls if we have more groups
-                            if (data.total_groups > data.groups.length) {
-                                const paginationControls = document.getElementById('paginationControls');
-                                const paginationStatus = document.getElementById('paginationStatus');
-                                paginationControls.style.display = 'block';
-                                paginationStatus.innerHTML = `Showing ${data.groups.length} of ${totalGroupsAvailable} real photo groups`;
-                            }
-                            
-                            status.innerHTML = `✅ Found ${data.groups.length} real duplicate groups`;
-                            status.title = '';
-                            btn.disabled = false;
-                            btn.innerHTML = '📸 Analyze My Photos';
-                        } else {
-                            status.innerHTML = `❌ Error: ${data.error}`;
-                            status.title = '';
-                            btn.disabled = false;
-                            btn.innerHTML = '📸 Analyze My Photos';
-                        }
-                    })
-                    .catch(error => {
-                        // Stop progress polling
-                        if (progressInterval) {
-                            clearInterval(progressInterval);
-                            progressInterval = null;
-                        }
-                        
-                        status.innerHTML = `❌ Couldn't analyze photos`;
-                        status.title = '';
-                        btn.disabled = false;
-                        btn.innerHTML = '📸 Analyze My Photos';
-                        console.error('Error loading real groups:', error);
-                    });
-            }
-            
-            function loadMoreGroups() {
-                if (!hasMoreGroups) return;
-                
-                const btn = document.getElementById('loadMoreBtn');
-                const status = document.getElementById('paginationStatus');
-                
-                btn.disabled = true;
-                btn.innerHTML = '⏳ Loading...';
-                
-                // Get URL parameters
-                const urlParams = new URLSearchParams(window.location.search);
-                const priority = urlParams.get('priority');
-                const limit = urlParams.get('limit') || '10';
-                
-                // Calculate next page
-                const nextPage = currentPage + 1;
-                
-                let apiUrl;
-                if (priority) {
-                    // Use priority-filtered API endpoint with pagination
-                    apiUrl = `/api/groups?priority=${priority}&limit=${limit}&page=${nextPage}`;
-                } else {
-                    // Use full analysis API endpoint with pagination
-                    apiUrl = `/api/groups?limit=${limit}&page=${nextPage}`;
-                }
-                
-                fetch(apiUrl)
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            // Append new groups to existing ones
-                            allGroups = [...allGroups, ...data.groups];
-                            appendGroups(data.groups); // Need to create this function
-                            
-                            // Update pagination state
-                            currentPage = nextPage;
-                            hasMoreGroups = data.has_next || false;
-                            
-                            if (hasMoreGroups) {
-                                btn.disabled = false;
-                                btn.innerHTML = '📄 Load More Groups';
-                                status.innerHTML = `Showing ${allGroups.length} of ${totalGroupsAvailable} groups`;
-                            } else {
-                                btn.style.display = 'none';
-                                status.innerHTML = `✅ All ${totalGroupsAvailable} groups loaded`;
-                            }
-                        } else {
-                            status.innerHTML = `❌ Couldn't load more photos`;                            
-                            btn.disabled = false;
-                            btn.innerHTML = '📄 Load More Groups';
-                        }
-                    })
-                    .catch(error => {
-                        status.innerHTML = `❌ Couldn't load more photos`;                        
-                        btn.disabled = false;
-                        btn.innerHTML = '📄 Load More Groups';
-                    });
-            }
+@functools.lru_cache(maxsize=4096)
+def photo_source_paths(photo_uuid):
+    """(path, path_derivatives) for a photo, memoised until the library is reloaded.
+    
+    osxphotos resolves both properties against the library on every access. Cleared by
+    the clear-cache endpoints along with the PhotosDB handle.
+    """
+    photo = scanner.photos_by_uuid.get(photo_uuid)
+    if photo is None:
+        return None, ()
+    return photo.path, tuple(photo.path_derivatives or ())
 
-            function displayGroups(groups) {
-                const container = document.getElementById('groupsContainer');
-                
-                if (groups.length === 0) {
-                    container.innerHTML = '<div class="status">ℹ️ No duplicate photo groups found in sample</div>';
-                    return;
-                }
+def thumbnail_path_for(photo, size=THUMBNAIL_SIZE):
+    """Cache path for a photo's thumbnail - content-addressed when the original is local."""
+    photo_path, _ = photo_source_paths(photo.uuid)
+    if photo_path and os.path.exists(photo_path):
+        return thumbnail_shard_path(THUMBNAIL_DIR, thumbnail_cache_key(photo_path, size))
+    return thumbnail_shard_path(THUMBNAIL_DIR, photo.uuid if size == THUMBNAIL_SIZE else f"{photo.uuid}_{size}")
+
+def thumbnail_manifest():
+    """This thread's connection to the uuid -> thumbnail manifest (SQLite, WAL for concurrent readers)."""
+    conn = getattr(_manifest_connections, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(THUMBNAIL_MANIFEST_PATH, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS thumbs(uuid TEXT PRIMARY KEY, src TEXT, thumb TEXT, mtime REAL)')
+        _manifest_connections.conn = conn
+    return conn
+
+def manifest_key(photo_uuid, size):
+    """Manifest row id for one width of a photo's thumbnail."""
+    return f"{photo_uuid}@{size}"
+
+def record_thumbnail(photo_uuid, thumbnail_path, size=THUMBNAIL_SIZE):
+    """Remember where photo_uuid's thumbnail lives and the source mtime it was made from."""
+    source_path, _ = photo_source_paths(photo_uuid)
+    source_mtime = os.path.getmtime(source_path) if source_path and os.path.exists(source_path) else None
+    try:
+        with thumbnail_manifest() as conn:
+            conn.execute('INSERT OR REPLACE INTO thumbs(uuid, src, thumb, mtime) VALUES (?, ?, ?, ?)',
+                         (manifest_key(photo_uuid, size), source_path if source_mtime is not None else None,
+                          thumbnail_path, source_mtime))
+    except sqlite3.Error as e:
+        thumbnail_logger.warning("Could not record thumbnail for %s in manifest: %s", photo_uuid, e)
+
+def manifest_thumbnail_path(photo_uuid, size=THUMBNAIL_SIZE):
+    """Cached thumbnail path from the manifest, or None if unknown or stale.
+    
+    A hit costs one indexed query and a stat or two - no library access, no content hashing.
+    """
+    try:
+        row = thumbnail_manifest().execute('SELECT thumb, src, mtime FROM thumbs WHERE uuid = ?',
+                                           (manifest_key(photo_uuid, size),)).fetchone()
+    except sqlite3.Error as e:
+        thumbnail_logger.warning("Thumbnail manifest lookup failed for %s: %s", photo_uuid, e)
+        return None
+    if row is None:
+        return None
+    thumbnail_path, source_path, source_mtime = row
+    if not os.path.exists(thumbnail_path):
+        return None
+    if source_path is not None:
+        try:
+            if os.path.getmtime(source_path) != source_mtime:
+                return None  # original was edited since
+        except OSError:
+            return None
+    return thumbnail_path
+
+def build_thumbnail(photo_uuid, size=THUMBNAIL_SIZE):
+    """Generate the cached size-px thumbnail for photo_uuid, downloading from iCloud if needed.
+    
+    Runs on the thumbnail executor. Returns (thumbnail_path, data, error, status_code), where
+    data holds the JPEG bytes of a freshly generated thumbnail (None when it was already cached).
+    """
+    temp_export_path = None
+    try:
+        photo = scanner.photos_by_uuid.get(photo_uuid)
+        
+        if not photo:
+            thumbnail_logger.info("Photo %s not found in database", photo_uuid)
+            return None, None, 'Photo not found', 404
+        
+        thumbnail_path = thumbnail_path_for(photo, size)
+        if os.path.exists(thumbnail_path):
+            return thumbnail_path, None, None, 200
+        
+        # Try multiple approaches to get photo path
+        original_path, derivative_paths = photo_source_paths(photo_uuid)
+        photo_path = None
+        
+        # Method 1: Direct path access
+        if original_path and os.path.exists(original_path):
+            photo_path = original_path
+            thumbnail_logger.debug("Using direct path for %s: %s", photo_uuid, photo_path)
+        
+        # Method 2: Photos' own preview derivatives - already small JPEGs, no export needed
+        if not photo_path:
+            for derivative_path in derivative_paths:
+                if os.path.exists(derivative_path) and os.path.getsize(derivative_path) < THUMBNAIL_DERIVATIVE_MAX_BYTES:
+                    photo_path = derivative_path
+                    thumbnail_logger.debug("Using Photos derivative for %s: %s", photo_uuid, photo_path)
+                    break
+        
+        if not photo_path:
+            # Method 3: Download iCloud photo if needed
+            thumbnail_logger.info("Photo %s not locally available, attempting iCloud download", photo_uuid)
+            try:
+                # Full-size export is only needed until the thumbnail is written
+                temp_export_path = tempfile.mkdtemp(prefix=f"photo_dedup_export_{photo_uuid}_")
                 
-                let html = '';
+                # Force download from iCloud with explicit options
+                exported_paths = photo.export(
+                    temp_export_path, 
+                    overwrite=True,
+                    use_photos_export=True,  # Use Photos app export API (may download from iCloud)
+                    timeout=60  # 60 second timeout for downloads
+                )
                 
-                groups.forEach(group => {
-                    const timeSpan = new Date(group.time_window_start).toLocaleString() + 
-                                   ' - ' + new Date(group.time_window_end).toLocaleString();
-                    
-                    // Initialize selections for this group with NO photos selected (require explicit user action)
-                    if (!photoSelections[group.group_id]) {
-                        photoSelections[group.group_id] = [];
-                    }
-                    
-                    html += `
-                        <div class="group-card">
-                            <div class="group-header">
-                                <div class="group-title">📁 ${group.group_id}</div>
-                                <div class="group-meta">
-                                    <div>📅 <strong>Time:</strong> ${timeSpan}</div>
-                                    <div>📷 <strong>Camera:</strong> ${group.camera_model}</div>
-                                    <div>📸 <strong>Photos:</strong> ${group.photo_count || 0}</div>
-                                    <div>💾 <strong>Total Size:</strong> ${group.total_size_mb ? group.total_size_mb + ' MB' : Math.round(group.photos.reduce((sum, p) => sum + (p.file_size || 0), 0) / (1024 * 1024)) + ' MB'}</div>
-                                    <div>💰 <strong>Est. Savings:</strong> ~${group.potential_savings_mb ? group.potential_savings_mb + ' MB' : Math.round((group.photos.length - 1) * (group.photos.reduce((sum, p) => sum + (p.file_size || 0), 0) / (1024 * 1024)) / group.photos.length) + ' MB'}</div>
-                                </div>
-                            </div>
-                            <div class="group-actions" style="margin: 16px 0; display: flex; justify-content: space-between; align-items: center;">
-                                <div class="primary-actions">
-                                    <button class="action-btn keep-all-btn" onclick="keepAllPhotos('${group.group_id}')" style="background: #28a745; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: 600;">🛡️ Keep All Photos</button>
-                                    <button class="action-btn delete-duplicates-btn" onclick="deleteAllButOne('${group.group_id}')" style="background: #dc3545; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: 600;">❌ Delete Duplicates</button>
-                                    <button class="action-btn delete-all-btn" onclick="deleteAllPhotos('${group.group_id}')" style="background: #721c24; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: bold;">❌ Delete All Photos</button>
-                                </div>
-                                <div class="secondary-actions">
-                                    <button class="action-btn why-grouped-btn" onclick="showWhyGrouped('${group.group_id}')" style="background: #6c757d; color: white; border: none; padding: 8px 12px; border-radius: 6px; cursor: pointer; font-size: 0.9rem;">ℹ️ Grouping Info</button>
-                                </div>
-                            </div>
-                            <div class="photos-grid">
-                    `;
-                    
-                    group.photos.forEach(photo => {
-                        const timestamp = photo.timestamp ? new Date(photo.timestamp).toLocaleString() : 'Unknown';
-                        const resolution = photo.width && photo.height ? `${photo.width}×${photo.height}` : 'Unknown';
-                        const fileSize = photo.file_size > 0 ? `${(photo.file_size / (1024*1024)).toFixed(1)} MB` : 'Unknown';
-                        
-                        const isSelected = photoSelections[group.group_id].includes(photo.uuid);
-                        const cardClasses = ['photo-card'];
-                        if (isSelected) cardClasses.push('selected'); // Selected = DELETE target
-                        
-                        html += `
-                            <div class="${cardClasses.join(' ')}" data-group="${group.group_id}" data-photo="${photo.uuid}" data-photo-index="${group.photos.indexOf(photo)}">
-                                <div class="photo-loading" id="loading_${photo.uuid}">📷 Loading...</div>
-                                <div class="photo-image-container" style="position: relative; cursor: pointer;">
-                                    <img class="photo-thumbnail" 
-                                         src="/api/thumbnail/${photo.uuid}" 
-                                         alt="${photo.filename}"
-                                         style="display: none;"
-                                         onload="this.style.display='block'; document.getElementById('loading_${photo.uuid}').style.display='none';"
-                                         onerror="this.style.display='none'; document.getElementById('loading_${photo.uuid}').innerHTML='❌ Could not load image';"
-                                         onclick="togglePhotoSelection('${group.group_id}', '${photo.uuid}')"
-                                         ondblclick="event.stopPropagation(); openPreview('${group.group_id}', ${group.photos.indexOf(photo)});">
-                                    <div class="preview-icon" onclick="event.stopPropagation(); openPreview('${group.group_id}', ${group.photos.indexOf(photo)});" 
-                                         style="position: absolute; top: 8px; right: 8px; background: rgba(0,0,0,0.7); color: white; border-radius: 50%; width: 32px; height: 32px; display: none; align-items: center; justify-content: center; cursor: pointer; font-size: 14px; transition: all 0.2s ease;">🔍</div>
-                                </div>
-                                <div class="photo-filename" onclick="event.stopPropagation(); openInPhotos('${photo.uuid}')">${photo.filename}</div>
-                                <div class="photo-info">
-                                    <div>📅 ${timestamp}</div>
-                                    <div>💾 ${fileSize}</div>
-                                    <div>⭐ ${photo.quality_score ? photo.quality_score.toFixed(1) : '0.0'} ${photo.quality_method === 'favorite' ? '(favorite)' : photo.quality_method === 'quality' ? '(quality)' : photo.quality_method === 'inferred quality' ? '(inferred)' : ''}</div>
-                                </div>
-                                <button class="photo-action-button ${isSelected ? 'remove-mark' : 'mark-delete'}" onclick="togglePhotoSelection('${group.group_id}', '${photo.uuid}')" style="width: 100%; height: 50px; border-radius: 8px; border: 2px solid ${isSelected ? '#6b7280' : '#dc2626'}; font-size: 16px; font-weight: 600; display: flex; align-items: center; justify-content: center; cursor: pointer; transition: all 0.2s ease; background: ${isSelected ? '#6b7280' : '#ef4444'}; color: white; margin-top: 8px;">
-                                    ${isSelected ? 'Remove Mark' : 'Mark for Deletion'}
-                                </button>
-                            </div>
-                        `;
-                    });
+                if exported_paths and len(exported_paths) > 0 and os.path.exists(exported_paths[0]):
+                    photo_path = exported_paths[0]
+                    thumbnail_logger.debug("Downloaded %s (%d bytes)", photo_path, os.path.getsize(photo_path))
+                else:
+                    thumbnail_logger.warning("Export returned no valid files for %s: %s", photo_uuid, exported_paths)
                     
-                    html += '</div></div>';
-                });
-                
-                container.innerHTML = html;
-                updateSelectionSummary();
+            except Exception:
+                thumbnail_logger.exception("Download/export failed for %s", photo_uuid)
+        
+        if not photo_path:
+            thumbnail_logger.warning("No accessible path found for %s after all attempts", photo_uuid)
+            return None, None, 'Photo file not accessible - download failed or restricted', 404
+        
+        # Check if this is a video file
+        if os.path.splitext(photo_path)[1].lower() in VIDEO_EXTENSIONS:
+            thumbnail_logger.debug("Generating video thumbnail for %s: %s", photo_uuid, photo_path)
+            try:
+                # Create a simple video placeholder thumbnail
+                from PIL import Image, ImageDraw, ImageFont
                 
-                // Setup keyboard navigation and accessibility
-                setTimeout(setupAccessibility, 100);
-            }
-            
-            function appendGroups(groups) {
-                const container = document.getElementById('groupsContainer');
+                # Create a 600x400 placeholder image
+                img = Image.new('RGB', (600, 400), color=(64, 64, 64))
+                draw = ImageDraw.Draw(img)
                 
-                if (groups.length === 0) return;
+                # Add video icon and text
+                # Draw a play button symbol
+                play_triangle = [(250, 150), (250, 250), (350, 200)]
+                draw.polygon(play_triangle, fill=(255, 255, 255))
                 
-                let html = '';
+                # Add text
+                try:
+                    font = ImageFont.load_default()
+                except:
+                    font = None
                 
-                groups.forEach(group => {
-                    const timeSpan = new Date(group.time_window_start).toLocaleString() + 
-                                   ' - ' + new Date(group.time_window_end).toLocaleString();
-                    
-                    // Initialize selections for this group with NO photos selected (require explicit user action)
-                    if (!photoSelections[group.group_id]) {
-                        photoSelections[group.group_id] = [];
-                    }
-                    
-                    html += `
-                        <div class="group-card">
-                            <div class="group-header">
-                                <div class="group-title">📁 ${group.group_id}</div>
-                                <div class="group-meta">
-                                    <div>📅 <strong>Time:</strong> ${timeSpan}</div>
-                                    <div>📷 <strong>Camera:</strong> ${group.camera_model}</div>
-                                    <div>📸 <strong>Photos:</strong> ${group.photo_count || 0}</div>
-                                    <div>💾 <strong>Total Size:</strong> ${group.total_size_mb ? group.total_size_mb + ' MB' : Math.round(group.photos.reduce((sum, p) => sum + (p.file_size || 0), 0) / (1024 * 1024)) + ' MB'}</div>
-                                    <div>💰 <strong>Est. Savings:</strong> ~${group.potential_savings_mb ? group.potential_savings_mb + ' MB' : Math.round((group.photos.length - 1) * (group.photos.reduce((sum, p) => sum + (p.file_size || 0), 0) / (1024 * 1024)) / group.photos.length) + ' MB'}</div>
-                                </div>
-                            </div>
-                            <div class="group-actions" style="margin: 16px 0; display: flex; justify-content: space-between; align-items: center;">
-                                <div class="primary-actions">
-                                    <button class="action-btn keep-all-btn" onclick="keepAllPhotos('${group.group_id}')" style="background: #28a745; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: 600;">🛡️ Keep All Photos</button>
-                                    <button class="action-btn delete-duplicates-btn" onclick="deleteAllButOne('${group.group_id}')" style="background: #dc3545; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: 600;">❌ Delete Duplicates</button>
-                                    <button class="action-btn delete-all-btn" onclick="deleteAllPhotos('${group.group_id}')" style="background: #721c24; color: white; border: none; padding: 10px 16px; margin-right: 8px; border-radius: 6px; cursor: pointer; font-weight: bold;">❌ Delete All Photos</button>
-                                </div>
-                                <div class="secondary-actions">
-                                    <button class="action-btn why-grouped-btn" onclick="showWhyGrouped('${group.group_id}')" style="background: #6c757d; color: white; border: none; padding: 8px 12px; border-radius: 6px; cursor: pointer; font-size: 0.9rem;">ℹ️ Grouping Info</button>
-                                </div>
-                            </div>
-                            <div class="photos-grid">
-                    `;
-                    
-                    group.photos.forEach(photo => {
-                        const timestamp = photo.timestamp ? new Date(photo.timestamp).toLocaleString() : 'Unknown';
-                        const fileSize = photo.file_size > 0 ? `${(photo.file_size / (1024*1024)).toFixed(1)} MB` : 'Unknown';
-                        
-                        const isSelected = photoSelections[group.group_id].includes(photo.uuid);
-                        
-                        html += `
-                            <div class="photo-card ${isSelected ? 'selected' : ''}" data-group="${group.group_id}" data-photo="${photo.uuid}" data-photo-index="${group.photos.indexOf(photo)}">
-                                <div class="photo-loading" id="loading_${photo.uuid}">📷 Loading...</div>
-                                <div class="photo-image-container" style="position: relative; cursor: pointer;">
-                                    <img class="photo-thumbnail" 
-                                         src="/api/thumbnail/${photo.uuid}" 
-                                         alt="${photo.filename}"
-                                         style="display: none;" 
-                                         onload="this.style.display='block'; document.getElementById('loading_${photo.uuid}').style.display='none';"
-                                         onerror="this.style.display='none'; document.getElementById('loading_${photo.uuid}').innerHTML='❌ Could not load image';"
-                                         onclick="togglePhotoSelection('${group.group_id}', '${photo.uuid}')"
-                                         ondblclick="event.stopPropagation(); openPreview('${group.group_id}', ${group.photos.indexOf(photo)});">
-                                    <div class="preview-icon" onclick="event.stopPropagation(); openPreview('${group.group_id}', ${group.photos.indexOf(photo)});" 
-                                         style="position: absolute; top: 8px; right: 8px; background: rgba(0,0,0,0.7); color: white; border-radius: 50%; width: 32px; height: 32px; display: none; align-items: center; justify-content: center; cursor: pointer; font-size: 14px; transition: all 0.2s ease;">🔍</div>
-                                </div>
-                                <div class="photo-filename" onclick="event.stopPropagation(); openInPhotos('${photo.uuid}')">${photo.filename}</div>
-                                <div class="photo-info">
-                                    <div>📅 ${timestamp}</div>
-                                    <div>💾 ${fileSize}</div>
-                                    <div>⭐ ${photo.quality_score ? photo.quality_score.toFixed(1) : '0.0'} ${photo.quality_method === 'favorite' ? '(favorite)' : photo.quality_method === 'quality' ? '(quality)' : photo.quality_method === 'inferred quality' ? '(inferred)' : ''}</div>
-                                </div>
-                                <button class="photo-action-button ${isSelected ? 'remove-mark' : 'mark-delete'}" onclick="togglePhotoSelection('${group.group_id}', '${photo.uuid}')" style="width: 100%; height: 50px; border-radius: 8px; border: 2px solid ${isSelected ? '#6b7280' : '#dc2626'}; font-size: 16px; font-weight: 600; display: flex; align-items: center; justify-content: center; cursor: pointer; transition: all 0.2s ease; background: ${isSelected ? '#6b7280' : '#ef4444'}; color: white; margin-top: 8px;">
-                                    ${isSelected ? 'Remove Mark' : 'Mark for Deletion'}
-                                </button>
-                            </div>
-                        `;
-                    });
-                    
-                    html += '</div></div>';
-                });
+                text = f"VIDEO\n{photo_uuid[:8]}...\n{os.path.basename(photo_path)}"
+                if font:
+                    draw.text((300, 100), text, fill=(255, 255, 255), font=font, anchor="mm")
+                else:
+                    draw.text((300, 100), text, fill=(255, 255, 255), anchor="mm")
                 
-                // Append to existing container content
-                container.innerHTML += html;
-                updateSelectionSummary();
+                # Encode placeholder thumbnail
+                buffer = thumbnail_encode_buffer()
+                img.save(buffer, 'JPEG', quality=85, progressive=False, subsampling='4:2:0')
+                data = buffer.getvalue()
+                cache_thumbnail_async(photo_uuid, thumbnail_path, data, size)
+                thumbnail_logger.debug("Video placeholder thumbnail generated for %s: %s", photo_uuid, thumbnail_path)
                 
-                // Setup keyboard navigation and accessibility for new groups
-                setTimeout(setupAccessibility, 100);
-            }
-
-            function togglePhotoSelection(groupId, photoUuid) {
-                const selections = photoSelections[groupId] || [];
-                const index = selections.indexOf(photoUuid);
+                return thumbnail_path, data, None, 200
                 
-                if (index === -1) {
-                    // Add to deletion selection (mark for DELETE)
-                    selections.push(photoUuid);
-                } else {
-                    // Remove from deletion selection (mark for KEEP)
-                    selections.splice(index, 1);
-                }
+            except Exception as e:
+                thumbnail_logger.warning("Error generating video placeholder for %s: %s", photo_uuid, e)
+                return None, None, 'Could not generate video thumbnail', 500
+        
+        # Generate thumbnail
+        try:
+            data = cached_photo_thumbnail(photo_uuid, photo_path, os.path.getmtime(photo_path), size)
+            cache_thumbnail_async(photo_uuid, thumbnail_path, data, size)
+            thumbnail_logger.debug("Thumbnail generated for %s: %s (%d bytes)", photo_uuid, thumbnail_path, len(data))
+            
+            return thumbnail_path, data, None, 200
                 
-                photoSelections[groupId] = selections;
-                updatePhotoCards(groupId);
-                updateSelectionSummary();
-            }
+        except Exception:
+            thumbnail_logger.exception("Error generating thumbnail for %s from %s", photo_uuid, photo_path)
+            return None, None, 'Could not generate thumbnail', 500
+            
+    except Exception as e:
+        thumbnail_logger.exception("Error building thumbnail for %s", photo_uuid)
+        return None, None, str(e), 500
+    finally:
+        if temp_export_path:
+            shutil.rmtree(temp_export_path, ignore_errors=True)
 
-            function updatePhotoCards(groupId) {
-                const cards = document.querySelectorAll(`[data-group="${groupId}"]`);
-                
-                cards.forEach(card => {
-                    const photoUuid = card.getAttribute('data-photo');
-                    const isSelected = photoSelections[groupId].includes(photoUuid);
-                    
-                    // Update card classes based on selection state
-                    card.className = 'photo-card';
-                    if (isSelected) {
-                        card.className += ' selected'; // Selected = DELETE target
-                    }
-                    
-                    // Update button appearance and text
-                    const button = card.querySelector('.photo-action-button');
-                    if (button) {
-                        // Update button classes
-                        button.className = `photo-action-button ${isSelected ? 'remove-mark' : 'mark-delete'}`;
-                        
-                        // Update button text
-                        button.textContent = isSelected ? 'Remove Mark' : 'Mark for Deletion';
-                        
-                        // Update button styling
-                        if (isSelected) {
-                            button.style.background = '#6b7280';
-                            button.style.borderColor = '#6b7280';
-                        } else {
-                            button.style.background = '#ef4444';
-                            button.style.borderColor = '#dc2626';
-                        }
-                    }
-                });
-            }
+def submit_thumbnail(photo_uuid, size=THUMBNAIL_SIZE):
+    """Queue thumbnail generation for photo_uuid, reusing an in-flight job if there is one.
+    
+    A job that produced new bytes stays registered until write_thumbnail_cache() has stored
+    them, so concurrent requests share its result instead of decoding the photo again.
+    """
+    job_key = (photo_uuid, size)
+    with thumbnail_futures_lock:
+        future = thumbnail_futures.get(job_key)
+        if future is not None:
+            return future
+        future = thumbnail_executor.submit(build_thumbnail, photo_uuid, size)
+        thumbnail_futures[job_key] = future
+    
+    def _forget(done):
+        if done.exception() is None and done.result()[1] is not None:
+            return  # the cache writer deregisters it
+        with thumbnail_futures_lock:
+            if thumbnail_futures.get(job_key) is done:
+                del thumbnail_futures[job_key]
+    future.add_done_callback(_forget)
+    return future
 
-            function keepAllPhotos(groupId) {
-                // Keep all photos (select NONE for deletion)
-                const group = allGroups.find(g => g.group_id === groupId);
-                if (group) {
-                    photoSelections[groupId] = [];
-                    updatePhotoCards(groupId);
-                    updateSelectionSummary();
-                }
-            }
+def warm_thumbnails(photo_uuids):
+    """Start generating thumbnails in the background before the browser asks for them."""
+    queued = 0
+    for photo_uuid in photo_uuids:
+        submit_thumbnail(photo_uuid)
+        queued += 1
+    if queued:
+        thumbnail_logger.info("Warming %d thumbnails in background", queued)
 
-            function deleteAllButOne(groupId) {
-                // Delete all except recommended photo (select all EXCEPT recommended for deletion)
-                const group = allGroups.find(g => g.group_id === groupId);
-                if (group) {
-                    const recommendedPhoto = group.photos.find(photo => photo.recommended);
-                    const photoToKeep = recommendedPhoto || group.photos[0];
-                    
-                    // Select all photos EXCEPT the one to keep
-                    photoSelections[groupId] = group.photos
-                        .filter(photo => photo.uuid !== photoToKeep.uuid)
-                        .map(photo => photo.uuid);
-                    
-                    updatePhotoCards(groupId);
-                    updateSelectionSummary();
-                }
-            }
+def warm_group_thumbnails(groups, max_groups=THUMBNAIL_WARM_GROUPS):
+    """Pre-generate thumbnails for the first groups as soon as analysis produces them.
+    
+    Capped so on-demand requests for what's on screen don't queue behind the whole library.
+    """
+    warm_thumbnails(photo.uuid for group in groups[:max_groups]
+                    if not isinstance(group, dict) for photo in group.photos)
 
-            function deleteAllPhotos(groupId) {
-                // Delete all photos in the group (select ALL for deletion)
-                const group = allGroups.find(g => g.group_id === groupId);
-                if (group) {
-                    photoSelections[groupId] = group.photos.map(photo => photo.uuid);
-                    updatePhotoCards(groupId);
-                    updateSelectionSummary();
-                }
-            }
+def thumbnail_variant_path(thumbnail_path, fmt):
+    """Path of the AVIF/WebP sibling of a cached JPEG thumbnail."""
+    return f"{os.path.splitext(thumbnail_path)[0]}.{fmt}"
 
-            function showWhyGrouped(groupId) {
-                const group = allGroups.find(g => g.group_id === groupId);
-                if (!group) return;
-                
-                // Analyze why these photos were grouped
-                const photos = group.photos;
-                const timeSpan = new Date(group.time_window_end) - new Date(group.time_window_start);
-                const timeSpanSeconds = Math.round(timeSpan / 1000);
-                
-                // Analyze timestamps
-                const timestamps = photos.map(p => new Date(p.timestamp)).sort((a, b) => a - b);
-                const firstPhoto = timestamps[0];
-                const lastPhoto = timestamps[timestamps.length - 1];
-                const totalSpan = Math.round((lastPhoto - firstPhoto) / 1000);
-                
-                // Analyze cameras
-                const cameras = [...new Set(photos.map(p => p.camera_model).filter(c => c))];
-                
-                // Analyze file formats
-                const formats = [...new Set(photos.map(p => p.format))];
-                
-                // Analyze resolutions
-                const resolutions = [...new Set(photos.map(p => p.width && p.height ? `${p.width}×${p.height}` : 'Unknown'))];
-                
-                const explanation = `🔍 WHY THESE PHOTOS WERE GROUPED TOGETHER
-
-📊 Current Grouping Algorithm:
-• Time Window: Photos taken within 10 seconds
-• Camera Match: Same camera model
-• No Visual Similarity: Not yet implemented
-
-📅 Time Analysis:
-• First photo: ${firstPhoto.toLocaleString()}
-• Last photo: ${lastPhoto.toLocaleString()}
-• Total time span: ${totalSpan} seconds
-• Within 10-second window: ${timeSpanSeconds <= 10 ? '✅ Yes' : '❌ No - this may be a grouping error'}
-
-📷 Camera Analysis:
-• Camera models: ${cameras.length > 0 ? cameras.join(', ') : 'Unknown'}
-• Same camera: ${cameras.length <= 1 ? '✅ Yes' : '❌ No - this may be a grouping error'}
-
-🖼️ Technical Details:
-• File formats: ${formats.join(', ')}
-• Resolutions: ${resolutions.join(', ')}
-• Photo count: ${photos.length}
-
-⚠️ KNOWN LIMITATIONS:
-• No visual similarity analysis (coming in Stage 5)
-• May group different subjects taken quickly
-• Videos should be filtered out but some may slip through
-• Time-based grouping can be too broad
-
-💡 RECOMMENDATIONS:
-• Use "Keep All" if photos are different subjects
-• Use "Delete All But Best" if photos are truly similar
-• Manual review is always recommended`;
-                
-                alert(explanation);
+def encode_thumbnail_variants(thumbnail_path, data=None):
+    """Encode compact AVIF/WebP copies of a JPEG thumbnail once, next to it in the cache.
+    
+    The JPEG is decoded once into memory and every variant is encoded from that copy.
+    """
+    if data is None:
+        with open(thumbnail_path, 'rb') as f:
+            data = f.read()
+    
+    try:
+        if pyvips is not None:
+            image = pyvips.Image.new_from_buffer(data, '').copy_memory()
+            encoders = {
+                'avif': lambda: image.heifsave_buffer(Q=50, compression='av1'),
+                'webp': lambda: image.webpsave_buffer(Q=80)
+            }
+        else:
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            
+            def _pil_encode(fmt, **options):
+                buffer = io.BytesIO()
+                image.save(buffer, fmt, **options)
+                return buffer.getvalue()
+            
+            encoders = {
+                'avif': lambda: _pil_encode('AVIF', quality=50),
+                'webp': lambda: _pil_encode('WEBP', quality=80, method=4)
             }
+    except Exception as e:
+        thumbnail_logger.warning("Could not decode %s for AVIF/WebP variants: %s", thumbnail_path, e)
+        return
+    
+    if not AVIF_SUPPORTED:
+        del encoders['avif']
+    for fmt, encode in encoders.items():
+        try:
+            atomic_write(thumbnail_variant_path(thumbnail_path, fmt), encode())
+        except Exception as e:
+            thumbnail_logger.warning("Could not encode %s thumbnail for %s: %s", fmt.upper(), thumbnail_path, e)
 
-            let allGroups = []; // Store groups for calculations
+def serve_thumbnail(photo_uuid, thumbnail_path):
+    """Send a cached thumbnail as a conditionally-requestable file.
+    
+    Picks the smallest format the browser advertises in Accept (AVIF, then WebP, then JPEG).
+    The ETag is the photo UUID plus the file's mtime, so a 304 needs no body. The URL is
+    keyed by UUID, not content, so browsers revalidate after THUMBNAIL_REVALIDATE_MAX_AGE
+    instead of keeping a stale thumbnail of an edited photo.
+    """
+    accept = request.headers.get('Accept', '')
+    filename, fmt, mimetype = os.path.relpath(thumbnail_path, THUMBNAIL_DIR), 'jpg', 'image/jpeg'
+    for variant in ('avif', 'webp'):
+        variant_path = thumbnail_variant_path(thumbnail_path, variant)
+        if f'image/{variant}' in accept and os.path.exists(variant_path):
+            filename, fmt, mimetype = os.path.relpath(variant_path, THUMBNAIL_DIR), variant, f'image/{variant}'
+            break
+    
+    mtime = int(os.path.getmtime(os.path.join(THUMBNAIL_DIR, filename)))
+    response = send_thumbnail_file(filename, mimetype, f"{photo_uuid}-{fmt}-{mtime}", immutable=False)
+    response.vary.add('Accept')
+    return response
 
-            // Fixed-height selection summary - eliminates layout shifts
-            function updateSelectionSummary() {
-                if (allGroups.length === 0) return;
-                
-                let totalPhotosToDelete = 0;
-                let totalSavingsMB = 0;
-                let groupsWithDeletions = 0;
-                
-                allGroups.forEach(group => {
-                    const selectedPhotos = photoSelections[group.group_id] || [];
-                    const photosToDelete = group.photos.filter(photo => selectedPhotos.includes(photo.uuid));
-                    
-                    if (photosToDelete.length > 0) {
-                        groupsWithDeletions++;
-                        totalPhotosToDelete += photosToDelete.length;
-                        
-                        // Calculate estimated savings for this group
-                        const deletionSizeMB = photosToDelete.reduce((sum, photo) => {
-                            return sum + (photo.file_size / (1024 * 1024));
-                        }, 0);
-                        totalSavingsMB += deletionSizeMB;
-                    }
-                });
-                
-                const summaryDiv = document.getElementById('selectionSummary');
-                
-                if (totalPhotosToDelete > 0) {
-                    // Show content with smooth transition
-                    summaryDiv.classList.remove('empty');
-                    summaryDiv.classList.add('visible');
-                    summaryDiv.innerHTML = `
-                        <div class="selection-content">
-                            <div class="selection-header">
-                                <span style="font-size: 1.3rem; margin-right: 8px;">⚠️</span>
-                                <strong style="color: #856404;">DELETION SUMMARY</strong>
-                            </div>
-                            <div class="selection-stats">
-                                <strong>${totalPhotosToDelete} photos</strong> from <strong>${groupsWithDeletions} groups</strong> • <strong>~${totalSavingsMB.toFixed(1)} MB</strong> savings
-                            </div>
-                            <div class="selection-actions">
-                                <button class="btn" id="confirmBtn" onclick="confirmDeletions()" style="background-color: #FF5722; color: white; font-weight: 600;">
-                                    🗑️ Confirm Deletions
-                                </button>
-                            </div>
-                        </div>
-                    `;
-                } else {
-                    // Show empty state with helpful message
-                    summaryDiv.classList.add('empty');
-                    summaryDiv.classList.remove('visible');
-                    summaryDiv.innerHTML = `
-                        <div class="empty-state-content">
-                            <span style="font-size: 1.2rem; color: #6c757d;">📋</span>
-                            <div style="margin-top: 8px;">Select photos to see deletion summary</div>
-                        </div>
-                    `;
-                }
-            }
+def send_thumbnail_file(filename, mimetype, etag, immutable=False):
+    """Hand a file under THUMBNAIL_DIR to the front server (X-Accel-Redirect) or to sendfile(2).
+    
+    Python never reads the thumbnail bytes on either path. Only responses whose URL changes
+    with the content may be marked immutable - a content-addressed file behind a UUID URL
+    is not enough.
+    """
+    max_age = THUMBNAIL_MAX_AGE if immutable else THUMBNAIL_REVALIDATE_MAX_AGE
+    if THUMBNAIL_ACCEL_PREFIX:
+        # nginx sends the file itself (sendfile from page cache) and answers conditional requests
+        response = Response(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = f"{THUMBNAIL_ACCEL_PREFIX}{filename}"
+        response.cache_control.max_age = max_age
+    else:
+        response = send_from_directory(THUMBNAIL_DIR, filename, mimetype=mimetype, conditional=True,
+                                       etag=etag, max_age=max_age)
+    response.cache_control.public = True
+    response.cache_control.immutable = immutable
+    return response
 
-            function confirmDeletions() {
-                let totalPhotosToDelete = 0;
-                let deletionList = [];
-                
-                allGroups.forEach(group => {
-                    const selectedPhotos = photoSelections[group.group_id] || [];
-                    // FIXED: In inverted model, selected photos = photos to DELETE
-                    const photosToDelete = group.photos.filter(photo => selectedPhotos.includes(photo.uuid));
-                    
-                    photosToDelete.forEach(photo => {
-                        deletionList.push({
-                            group_id: group.group_id,
-                            uuid: photo.uuid,
-                            filename: photo.filename,
-                            timestamp: photo.timestamp,
-                            file_size: photo.file_size
-                        });
-                    });
-                    
-                    totalPhotosToDelete += photosToDelete.length;
-                });
-                
-                if (totalPhotosToDelete === 0) {
-                    showToast('No photos selected', 'error');
-                    return;
-                }
-                
-                // Direct execution - no confirmation needed for marking photos
-                executeWorkflow(deletionList, totalPhotosToDelete);
-            }
+def serve_thumbnail_bytes(data):
+    """Send a just-generated JPEG thumbnail straight from memory while its cache file is written.
+    
+    Same short max-age as serve_thumbnail - the UUID URL outlives edits to the original.
+    """
+    response = Response(data, mimetype='image/jpeg')
+    response.cache_control.max_age = THUMBNAIL_REVALIDATE_MAX_AGE
+    response.cache_control.public = True
+    response.vary.add('Accept')
+    return response
 
-            function executeWorkflow(deletionList, totalPhotosToDelete) {
-                // Calculate estimated savings
-                const totalSavingsMB = deletionList.reduce((sum, photo) => {
-                    return sum + (photo.file_size / (1024 * 1024));
-                }, 0);
-                
-                // Extract just the UUIDs
-                const photoUuids = deletionList.map(photo => photo.uuid);
-                
-                // Show loading state
-                const confirmBtn = document.getElementById('confirmBtn');
-                if (!confirmBtn) {
-                    console.error('❌ Confirm button not found!');
-                    showToast('Button error - please refresh the page', 'error');
-                    return;
-                }
-                const originalText = confirmBtn.textContent;
-                confirmBtn.textContent = '🔄 Processing...';
-                confirmBtn.disabled = true;
-                
-                // Call the workflow API
-                fetch('/api/complete-workflow', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        photo_uuids: photoUuids,
-                        estimated_savings_mb: totalSavingsMB
-                    })
-                })
-                .then(response => response.json())
-                .then(data => {
-                    if (data.success) {
-                        showWorkflowSuccess(data);
-                    } else {
-                        alert('❌ Something went wrong. Try again in a moment.');
-                    }
-                })
-                .catch(error => {
-                    console.error('Error executing workflow:', error);
-                    alert('❌ Network error: ' + error.message);
-                })
-                .finally(() => {
-                    // Restore button
-                    if (confirmBtn) {
-                        confirmBtn.textContent = originalText;
-                        confirmBtn.disabled = false;
-                    }
-                });
-            }
+# Static HTML pages, read once and served from memory (re-read on change in debug mode)
+page_cache = {}
+legacy_page = {}
 
-            function showWorkflowSuccess(data) {
-                const summary = data.summary;
-                const guidance = data.workflow_guidance;
-                
-                // Show simplified toast notification
-                showToast(`✅ ${summary.photos_processed} photos marked for deletion and added to "${summary.album_name}" album for your final review • ${summary.estimated_savings_mb.toFixed(0)} MB freed`, 'success', 4000);
-                
-                // Log detailed data to console
-                console.log('=== DELETION WORKFLOW COMPLETED ===');
-                console.log('Summary:', summary);
-                console.log('Export Data:', data.export_data);
-                console.log('Guidance:', guidance);
-                
-                // Optionally download the deletion list
-                downloadDeletionList(data.export_data, summary.session_id);
-            }
+def html_page(filename):
+    """Response for an HTML page next to app.py, read from disk only on first use."""
+    path = os.path.join(app.root_path, filename)
+    cached = page_cache.get(path)
+    if cached is None or (app.debug and os.stat(path).st_mtime != cached[0]):
+        with open(path, 'rb') as f:
+            cached = page_cache[path] = (os.fstat(f.fileno()).st_mtime, f.read())
+    return Response(cached[1], mimetype='text/html')
 
-            function downloadDeletionList(exportData, sessionId) {
-                // Create CSV content
-                const headers = ['UUID', 'Filename', 'Timestamp', 'Size (MB)', 'Camera', 'Width', 'Height', 'Format', 'Quality Score'];
-                const csvContent = [
-                    headers.join(','),
-                    ...exportData.map(photo => [
-                        photo.uuid,
-                        `"${photo.filename}"`,
-                        photo.timestamp,
-                        photo.file_size_mb,
-                        `"${photo.camera_model || ''}"`,
-                        photo.width || '',
-                        photo.height || '',
-                        photo.format || '',
-                        photo.quality_score || ''
-                    ].join(','))
-                ].join('\\n');
-                
-                // Create download link
-                const blob = new Blob([csvContent], { type: 'text/csv' });
-                const url = window.URL.createObjectURL(blob);
-                const a = document.createElement('a');
-                a.href = url;
-                a.download = `deletion_list_${sessionId}.csv`;
-                document.body.appendChild(a);
-                a.click();
-                document.body.removeChild(a);
-                window.URL.revokeObjectURL(url);
-                
-                console.log('📄 Deletion list CSV downloaded:', `deletion_list_${sessionId}.csv`);
-            }
+@app.route('/')
+def index():
+    """Main blur detection interface for photo quality analysis."""
+    try:
+        return html_page('blur_detection_interface.html')
+    except Exception as e:
+        print(f"Error serving blur detection interface: {e}")
+        return f"Error loading blur detection interface: {e}", 500
 
-            // Preview functionality
-            let currentPreviewGroup = null;
-            let currentPreviewIndex = 0;
+@app.route('/filters')
+def filters():
+    """Redirect to main blur detection interface."""
+    try:
+        return html_page('blur_detection_interface.html')
+    except Exception as e:
+        print(f"Error serving blur detection interface: {e}")
+        return f"Error loading blur detection interface: {e}", 500
 
-            function openPreview(groupId, photoIndex) {
-                const group = allGroups.find(g => g.group_id === groupId);
-                if (!group || !group.photos[photoIndex]) return;
+@app.route('/legacy')
+def legacy():
+    """Legacy interface for detailed photo analysis.
+    
+    The template has no variables, so it is rendered and gzipped once and reused.
+    """
+    if 'html' not in legacy_page or app.debug:
+        html = render_template('legacy.html').encode('utf-8')
+        legacy_page.update(html=html, gzip=gzip.compress(html, compresslevel=9))
+    
+    if request.accept_encodings['gzip'] > 0:  # quality-aware, so "gzip;q=0" gets the plain page
+        response = Response(legacy_page['gzip'], mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(legacy_page['html'], mimetype='text/html')
+    response.vary.add('Accept-Encoding')
+    return response
 
-                currentPreviewGroup = group;
-                currentPreviewIndex = photoIndex;
-                
-                const photo = group.photos[photoIndex];
-                const modal = document.getElementById('previewModal');
-                const image = document.getElementById('previewImage');
-                const filename = document.getElementById('previewFilename');
-                const metadata = document.getElementById('previewMetadata');
-                
-                // Set image source to full-resolution image
-                image.src = `/api/full-image/${photo.uuid}`;
-                image.onerror = function() {
-                    // Fallback to thumbnail if full image fails
-                    console.log('Full image failed, falling back to thumbnail');
-                    image.src = `/api/thumbnail/${photo.uuid}`;
-                    image.onerror = function() {
-                        image.style.display = 'none';
-                        image.nextElementSibling.innerHTML = '❌ Image not available for preview';
-                    };
-                };
-                
-                // Set metadata
-                filename.textContent = photo.filename;
-                const timestamp = photo.timestamp ? new Date(photo.timestamp).toLocaleString() : 'Unknown';
-                const resolution = photo.width && photo.height ? `${photo.width}×${photo.height}` : 'Unknown';
-                const fileSize = photo.file_size > 0 ? `${(photo.file_size / (1024*1024)).toFixed(1)} MB` : 'Unknown';
-                
-                metadata.innerHTML = `
-                    📅 ${timestamp}<br>
-                    💾 ${fileSize}<br>
-                    📷 ${photo.camera_model || 'Unknown camera'}
-                `;
-                
-                // Show modal
-                modal.style.display = 'block';
-                document.body.style.overflow = 'hidden';
-                
-                // Update navigation buttons
-                updatePreviewNavigation();
-            }
+# Versioned static assets (CSS/JS split out of the templates), held in memory with a gzip copy
+STATIC_ASSET_MAX_AGE = 31536000  # URLs carry a content hash, so a year is safe
+static_assets = {}
 
-            function closePreview() {
-                const modal = document.getElementById('previewModal');
-                modal.style.display = 'none';
-                document.body.style.overflow = '';
-                currentPreviewGroup = null;
-                currentPreviewIndex = 0;
-            }
+def static_asset(filename):
+    """(mtime, etag, body, gzipped body) for a file in static/, loaded on first use."""
+    path = safe_join(app.static_folder, filename)
+    if path is None:
+        raise FileNotFoundError(filename)
+    cached = static_assets.get(filename)
+    if cached is None or (app.debug and os.stat(path).st_mtime != cached[0]):
+        with open(path, 'rb') as f:
+            body = f.read()
+            cached = static_assets[filename] = (os.fstat(f.fileno()).st_mtime, hashlib.blake2b(body, digest_size=6).hexdigest(),
+                                                body, gzip.compress(body, compresslevel=9))
+    return cached
 
-            function navigatePhoto(direction) {
-                if (!currentPreviewGroup) return;
-                
-                const newIndex = currentPreviewIndex + direction;
-                if (newIndex >= 0 && newIndex < currentPreviewGroup.photos.length) {
-                    currentPreviewIndex = newIndex;
-                    const photo = currentPreviewGroup.photos[currentPreviewIndex];
-                    
-                    const image = document.getElementById('previewImage');
-                    const filename = document.getElementById('previewFilename');
-                    const metadata = document.getElementById('previewMetadata');
-                    
-                    // Set image source to full-resolution image
-                    image.src = `/api/full-image/${photo.uuid}`;
-                    image.onerror = function() {
-                        // Fallback to thumbnail if full image fails
-                        console.log('Full image failed, falling back to thumbnail');
-                        image.src = `/api/thumbnail/${photo.uuid}`;
-                        image.onerror = function() {
-                            image.style.display = 'none';
-                            image.nextElementSibling.innerHTML = '❌ Image not available for preview';
-                        };
-                    };
-                    filename.textContent = photo.filename;
-                    
-                    const timestamp = photo.timestamp ? new Date(photo.timestamp).toLocaleString() : 'Unknown';
-                    const resolution = photo.width && photo.height ? `${photo.width}×${photo.height}` : 'Unknown';
-                    const fileSize = photo.file_size > 0 ? `${(photo.file_size / (1024*1024)).toFixed(1)} MB` : 'Unknown';
-                    
-                    metadata.innerHTML = `
-                        📅 ${timestamp}<br>
-                        💾 ${fileSize}<br>
-                        📷 ${photo.camera_model || 'Unknown camera'}
-                    `;
-                    
-                    updatePreviewNavigation();
-                }
-            }
+@app.template_global()
+def asset_url(filename):
+    """URL of a static asset with its content hash, so browsers can cache it for a year."""
+    return url_for('serve_asset', filename=filename, v=static_asset(filename)[1])
 
-            function updatePreviewNavigation() {
-                const prevBtn = document.getElementById('prevPhoto');
-                const nextBtn = document.getElementById('nextPhoto');
-                
-                if (currentPreviewGroup) {
-                    prevBtn.style.display = currentPreviewIndex > 0 ? 'flex' : 'none';
-                    nextBtn.style.display = currentPreviewIndex < currentPreviewGroup.photos.length - 1 ? 'flex' : 'none';
-                }
-            }
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a static asset from memory - pre-gzipped, ETag'd and immutable."""
+    try:
+        _, etag, body, gzipped = static_asset(filename)
+    except FileNotFoundError:
+        return jsonify({'error': 'Asset not found'}), 404
+    
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if request.accept_encodings['gzip'] > 0:
+        response = Response(gzipped, mimetype=mimetype)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f"{etag}-gz")
+    else:
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = STATIC_ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
 
-            function openInPhotos(photoUuid) {
-                // Show visual feedback
-                const filenameElement = event.target;
-                const originalText = filenameElement.textContent;
-                filenameElement.textContent = '🔄 Opening in Photos...';
-                filenameElement.style.color = '#FF9800';
-                
-                // Call backend endpoint to open specific photo in Photos app
-                fetch(`/api/open-photo/${photoUuid}`, { method: 'POST' })
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            filenameElement.textContent = '✅ Opened in Photos!';
-                            filenameElement.style.color = '#4CAF50';
-                            setTimeout(() => {
-                                filenameElement.textContent = originalText;
-                                filenameElement.style.color = '#2196F3';
-                            }, 2000);
-                        } else {
-                            console.error('Failed to open photo in Photos app:', data.error);
-                            if (data.search_term) {
-                                filenameElement.textContent = `🔍 Search for: ${data.search_term}`;
-                                filenameElement.style.color = '#FF9800';
-                            } else {
-                                filenameElement.textContent = '❌ Failed to open';
-                                filenameElement.style.color = '#f44336';
-                            }
-                            setTimeout(() => {
-                                filenameElement.textContent = originalText;
-                                filenameElement.style.color = '#2196F3';
-                            }, 3000);
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Error opening photo:', error);
-                        filenameElement.textContent = '❌ Error';
-                        filenameElement.style.color = '#f44336';
-                        setTimeout(() => {
-                            filenameElement.textContent = originalText;
-                            filenameElement.style.color = '#2196F3';
-                            // Fallback: just open Photos app
-                            window.open('photos://', '_blank');
-                        }, 2000);
-                    });
-            }
+# /api/stats library count - walking the whole library is too slow for the request thread,
+# so it is recounted in the background and requests read the last result
+LIBRARY_COUNT_TTL_SECONDS = 300
+library_count = {'total_photos': None, 'excluded_count': 0, 'timestamp': None, 'error': None}
+library_count_refresh = threading.Lock()  # Held while a recount is running
 
-            // Enhanced keyboard navigation for UX improvements
-            let focusedPhotoCard = null;
-            let focusedGroup = null;
-            
-            document.addEventListener('keydown', function(e) {
-                // Preview modal navigation
-                if (document.getElementById('previewModal').style.display === 'block') {
-                    switch(e.key) {
-                        case 'Escape':
-                            closePreview();
-                            break;
-                        case 'ArrowLeft':
-                            navigatePhoto(-1);
-                            break;
-                        case 'ArrowRight':
-                            navigatePhoto(1);
-                            break;
-                    }
-                    e.preventDefault();
-                    return;
-                }
-                
-                // Main page keyboard shortcuts
-                switch(e.key.toLowerCase()) {
-                    case 'd':
-                        // Quick mark first recommended photo in visible groups
-                        if (!e.ctrlKey && !e.altKey && !e.metaKey) {
-                            const firstRecommended = document.querySelector('.photo-card.recommended .photo-action-button');
-                            if (firstRecommended) {
-                                firstRecommended.click();
-                                // Show brief feedback
-                                showToast('Photo marked with D key', 'info', 1500);
-                            }
-                            e.preventDefault();
-                        }
-                        break;
-                    case 'escape':
-                        // Close any open modals or clear focus
-                        closePreview();
-                        if (focusedPhotoCard) {
-                            focusedPhotoCard.blur();
-                            focusedPhotoCard = null;
-                        }
-                        break;
-                    case 'enter':
-                        // Open preview if a photo card is focused
-                        if (focusedPhotoCard && !e.ctrlKey && !e.altKey && !e.metaKey) {
-                            const photoImg = focusedPhotoCard.querySelector('.photo-thumbnail');
-                            if (photoImg) {
-                                photoImg.click();
-                            }
-                            e.preventDefault();
-                        }
-                        break;
-                    case ' ':
-                        // Space bar to toggle selection of focused photo
-                        if (focusedPhotoCard && !e.ctrlKey && !e.altKey && !e.metaKey) {
-                            const actionButton = focusedPhotoCard.querySelector('.photo-action-button');
-                            if (actionButton) {
-                                actionButton.click();
-                                // Show brief feedback
-                                const isSelected = focusedPhotoCard.classList.contains('selected');
-                                showToast(isSelected ? 'Photo marked for deletion' : 'Photo unmarked', 'info', 1500);
-                            }
-                            e.preventDefault();
-                        }
-                        break;
-                }
-            });
-            
-            // Add focus management for photo cards
-            function setupPhotoCardFocus() {
-                const photoCards = document.querySelectorAll('.photo-card');
-                photoCards.forEach((card, index) => {
-                    card.tabIndex = 0; // Make focusable
-                    
-                    card.addEventListener('focus', function() {
-                        focusedPhotoCard = this;
-                        this.style.outline = '2px solid #3182ce';
-                        this.style.outlineOffset = '2px';
-                    });
-                    
-                    card.addEventListener('blur', function() {
-                        if (focusedPhotoCard === this) {
-                            focusedPhotoCard = null;
-                        }
-                        this.style.outline = '';
-                        this.style.outlineOffset = '';
-                    });
-                    
-                    // Arrow key navigation between photo cards
-                    card.addEventListener('keydown', function(e) {
-                        if (e.key === 'ArrowLeft' || e.key === 'ArrowRight') {
-                            const direction = e.key === 'ArrowRight' ? 1 : -1;
-                            const currentIndex = Array.from(photoCards).indexOf(this);
-                            const nextIndex = Math.max(0, Math.min(photoCards.length - 1, currentIndex + direction));
-                            if (nextIndex !== currentIndex) {
-                                photoCards[nextIndex].focus();
-                            }
-                            e.preventDefault();
-                        }
-                    });
-                });
-            }
-            
-            // Setup focus management when groups are loaded
-            function setupAccessibility() {
-                setupPhotoCardFocus();
-            }
-        </script>
-    </body>
-    </html>
-    '''
-    return render_template_string(html_template)
+def refresh_library_count():
+    """Recount the photos /api/stats reports. Runs on its own thread; releases library_count_refresh."""
+    try:
+        print("📊 Computing photo library statistics (metadata only)...")
+        snapshot = library_snapshot(include_videos=False)
+        library_count.update(total_photos=len(snapshot.photos), excluded_count=snapshot.excluded_count,
+                             timestamp=time.monotonic(), error=None)
+        print(f"📊 Found {len(snapshot.photos)} photos ({snapshot.excluded_count} excluded) - no expensive analysis performed")
+    except Exception as e:
+        # Reported by /api/stats until a later recount succeeds
+        app.logger.exception("Library count refresh failed")
+        library_count['error'] = str(e)
+    finally:
+        library_count_refresh.release()
+
+def request_library_count():
+    """Start a background recount when the cached count is missing or stale (at most one at a time)."""
+    timestamp = library_count['timestamp']
+    if timestamp is not None and time.monotonic() - timestamp < LIBRARY_COUNT_TTL_SECONDS:
+        return
+    if library_count_refresh.acquire(blocking=False):
+        threading.Thread(target=refresh_library_count, name='library-count', daemon=True).start()
 
 @app.route('/api/stats')
 def api_stats():
     """API endpoint returning Photos library statistics with real group analysis."""
     try:
-        print("📊 Computing photo library statistics (metadata only)...")
+        request_library_count()
+        total_photos = library_count['total_photos']
+        
+        if library_count['error'] is not None:
+            # The last recount failed (e.g. the library could not be opened)
+            return jsonify({
+                'success': False,
+                'error': library_count['error'],
+                'timestamp': datetime.now().isoformat()
+            }), 500
         
-        # Get basic photo count WITHOUT expensive analysis (just metadata)
-        all_photos, excluded_count = scanner.get_unprocessed_photos(include_videos=False)
-        total_photos = len(all_photos)
-        print(f"📊 Found {total_photos} photos ({excluded_count} excluded) - no expensive analysis performed")
+        if total_photos is None:
+            # First request - the count is still being taken in the background
+            return jsonify({
+                'success': True,
+                'computing': True,
+                'total_photos': None,
+                'potential_groups': "Click 'Analyze My Photos' to find duplicates",
+                'estimated_savings': "Counting photos...",
+                'timestamp': datetime.now().isoformat()
+            })
         
         if total_photos == 0:
             return jsonify({
@@ -1881,8 +1314,7 @@ def api_stats():
         
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in api_stats: {error_msg}")
-        print(traceback.format_exc())
+        app.logger.exception("api_stats failed")
         
         return jsonify({
             'success': False,
@@ -1890,19 +1322,83 @@ def api_stats():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def photo_size_date_arrays(photos):
+    """original_filesize (0 when unknown) and date as epoch seconds (NaN when unknown) per photo, read in one pass."""
+    sizes, times = [], []
+    for p in photos:
+        sizes.append(p.original_filesize or 0)
+        times.append(p.date.timestamp() if p.date else np.nan)
+    return np.array(sizes, dtype=np.int64), np.array(times, dtype=np.float64)
+
+def photo_date_range(photos, times):
+    """ISO dates of the earliest and latest photo, given photo_size_date_arrays() times; (None, None) if undated."""
+    dated = np.flatnonzero(~np.isnan(times))
+    if dated.size == 0:
+        return None, None
+    first = dated[np.argmin(times[dated])]
+    last = dated[np.argmax(times[dated])]
+    return photos[first].date.isoformat(), photos[last].date.isoformat()
+
+CAMERA_MODEL_SAMPLE_SIZE = 1000  # Photos whose EXIF is read - each exif_info is a database lookup
+CAMERA_MODEL_DISTINCT_LIMIT = 50  # Enough distinct models seen to pick the top 10
+
+def library_camera_models(photos, top=10):
+    """Most common camera models among the first CAMERA_MODEL_SAMPLE_SIZE photos, most common first."""
+    counts = Counter()
+    for p in photos[:CAMERA_MODEL_SAMPLE_SIZE]:
+        exif_info = getattr(p, 'exif_info', None)
+        camera_model = getattr(exif_info, 'camera_model', None) if exif_info else None
+        if camera_model:
+            counts[camera_model] += 1
+            if len(counts) >= CAMERA_MODEL_DISTINCT_LIMIT:
+                break
+    return [model for model, _ in counts.most_common(top)]
+
+# The filtered library and its size/date columns, read once and shared by the stats, filter-preview
+# and smart-analysis endpoints instead of each re-walking every PhotoInfo
+LIBRARY_SNAPSHOT_TTL_SECONDS = 300
+
+@dataclass
+class LibrarySnapshot:
+    photos: list          # get_unprocessed_photos() result
+    excluded_count: int
+    sizes: np.ndarray     # original_filesize per photo, 0 when unknown
+    times: np.ndarray     # date per photo as epoch seconds, NaN when unknown
+    created: float        # time.monotonic() when taken
+
+library_snapshots = {}  # include_videos -> LibrarySnapshot
+library_snapshots_lock = threading.Lock()  # Also makes concurrent callers share one scan
+
+def library_snapshot(include_videos=False):
+    """Unprocessed photos plus size/date arrays, rescanned after LIBRARY_SNAPSHOT_TTL_SECONDS."""
+    with library_snapshots_lock:
+        snapshot = library_snapshots.get(include_videos)
+        if snapshot is None or time.monotonic() - snapshot.created >= LIBRARY_SNAPSHOT_TTL_SECONDS:
+            photos, excluded_count = scanner.get_unprocessed_photos(include_videos=include_videos)
+            sizes, times = photo_size_date_arrays(photos)
+            snapshot = library_snapshots[include_videos] = LibrarySnapshot(
+                photos, excluded_count, sizes, times, time.monotonic())
+        return snapshot
+
+def clear_library_snapshots():
+    """Drop the snapshots, e.g. after photos are marked for deletion or the library is reopened."""
+    with library_snapshots_lock:
+        library_snapshots.clear()
+
 @app.route('/api/library-stats')
 def api_library_stats():
     """Fast endpoint for basic library statistics without analysis"""
     global cached_library_stats, cached_library_timestamp
     
     try:
+        load_shared_analysis_cache()
         # Check if we have cached stats from smart analysis first (preferred)
         now = datetime.now()
         if (cached_library_stats is not None and cached_library_timestamp is not None and 
             (now - cached_library_timestamp).total_seconds() < 1800):
             print("📋 Using cached library stats from smart analysis")
             stats = cached_library_stats
-            return jsonify({
+            return cached_analysis_response('library-stats', lambda: {
                 'success': True,
                 'stats': {
                     'total_photos': stats['total_photos'],
@@ -1917,11 +1413,11 @@ def api_library_stats():
             })
         
         # Fall back to fresh computation if no cached data
-        scanner = PhotoScanner()
         db = scanner.get_photosdb()
         
         # Get basic stats without expensive operations - excluding marked for deletion
-        photos, excluded_count = scanner.get_unprocessed_photos(include_videos=False)
+        snapshot = library_snapshot(include_videos=False)
+        photos, excluded_count = snapshot.photos, snapshot.excluded_count
         total_photos = len(photos)
         if excluded_count > 0:
             print(f"📊 Library stats: excluded {excluded_count} photos already marked for deletion")
@@ -1942,26 +1438,14 @@ def api_library_stats():
             })
         
         # Basic calculations
-        total_size = sum(p.original_filesize for p in photos if p.original_filesize)
+        total_size = int(snapshot.sizes.sum())
         total_size_gb = total_size / (1024 ** 3)
         
         # Get date range
-        dates = [p.date for p in photos if p.date]
-        if dates:
-            date_range_start = min(dates).isoformat()
-            date_range_end = max(dates).isoformat()
-        else:
-            date_range_start = None
-            date_range_end = None
+        date_range_start, date_range_end = photo_date_range(photos, snapshot.times)
         
         # Get camera models (limit to prevent slowdown)
-        camera_models = []
-        for p in photos[:1000]:
-            if hasattr(p, 'exif_info') and p.exif_info:
-                camera_model = getattr(p.exif_info, 'camera_model', None)
-                if camera_model:
-                    camera_models.append(camera_model)
-        camera_models = list(set(camera_models))[:10]
+        camera_models = library_camera_models(photos)
         
         return jsonify({
             'success': True,
@@ -1992,12 +1476,11 @@ def api_filter_preview():
         min_size_mb = float(request.args.get('min_size_mb', 5))
         min_size_bytes = min_size_mb * 1024 * 1024
         
-        scanner = PhotoScanner()
-        photos, excluded_count = scanner.get_unprocessed_photos(include_videos=False)
-        if excluded_count > 0:
-            print(f"🗑️ Filter preview: excluded {excluded_count} photos already marked for deletion")
+        snapshot = library_snapshot(include_videos=False)
+        if snapshot.excluded_count > 0:
+            print(f"🗑️ Filter preview: excluded {snapshot.excluded_count} photos already marked for deletion")
         
-        total_photos = len(photos)
+        total_photos = len(snapshot.photos)
         if total_photos == 0:
             return jsonify({
                 'success': True,
@@ -2007,8 +1490,7 @@ def api_filter_preview():
             })
         
         # Filter by file size
-        filtered_photos = [p for p in photos if p.original_filesize and p.original_filesize >= min_size_bytes]
-        filtered_count = len(filtered_photos)
+        filtered_count = int(np.count_nonzero((snapshot.sizes > 0) & (snapshot.sizes >= min_size_bytes)))
         percentage = (filtered_count / total_photos) * 100 if total_photos > 0 else 0
         
         return jsonify({
@@ -2019,18 +1501,275 @@ def api_filter_preview():
         })
     
     except Exception as e:
-        print(f"❌ Error in filter preview: {str(e)}")
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        })
+        print(f"❌ Error in filter preview: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+# Optional Numba kernel for priority scoring - one pass per group instead of a dozen reduceats
+try:
+    import numba
+except ImportError:
+    numba = None
+    print("⚠️ numba not available - priority scoring will use NumPy")
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _priority_kernel(file_sizes, timestamps, quality_scores, cameras, offsets, counts):
+        """Native version of the reduceat path in group_priority_scores, one group per prange row."""
+        n_groups = offsets.shape[0]
+        scores = np.empty(n_groups)
+        for g in numba.prange(n_groups):
+            start = offsets[g]
+            n = counts[g]
+            size_total = 0.0
+            dated = 0
+            rated = 0
+            known = 0
+            t_min = np.inf
+            t_max = -np.inf
+            q_min = np.inf
+            q_max = -np.inf
+            cam_min = np.iinfo(np.int64).max
+            cam_max = 0
+            for k in range(start, start + n):
+                size_total += file_sizes[k]
+                t = timestamps[k]
+                if not np.isnan(t):
+                    dated += 1
+                    t_min = min(t_min, t)
+                    t_max = max(t_max, t)
+                q = quality_scores[k]
+                if not np.isnan(q):
+                    rated += 1
+                    q_min = min(q_min, q)
+                    q_max = max(q_max, q)
+                c = cameras[k]
+                if c > 0:
+                    known += 1
+                    cam_min = min(cam_min, c)
+                    cam_max = max(cam_max, c)
+            
+            file_size_factor = min(100.0, (size_total / n / (1024 * 1024) / 10.0) * 50)
+            time_proximity_factor = max(0.0, 100 - (t_max - t_min) / 3.0) if dated >= 2 else 0.0
+            camera_factor = 100.0 if known > 0 and cam_min == cam_max else 50.0
+            group_confidence_factor = (min(100.0, (n - 1) * 25.0) + camera_factor) / 2
+            if rated > 1:
+                similarity_factor = min(100.0, (q_max - q_min) * 2)
+            elif rated == 1:
+                similarity_factor = 0.0
+            else:
+                similarity_factor = 50.0  # Neutral if no quality data
+            
+            priority = (
+                file_size_factor * 0.4 +
+                time_proximity_factor * 0.3 +
+                group_confidence_factor * 0.2 +
+                similarity_factor * 0.1
+            )
+            scores[g] = min(100.0, max(0.0, priority))
+        return scores
+    
+    # Compile once at import so the first analysis doesn't pay the JIT cost
+    try:
+        _priority_kernel(np.zeros(2), np.zeros(2), np.zeros(2), np.zeros(2, dtype=np.int64),
+                         np.zeros(1, dtype=np.int64), np.full(1, 2, dtype=np.int64))
+    except Exception as e:
+        print(f"⚠️ numba priority scoring unavailable: {e}")
+        numba = None
+
+def group_priority_scores(groups):
+    """Priority score (0-100) per group from duplicate confidence indicators, for all groups at once.
+    
+    Every group's photos are laid end to end in flat arrays and each factor is a segmented
+    (reduceat) reduction over them:
+      - file size (40%): average size, 0MB=0, 10MB=50, 20MB+=100
+      - time proximity (30%): span of the dated photos, 0s=100, 60s=80, 300s+=0
+      - group confidence (20%): group size (2 photos=25 ... 5+=100) averaged with 100 for a
+        single known camera, else 50
+      - similarity (10%): spread of the positive quality scores x2, 50 when there are none
+    Groups with fewer than two photos score 0. With numba installed the same factors are
+    computed by _priority_kernel in a single parallel pass.
+    """
+    scores = np.zeros(len(groups))
+    scored = [i for i, group in enumerate(groups) if len(group.photos) >= 2]
+    if not scored:
+        return scores
+    
+    camera_codes = {}
+    file_sizes, timestamps, quality_scores, cameras, counts = [], [], [], [], []
+    for i in scored:
+        photos = groups[i].photos
+        counts.append(len(photos))
+        for p in photos:
+            file_sizes.append(p.file_size)
+            timestamps.append(p.timestamp.timestamp() if p.timestamp else np.nan)
+            quality_scores.append(p.quality_score if p.quality_score > 0 else np.nan)
+            # 0 = no camera model; real models count up from 1
+            cameras.append(camera_codes.setdefault(p.camera_model, len(camera_codes) + 1) if p.camera_model else 0)
+    
+    counts = np.array(counts, dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(counts)[:-1]]
+    file_sizes = np.array(file_sizes, dtype=np.float64)
+    timestamps = np.array(timestamps, dtype=np.float64)
+    quality_scores = np.array(quality_scores, dtype=np.float64)
+    cameras = np.array(cameras, dtype=np.int64)
+    
+    if numba is not None:
+        scores[scored] = _priority_kernel(file_sizes, timestamps, quality_scores, cameras, offsets, counts)
+        return scores
+    
+    # Factor 1: File size factor - Larger files = higher priority for savings
+    file_size_mb = np.add.reduceat(file_sizes, offsets) / counts / (1024 * 1024)
+    file_size_factor = np.minimum(100, (file_size_mb / 10.0) * 50)
+    
+    # Factor 2: Time proximity factor - Closer timestamps = higher confidence (fmax/fmin skip NaN)
+    dated = np.add.reduceat(~np.isnan(timestamps), offsets)
+    time_span = np.fmax.reduceat(timestamps, offsets) - np.fmin.reduceat(timestamps, offsets)
+    time_proximity_factor = np.where(dated >= 2, np.maximum(0, 100 - time_span / 3.0), 0)
+    
+    # Factor 3: Group confidence factor - More photos + same camera = higher confidence
+    group_size_factor = np.minimum(100, (counts - 1) * 25)
+    known = cameras > 0
+    lowest_camera = np.minimum.reduceat(np.where(known, cameras, np.iinfo(np.int64).max), offsets)
+    highest_camera = np.maximum.reduceat(cameras, offsets)
+    one_camera = (np.add.reduceat(known, offsets) > 0) & (lowest_camera == highest_camera)
+    camera_factor = np.where(one_camera, 100, 50)
+    group_confidence_factor = (group_size_factor + camera_factor) / 2
+    
+    # Factor 4: Similarity factor - High variation in quality scores suggests one clear best photo
+    rated = np.add.reduceat(~np.isnan(quality_scores), offsets)
+    quality_variation = np.fmax.reduceat(quality_scores, offsets) - np.fmin.reduceat(quality_scores, offsets)
+    similarity_factor = np.where(rated > 1, np.minimum(100, np.nan_to_num(quality_variation) * 2), 0)
+    similarity_factor = np.where(rated > 0, similarity_factor, 50)  # Neutral if no quality data
+    
+    # Combine factors with weights
+    priority = (
+        file_size_factor * 0.4 +
+        time_proximity_factor * 0.3 +
+        group_confidence_factor * 0.2 +
+        similarity_factor * 0.1
+    )
+    scores[scored] = np.clip(priority, 0, 100)
+    return scores
+
+@dataclass
+class Cluster:
+    """One scored duplicate group as shown on the dashboard and kept in the cached_clusters global.
+    
+    Carries the same summary fields as library_analyzer.PhotoCluster, filled in once by
+    from_group(), so the cluster endpoints serialize either kind without touching the photos.
+    """
+    __slots__ = ('cluster_id', 'group_id', 'photos', 'duplicate_probability_score',
+                 'potential_savings_bytes', 'priority_level', 'recommended_photo', 'photo_uuids',
+                 'photo_count', 'time_span_start', 'time_span_end', 'total_size_bytes',
+                 'camera_model', 'location_summary')
+    cluster_id: str
+    group_id: str
+    photos: list
+    duplicate_probability_score: float
+    potential_savings_bytes: int
+    priority_level: str           # "P1" (most likely duplicates) .. "P10"
+    recommended_photo: object     # PhotoData to keep, None for an empty group
+    photo_uuids: list
+    photo_count: int
+    time_span_start: object       # datetime of the earliest photo, None if undated
+    time_span_end: object
+    total_size_bytes: int
+    camera_model: object          # First known camera model, else None
+    location_summary: object      # Not available from PhotoData - always None
+    
+    @classmethod
+    def from_group(cls, cluster_id, group, score, level):
+        """Cluster for a PhotoGroup with its priority score and P1-P10 level."""
+        photos = group.photos
+        timestamps = [p.timestamp for p in photos if p.timestamp]
+        return cls(
+            cluster_id=cluster_id,
+            group_id=cluster_id,  # Keep group_id for compatibility
+            photos=photos,
+            duplicate_probability_score=score,
+            potential_savings_bytes=group.potential_savings_bytes,
+            priority_level=level,
+            recommended_photo=photos[0] if photos else None,
+            photo_uuids=[p.uuid for p in photos],  # Add photo_uuids for legacy compatibility
+            photo_count=len(photos),
+            time_span_start=min(timestamps) if timestamps else None,
+            time_span_end=max(timestamps) if timestamps else None,
+            total_size_bytes=sum(p.file_size for p in photos),
+            camera_model=next((p.camera_model for p in photos if p.camera_model), None),
+            location_summary=None
+        )
+
+# Analysis results that cross process boundaries (the shared Redis cache, Celery results) travel
+# as tagged JSON. Only these dataclasses are rebuilt on the way back in, so a tampered payload can
+# supply bad data but cannot run code.
+ANALYSIS_VALUE_TYPES = {cls.__name__: cls for cls in (PhotoData, PhotoGroup, Cluster, LibraryStats, PhotoCluster)}
+ANALYSIS_DERIVED_FIELDS = ('api_fields', 'timestamp_iso')  # PhotoData rebuilds these in __post_init__
+
+def encode_analysis_value(value):
+    """JSON-ready copy of analysis results: ANALYSIS_VALUE_TYPES dataclasses, datetimes, lists and dicts."""
+    if isinstance(value, datetime):
+        return {'_datetime': value.isoformat()}
+    if is_dataclass(value) and type(value).__name__ in ANALYSIS_VALUE_TYPES:
+        return {'_dataclass': type(value).__name__,
+                'fields': {f.name: encode_analysis_value(getattr(value, f.name))
+                           for f in fields(value) if f.init and f.name not in ANALYSIS_DERIVED_FIELDS}}
+    if isinstance(value, (list, tuple)):
+        return [encode_analysis_value(v) for v in value]
+    if isinstance(value, dict):
+        return {k: encode_analysis_value(v) for k, v in value.items()}
+    if isinstance(value, np.generic):  # e.g. numpy float quality scores
+        return value.item()
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Cannot share analysis value of type {type(value).__name__}")
+
+def decode_analysis_value(value):
+    """Inverse of encode_analysis_value(); raises ValueError for anything it did not produce."""
+    if isinstance(value, list):
+        return [decode_analysis_value(v) for v in value]
+    if isinstance(value, dict):
+        if '_datetime' in value:
+            return datetime.fromisoformat(value['_datetime'])
+        if '_dataclass' in value:
+            cls = ANALYSIS_VALUE_TYPES.get(value['_dataclass'])
+            if cls is None or not isinstance(value.get('fields'), dict):
+                raise ValueError(f"Unexpected analysis value {value['_dataclass']!r}")
+            try:
+                return cls(**{name: decode_analysis_value(v) for name, v in value['fields'].items()})
+            except TypeError as e:
+                raise ValueError(f"Bad {value['_dataclass']} fields: {e}") from e
+        return {k: decode_analysis_value(v) for k, v in value.items()}
+    return value
+
+# P1-P10 bands: a score of 90+ is P1, 80-90 is P2, ... under 10 is P10
+PRIORITY_LEVEL_THRESHOLDS = np.array([10, 20, 30, 40, 50, 60, 70, 80, 90], dtype=np.float64)
+PRIORITY_LEVELS = np.array([f"P{i}" for i in range(10, 0, -1)])
+
+def score_priority_levels(scores):
+    """P1-P10 level for each 0-100 priority score, via one binary search per score."""
+    return PRIORITY_LEVELS[np.searchsorted(PRIORITY_LEVEL_THRESHOLDS, scores, side='right')].tolist()
+
+def cluster_priority_summary(clusters):
+    """Cluster count, savings and photo count per P1-P10 level, in one pass over the clusters."""
+    priority_summary = {level: {'count': 0, 'total_savings_mb': 0, 'photo_count': 0}
+                        for level in PRIORITY_LEVELS[::-1].tolist()}
+    for c in clusters:
+        summary = priority_summary[c.priority_level]
+        summary['count'] += 1
+        summary['total_savings_mb'] += c.potential_savings_bytes
+        summary['photo_count'] += len(c.photos)
+    for summary in priority_summary.values():
+        summary['total_savings_mb'] /= 1024 * 1024
+    return priority_summary
 
 def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos):
     """Run analysis on only the selected photos from filter interface"""
     try:
         print(f"🎯 Running filtered analysis on {filter_session['total_photos_in_filter']} selected photos")
         
-        scanner = PhotoScanner()
         db = scanner.get_photosdb()
         
         # Get the selected photo UUIDs
@@ -2044,7 +1783,8 @@ def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos
         print(f"📋 Working with {len(selected_photo_uuids)} selected photo UUIDs")
         
         # Get all unprocessed photos from library and filter to only selected ones (excludes marked for deletion)
-        all_photos, excluded_count = scanner.get_unprocessed_photos(include_videos=True)
+        snapshot = library_snapshot(include_videos=True)
+        all_photos, excluded_count = snapshot.photos, snapshot.excluded_count
         selected_photos = [p for p in all_photos if p.uuid in selected_photo_uuids]
         print(f"🔄 Excluded {excluded_count} photos already marked for deletion from filter selection")
         
@@ -2083,25 +1823,16 @@ def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos
         else:
             photos_to_analyze = size_filtered_photos
         
-        # Sort by file size (largest first) for priority analysis
-        photos_to_analyze.sort(key=lambda p: p.original_filesize or 0, reverse=True)
-        
-        # Limit to max_photos for performance
+        # Limit to max_photos for performance, largest first for priority analysis
+        # (a max_photos-sized heap rather than sorting the whole selection)
         if len(photos_to_analyze) > max_photos:
             print(f"🔄 Limiting analysis to top {max_photos} largest photos")
-            photos_to_analyze = photos_to_analyze[:max_photos]
+        photos_to_analyze = heapq.nlargest(max_photos, photos_to_analyze, key=lambda p: p.original_filesize or 0)
         
         print(f"🔍 Converting {len(photos_to_analyze)} photos to PhotoData format...")
         
-        # Convert PhotoInfo objects to PhotoData objects
-        photo_data_list = []
-        for photo in photos_to_analyze:
-            try:
-                photo_data = scanner.extract_photo_metadata(photo)
-                photo_data_list.append(photo_data)
-            except Exception as e:
-                print(f"⚠️ Error processing photo {photo.uuid}: {e}")
-                continue
+        # Convert PhotoInfo objects to PhotoData objects (failures come back as minimal PhotoData)
+        photo_data_list = scanner.extract_photo_metadata_batch(photos_to_analyze)
         
         print(f"✅ Successfully processed {len(photo_data_list)} photos")
         
@@ -2118,109 +1849,23 @@ def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos
             groups = scanner.group_photos_by_time_and_camera(photo_data_list)
         
         print(f"📊 Created {len(groups)} groups from selected photos")
+        filtered_groups = groups
+        all_group_photos = photo_data_list
         
-        # Apply the same priority scoring from the main analysis function
-        def _calculate_priority_score(group):
-            """Calculate real priority score (0-100) based on duplicate confidence indicators"""
-            if not group.photos or len(group.photos) < 2:
-                return 0
-            
-            # Factor 1: File size factor (40%) - Larger files = higher priority for savings
-            avg_file_size = sum(p.file_size for p in group.photos) / len(group.photos)
-            file_size_mb = avg_file_size / (1024 * 1024)
-            # Scale: 0MB=0, 10MB=50, 20MB+=100
-            file_size_factor = min(100, (file_size_mb / 10.0) * 50)
-            
-            # Factor 2: Time proximity factor (30%) - Closer timestamps = higher confidence
-            timestamps = [p.timestamp for p in group.photos if p.timestamp]
-            if len(timestamps) >= 2:
-                time_span = max(timestamps) - min(timestamps)
-                time_span_seconds = time_span.total_seconds()
-                # Scale: 0s=100, 10s=80, 60s=20, 300s+=0
-                time_proximity_factor = max(0, 100 - (time_span_seconds / 3.0))
-            else:
-                time_proximity_factor = 0
-                
-            # Factor 3: Group confidence factor (20%) - More photos + same camera = higher confidence
-            group_size_factor = min(100, (len(group.photos) - 1) * 25)  # 2 photos=25, 3=50, 4+=75-100
-            
-            # Same camera bonus
-            cameras = set(p.camera_model for p in group.photos if p.camera_model)
-            camera_factor = 100 if len(cameras) == 1 and list(cameras)[0] else 50
-            group_confidence_factor = (group_size_factor + camera_factor) / 2
-            
-            # Factor 4: Similarity factor (10%) - Quality scores and potential visual similarity  
-            quality_scores = [p.quality_score for p in group.photos if p.quality_score > 0]
-            if quality_scores:
-                # High variation in quality scores suggests one clear best photo
-                quality_variation = max(quality_scores) - min(quality_scores) if len(quality_scores) > 1 else 0
-                similarity_factor = min(100, quality_variation * 2)  # Higher variation = clearer duplicate
-            else:
-                similarity_factor = 50  # Neutral if no quality data
-            
-            # Combine factors with weights
-            priority_score = (
-                file_size_factor * 0.4 +
-                time_proximity_factor * 0.3 + 
-                group_confidence_factor * 0.2 +
-                similarity_factor * 0.1
-            )
-            
-            priority_score = min(100, max(0, priority_score))
-            return priority_score
-        
-        def _score_to_priority_level(score):
-            """Convert 0-100 priority score to P1-P10 level"""
-            if score >= 90: return "P1"    # Perfect matches - large files, perfect timing  
-            elif score >= 80: return "P2"  # Very high confidence - burst photos, large savings
-            elif score >= 70: return "P3"  # High confidence - clear duplicates, good savings
-            elif score >= 60: return "P4"  # High-medium confidence
-            elif score >= 50: return "P5"  # Medium+ confidence  
-            elif score >= 40: return "P6"  # Medium confidence
-            elif score >= 30: return "P7"  # Medium-low confidence
-            elif score >= 20: return "P8"  # Low+ confidence
-            elif score >= 10: return "P9"  # Low confidence
-            else: return "P10"              # Lowest confidence
-        
-        # Convert to clusters for dashboard display
+        # Convert to clusters for dashboard display - same priority scoring and levels as the main analysis function
         clusters = []
+        scores = group_priority_scores(groups)
+        levels = score_priority_levels(scores)
         for i, group in enumerate(groups):
-            priority_score = _calculate_priority_score(group)
-            priority_level = _score_to_priority_level(priority_score)
-            
-            cluster = type('Cluster', (), {
-                'cluster_id': f"filtered_cluster_{i}",
-                'group_id': f"filtered_cluster_{i}",
-                'photos': group.photos,
-                'duplicate_probability_score': priority_score,
-                'potential_savings_bytes': group.potential_savings_bytes,
-                'priority_level': priority_level,
-                'recommended_photo': group.photos[0] if group.photos else None,
-                'photo_uuids': [p.uuid for p in group.photos]
-            })()
-            clusters.append(cluster)
+            clusters.append(Cluster.from_group(f"filtered_cluster_{i}", group, float(scores[i]), levels[i]))
         
         # Create dashboard data structure
-        priority_summary = {}
-        for p_level in [f"P{i}" for i in range(1, 11)]:
-            level_clusters = [c for c in clusters if c.priority_level == p_level]
-            if level_clusters:
-                priority_summary[p_level] = {
-                    'count': len(level_clusters),
-                    'total_savings_mb': sum(c.potential_savings_bytes for c in level_clusters) / (1024*1024),
-                    'photo_count': sum(len(c.photos) for c in level_clusters)
-                }
-            else:
-                priority_summary[p_level] = {
-                    'count': 0,
-                    'total_savings_mb': 0,
-                    'photo_count': 0
-                }
+        priority_summary = cluster_priority_summary(clusters)
         
-        # Get library stats (but keep them as overview stats for context) - excluding marked for deletion
-        all_photos, _ = scanner.get_unprocessed_photos(include_videos=True)
+        # Library stats (kept as overview stats for context) from the snapshot's size/date arrays
         total_savings = sum(g.potential_savings_bytes for g in filtered_groups)
-        total_library_size = sum(p.original_filesize for p in all_photos if p.original_filesize) / (1024**3)
+        total_library_size = int(snapshot.sizes.sum()) / (1024**3)
+        date_range_start, date_range_end = photo_date_range(all_photos, snapshot.times)
         
         stats = {
             'total_photos': len(all_photos),  # Keep full library count for context
@@ -2228,10 +1873,9 @@ def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos
             'estimated_duplicates': len(filtered_groups),  # But show only filtered duplicates
             'potential_savings_gb': total_savings / (1024**3),  # Only savings from filtered selection
             'potential_groups': len(filtered_groups),  # Only filtered groups
-            'date_range_start': min(p.date for p in all_photos if p.date).isoformat() if any(p.date for p in all_photos) else None,
-            'date_range_end': max(p.date for p in all_photos if p.date).isoformat() if any(p.date for p in all_photos) else None,
-            'camera_models': list(set([getattr(p.exif_info, 'camera_model', None) for p in all_photos[:1000] 
-                                    if hasattr(p, 'exif_info') and p.exif_info and getattr(p.exif_info, 'camera_model', None)]))[:10],
+            'date_range_start': date_range_start,
+            'date_range_end': date_range_end,
+            'camera_models': library_camera_models(all_photos),
             'photos_analyzed': len(all_group_photos),  # Photos in the filtered selection
             'filtered_mode': True  # Flag to indicate this is filtered analysis
         }
@@ -2243,6 +1887,7 @@ def run_filtered_analysis(filter_session, min_size_mb, analysis_type, max_photos
         cached_library_timestamp = datetime.now()
         cached_groups = filtered_groups
         cached_timestamp = datetime.now()
+        share_analysis_cache()
         
         dashboard_data = {
             'library_stats': stats,
@@ -2318,32 +1963,29 @@ def api_smart_analysis():
         
         print(f"🎯 Starting overview analysis: {analysis_type}, min_size={min_size_mb}MB, max={max_photos}")
         
-        scanner = PhotoScanner()
-        
         # Get ALL unprocessed photos first (excludes marked for deletion)
-        all_photos, excluded_count = scanner.get_unprocessed_photos(include_videos=True)
+        snapshot = library_snapshot(include_videos=True)
+        all_photos, excluded_count = snapshot.photos, snapshot.excluded_count
+        sizes, times = snapshot.sizes, snapshot.times
         print(f"📚 Total library: {len(all_photos)} photos (excluded {excluded_count} already marked for deletion)")
         
         # Filter by size across ENTIRE library
-        size_filtered = [p for p in all_photos 
-                        if p.original_filesize and p.original_filesize >= min_size_bytes]
+        size_filtered = np.flatnonzero((sizes > 0) & (sizes >= min_size_bytes))
         print(f"📈 Photos ≥{min_size_mb}MB: {len(size_filtered)} ({len(size_filtered)/len(all_photos)*100:.1f}%)")
         
-        # Sort by file size (largest first) to prioritize biggest savings
-        size_filtered.sort(key=lambda p: p.original_filesize, reverse=True)
-        
-        # NOW limit to prevent infinite processing, but from the largest files
-        photos = size_filtered[:max_photos]
+        # NOW limit to prevent infinite processing, but from the largest files: partition out the
+        # max_photos largest, then order just those (largest first, library order on ties)
+        if len(size_filtered) > max_photos:
+            size_filtered = size_filtered[np.argpartition(-sizes[size_filtered], max_photos - 1)[:max_photos]]
+        size_filtered = size_filtered[np.lexsort((size_filtered, -sizes[size_filtered]))]
+        photos = [all_photos[i] for i in size_filtered]
         print(f"🎯 Analyzing top {len(photos)} largest files")
         
         print(f"📈 Analyzing {len(photos)} photos (filtered from library)")
         
         # Convert PhotoInfo objects to PhotoData objects
         print(f"🔄 Converting {len(photos)} photos to PhotoData format...")
-        photo_data_list = []
-        for photo in photos:
-            photo_data = scanner.extract_photo_metadata(photo)
-            photo_data_list.append(photo_data)
+        photo_data_list = scanner.extract_photo_metadata_batch(photos)
         
         if analysis_type == 'metadata':
             # Fast metadata-only grouping
@@ -2352,112 +1994,22 @@ def api_smart_analysis():
             # Smart grouping with basic quality hints but no full analysis
             groups = scanner.group_photos_by_time_and_camera(photo_data_list)
         
-        # Priority scoring helper functions
-        def _calculate_priority_score(group):
-            """Calculate real priority score (0-100) based on duplicate confidence indicators"""
-            if not group.photos or len(group.photos) < 2:
-                return 0
-            
-            # Factor 1: File size factor (40%) - Larger files = higher priority for savings
-            avg_file_size = sum(p.file_size for p in group.photos) / len(group.photos)
-            file_size_mb = avg_file_size / (1024 * 1024)
-            # Scale: 0MB=0, 10MB=50, 20MB+=100
-            file_size_factor = min(100, (file_size_mb / 10.0) * 50)
-            
-            # Factor 2: Time proximity factor (30%) - Closer timestamps = higher confidence
-            timestamps = [p.timestamp for p in group.photos if p.timestamp]
-            if len(timestamps) >= 2:
-                time_span = max(timestamps) - min(timestamps)
-                time_span_seconds = time_span.total_seconds()
-                # Scale: 0s=100, 10s=80, 60s=20, 300s+=0
-                time_proximity_factor = max(0, 100 - (time_span_seconds / 3.0))
-            else:
-                time_proximity_factor = 0
-                
-            # Factor 3: Group confidence factor (20%) - More photos + same camera = higher confidence
-            group_size_factor = min(100, (len(group.photos) - 1) * 25)  # 2 photos=25, 3=50, 4+=75-100
-            
-            # Same camera bonus
-            cameras = set(p.camera_model for p in group.photos if p.camera_model)
-            camera_factor = 100 if len(cameras) == 1 and list(cameras)[0] else 50
-            group_confidence_factor = (group_size_factor + camera_factor) / 2
-            
-            # Factor 4: Similarity factor (10%) - Quality scores and potential visual similarity  
-            quality_scores = [p.quality_score for p in group.photos if p.quality_score > 0]
-            if quality_scores:
-                # High variation in quality scores suggests one clear best photo
-                quality_variation = max(quality_scores) - min(quality_scores) if len(quality_scores) > 1 else 0
-                similarity_factor = min(100, quality_variation * 2)  # Higher variation = clearer duplicate
-            else:
-                similarity_factor = 50  # Neutral if no quality data
-            
-            # Combine factors with weights
-            priority_score = (
-                file_size_factor * 0.4 +
-                time_proximity_factor * 0.3 + 
-                group_confidence_factor * 0.2 +
-                similarity_factor * 0.1
-            )
-            
-            priority_score = min(100, max(0, priority_score))
-            
-            # Debug logging for priority calculation
-            print(f"📊 Group {group.group_id}: score={priority_score:.1f} (size={file_size_factor:.1f}, time={time_proximity_factor:.1f}, group={group_confidence_factor:.1f}, sim={similarity_factor:.1f})")
-            
-            return priority_score
-        
-        def _score_to_priority_level(score):
-            """Convert 0-100 priority score to P1-P10 level"""
-            if score >= 90: return "P1"    # Perfect matches - large files, perfect timing  
-            elif score >= 80: return "P2"  # Very high confidence - burst photos, large savings
-            elif score >= 70: return "P3"  # High confidence - clear duplicates, good savings
-            elif score >= 60: return "P4"  # High-medium confidence
-            elif score >= 50: return "P5"  # Medium+ confidence  
-            elif score >= 40: return "P6"  # Medium confidence
-            elif score >= 30: return "P7"  # Medium-low confidence
-            elif score >= 20: return "P8"  # Low+ confidence
-            elif score >= 10: return "P9"  # Low confidence
-            else: return "P10"              # Lowest confidence
         
         # Convert to clusters for dashboard display with real priority scoring
         clusters = []
-        for i, group in enumerate(groups[:50]):  # Limit to 50 groups
-            # Calculate real priority score based on duplicate confidence
-            priority_score = _calculate_priority_score(group)
-            priority_level = _score_to_priority_level(priority_score)
-            
-            cluster = type('Cluster', (), {
-                'cluster_id': f"cluster_{i}",  # Fix: use cluster_id instead of group_id
-                'group_id': f"cluster_{i}",    # Keep group_id for compatibility
-                'photos': group.photos,
-                'duplicate_probability_score': priority_score,  # Real confidence score
-                'potential_savings_bytes': group.potential_savings_bytes,
-                'priority_level': priority_level,  # Real P1-P10 based on confidence
-                'recommended_photo': group.photos[0] if group.photos else None,
-                'photo_uuids': [p.uuid for p in group.photos]  # Add photo_uuids for legacy compatibility
-            })()
-            clusters.append(cluster)
+        scores = group_priority_scores(groups[:50])  # Limit to 50 groups
+        levels = score_priority_levels(scores)
+        for i, group in enumerate(groups[:50]):
+            # Real priority score (duplicate confidence) and P1-P10 level
+            clusters.append(Cluster.from_group(f"cluster_{i}", group, float(scores[i]), levels[i]))
         
         # Create dashboard data structure
-        priority_summary = {}
-        for p_level in [f"P{i}" for i in range(1, 11)]:
-            level_clusters = [c for c in clusters if c.priority_level == p_level]
-            if level_clusters:
-                priority_summary[p_level] = {
-                    'count': len(level_clusters),
-                    'total_savings_mb': sum(c.potential_savings_bytes for c in level_clusters) / (1024*1024),
-                    'photo_count': sum(len(c.photos) for c in level_clusters)
-                }
-            else:
-                priority_summary[p_level] = {
-                    'count': 0,
-                    'total_savings_mb': 0,
-                    'photo_count': 0
-                }
+        priority_summary = cluster_priority_summary(clusters)
         
         # Create stats - use full library counts, not just analyzed subset
         total_savings = sum(g.potential_savings_bytes for g in groups)
-        total_library_size = sum(p.original_filesize for p in all_photos if p.original_filesize) / (1024**3)
+        total_library_size = int(sizes.sum()) / (1024**3)
+        date_range_start, date_range_end = photo_date_range(all_photos, times)
         
         stats = {
             'total_photos': len(all_photos),  # Show total library count, not just analyzed photos
@@ -2465,10 +2017,9 @@ def api_smart_analysis():
             'estimated_duplicates': len([g for g in groups if len(g.photos) > 1]),
             'potential_savings_gb': total_savings / (1024**3),
             'potential_groups': len(groups),
-            'date_range_start': min(p.date for p in all_photos if p.date).isoformat() if any(p.date for p in all_photos) else None,
-            'date_range_end': max(p.date for p in all_photos if p.date).isoformat() if any(p.date for p in all_photos) else None,
-            'camera_models': list(set([getattr(p.exif_info, 'camera_model', None) for p in all_photos[:1000] 
-                                    if hasattr(p, 'exif_info') and p.exif_info and getattr(p.exif_info, 'camera_model', None)]))[:10],
+            'date_range_start': date_range_start,
+            'date_range_end': date_range_end,
+            'camera_models': library_camera_models(all_photos),
             'photos_analyzed': len(photo_data_list)  # Add separate field for analyzed count
         }
         
@@ -2482,6 +2033,8 @@ def api_smart_analysis():
         # This ensures both interfaces use the same analysis results
         cached_groups = groups
         cached_timestamp = datetime.now()
+        share_analysis_cache()
+        warm_group_thumbnails(groups)
         
         dashboard_data = {
             'library_stats': stats,
@@ -2490,10 +2043,7 @@ def api_smart_analysis():
         }
         
         # Log priority distribution summary
-        priority_distribution = {}
-        for cluster in clusters:
-            level = cluster.priority_level
-            priority_distribution[level] = priority_distribution.get(level, 0) + 1
+        priority_distribution = {level: summary['count'] for level, summary in priority_summary.items() if summary['count']}
         
         print(f"✅ Smart analysis complete: {len(groups)} groups, {len(clusters)} clusters")
         print(f"🎯 Real priority distribution: {dict(sorted(priority_distribution.items()))}")
@@ -2520,6 +2070,7 @@ def api_dashboard():
     global cached_library_stats, cached_clusters, cached_library_timestamp
     
     try:
+        load_shared_analysis_cache()
         # Check if we have cached results (valid for 30 minutes)
         now = datetime.now()
         if (cached_library_stats is not None and cached_clusters is not None and 
@@ -2545,36 +2096,39 @@ def api_dashboard():
             cached_library_stats = stats
             cached_clusters = clusters
             cached_library_timestamp = now
+            share_analysis_cache()
+        
+        def dashboard_payload():
+            # Generate priority summary
+            priority_summary = analyzer.generate_priority_summary(clusters)
+            
+            # Convert to JSON-serializable format with appropriate rounding for estimates
+            dashboard_data = {
+                'library_stats': {
+                    'total_photos': stats.total_photos,
+                    'date_range_start': stats.date_range_start.isoformat(),
+                    'date_range_end': stats.date_range_end.isoformat(),
+                    'total_size_gb': round(stats.total_size_bytes / (1024*1024*1024), 1),
+                    'estimated_duplicates': stats.estimated_duplicates,
+                    'potential_savings_gb': round(stats.potential_savings_bytes / (1024*1024*1024), 1),
+                    'camera_models': stats.camera_models[:10],  # Top 10 cameras
+                    'has_location_data': stats.has_location_data
+                },
+                'priority_summary': priority_summary,
+                'cluster_count': len(clusters),
+                'timestamp': now.isoformat()
+            }
+            
+            return {
+                'success': True,
+                'dashboard': dashboard_data
+            }
         
-        # Generate priority summary
-        priority_summary = analyzer.generate_priority_summary(clusters)
-        
-        # Convert to JSON-serializable format with appropriate rounding for estimates
-        dashboard_data = {
-            'library_stats': {
-                'total_photos': stats.total_photos,
-                'date_range_start': stats.date_range_start.isoformat(),
-                'date_range_end': stats.date_range_end.isoformat(),
-                'total_size_gb': round(stats.total_size_bytes / (1024*1024*1024), 1),
-                'estimated_duplicates': stats.estimated_duplicates,
-                'potential_savings_gb': round(stats.potential_savings_bytes / (1024*1024*1024), 1),
-                'camera_models': stats.camera_models[:10],  # Top 10 cameras
-                'has_location_data': stats.has_location_data
-            },
-            'priority_summary': priority_summary,
-            'cluster_count': len(clusters),
-            'timestamp': now.isoformat()
-        }
-        
-        return jsonify({
-            'success': True,
-            'dashboard': dashboard_data
-        })
+        return cached_analysis_response('dashboard', dashboard_payload)
         
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in api_dashboard: {error_msg}")
-        print(traceback.format_exc())
+        app.logger.exception("api_dashboard failed")
         
         return jsonify({
             'success': False,
@@ -2588,6 +2142,7 @@ def api_clusters_by_priority(priority):
     global cached_clusters
     
     try:
+        load_shared_analysis_cache()
         if cached_clusters is None:
             return jsonify({
                 'success': False,
@@ -2612,8 +2167,8 @@ def api_clusters_by_priority(priority):
             cluster_data = {
                 'cluster_id': cluster.cluster_id,
                 'photo_count': cluster.photo_count,
-                'time_span_start': cluster.time_span_start.isoformat(),
-                'time_span_end': cluster.time_span_end.isoformat(),
+                'time_span_start': cluster.time_span_start.isoformat() if cluster.time_span_start else None,
+                'time_span_end': cluster.time_span_end.isoformat() if cluster.time_span_end else None,
                 'total_size_mb': cluster.total_size_bytes / (1024*1024),
                 'potential_savings_mb': cluster.potential_savings_bytes / (1024*1024),
                 'duplicate_probability_score': cluster.duplicate_probability_score,
@@ -2636,8 +2191,7 @@ def api_clusters_by_priority(priority):
         
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in api_clusters_by_priority: {error_msg}")
-        print(traceback.format_exc())
+        app.logger.exception("api_clusters_by_priority failed")
         
         return jsonify({
             'success': False,
@@ -2651,6 +2205,7 @@ def api_analyze_cluster(cluster_id):
     global cached_clusters
     
     try:
+        load_shared_analysis_cache()
         if cached_clusters is None:
             return jsonify({
                 'success': False,
@@ -2674,14 +2229,9 @@ def api_analyze_cluster(cluster_id):
         
         print(f"🔍 Deep analysis of cluster {cluster_id} with {target_cluster.photo_count} photos...")
         
-        # Get the full photo objects for this cluster
-        db = scanner.get_photosdb()
-        photos = []
-        for uuid in target_cluster.photo_uuids:
-            for photo in db.photos(intrash=False):
-                if photo.uuid == uuid:
-                    photos.append(photo)
-                    break
+        # Get the full photo objects for this cluster from the scanner's memoized UUID index (videos included)
+        photo_index = scanner.media_by_uuid
+        photos = [photo_index[uuid] for uuid in target_cluster.photo_uuids if uuid in photo_index]
         
         if not photos:
             return jsonify({
@@ -2691,10 +2241,7 @@ def api_analyze_cluster(cluster_id):
             }), 404
         
         # Convert to PhotoData objects
-        photo_data_list = []
-        for photo in photos:
-            photo_data = scanner.extract_photo_metadata(photo)
-            photo_data_list.append(photo_data)
+        photo_data_list = scanner.extract_photo_metadata_batch(photos)
         
         # Run enhanced grouping with visual similarity for this specific cluster
         initial_groups = scanner.group_photos_by_time_and_camera(photo_data_list, time_window_seconds=30)  # Wider window for cluster analysis
@@ -2708,21 +2255,9 @@ def api_analyze_cluster(cluster_id):
                 'group_id': f"{cluster_id}_{group.group_id}",
                 'photos': [
                     {
-                        'uuid': photo.uuid,
-                        'filename': photo.original_filename or photo.filename,
-                        'original_filename': photo.original_filename,
-                        'timestamp': photo.timestamp.isoformat() if photo.timestamp else None,
-                        'camera_model': photo.camera_model,
-                        'file_size': photo.file_size,
-                        'width': photo.width,
-                        'height': photo.height,
-                        'format': photo.format,
+                        **photo.api_fields,
                         'quality_score': photo.quality_score,
-                        'quality_method': getattr(photo, 'quality_method', 'unknown'),
-                        'organization_score': getattr(photo, 'organization_score', 0.0),
-                        'albums': getattr(photo, 'albums', []) or [],
-                        'folder_names': getattr(photo, 'folder_names', []) or [],
-                        'keywords': getattr(photo, 'keywords', []) or [],
+                        'quality_method': photo.quality_method,
                         'recommended': photo.uuid == group.recommended_photo_uuid
                     }
                     for photo in group.photos
@@ -2751,8 +2286,7 @@ def api_analyze_cluster(cluster_id):
         
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in api_analyze_cluster: {error_msg}")
-        print(traceback.format_exc())
+        app.logger.exception("api_analyze_cluster failed")
         
         return jsonify({
             'success': False,
@@ -2767,9 +2301,10 @@ def api_groups():
     CRITICAL: This endpoint must use ONLY the filtered session data.
     The workflow is: filter → analyze → legacy shows ONLY filtered results.
     """
-    global cached_groups, cached_timestamp, scanner
+    global cached_groups, cached_timestamp, scanner, analysis_task_id
     
     try:
+        load_shared_analysis_cache()
         # EMERGENCY BYPASS: If analysis is active, don't start another one
         if progress_status.get('active', False):
             print("🚨 EMERGENCY: Groups API called while analysis active - returning waiting message")
@@ -3021,10 +2556,7 @@ def api_groups():
                         
                         if cluster_photos:
                             # Convert to PhotoData objects for compatibility
-                            photo_data_list = []
-                            for photo in cluster_photos:
-                                photo_data = scanner.extract_photo_metadata(photo)
-                                photo_data_list.append(photo_data)
+                            photo_data_list = scanner.extract_photo_metadata_batch(cluster_photos)
                             
                             # Calculate required group metrics
                             total_size_bytes = sum(p.file_size for p in photo_data_list)
@@ -3055,20 +2587,9 @@ def api_groups():
                                 'group_id': group.group_id,
                                 'photos': [
                                     {
-                                        'uuid': photo.uuid,
-                                        'filename': photo.original_filename or photo.filename,
-                                        'original_filename': photo.original_filename,
-                                        'timestamp': photo.timestamp.isoformat() if photo.timestamp else None,
-                                        'camera_model': photo.camera_model,
-                                        'file_size': photo.file_size,
-                                        'width': photo.width,
-                                        'height': photo.height,
-                                        'format': photo.format,
+                                        **photo.api_fields,
                                         'quality_score': photo.quality_score,
-                                        'organization_score': getattr(photo, 'organization_score', 0.0),
-                                        'albums': getattr(photo, 'albums', []) or [],
-                                        'folder_names': getattr(photo, 'folder_names', []) or [],
-                                        'keywords': getattr(photo, 'keywords', []) or [],
+                                        'quality_method': photo.quality_method,
                                         'recommended': photo.uuid == group.recommended_photo_uuid
                                     }
                                     for photo in group.photos
@@ -3077,9 +2598,9 @@ def api_groups():
                                 'time_window_end': group.time_window_end.isoformat(),
                                 'camera_model': group.camera_model,
                                 'total_size_bytes': group.total_size_bytes,
-                                'total_size_mb': round(group.total_size_bytes / (1024 * 1024), 2),
+                                'total_size_mb': group.total_size_mb,
                                 'potential_savings_bytes': group.potential_savings_bytes,
-                                'potential_savings_mb': round(group.potential_savings_bytes / (1024 * 1024), 2),
+                                'potential_savings_mb': group.potential_savings_mb,
                                 'photo_count': len(group.photos)
                             }
                             groups_data.append(group_data)
@@ -3138,20 +2659,18 @@ def api_groups():
             
             # Analyze each cluster and collect groups
             all_groups = []
+            filtered_index = None  # uuid -> photo over the filtered set, built on the first cluster
             for cluster in selected_clusters:
                 print(f"🔍 Analyzing cluster {cluster.cluster_id} (score: {cluster.duplicate_probability_score})")
                 
                 # Get the full photo objects for this cluster
                 try:
                     db = scanner.get_photosdb()
-                    photos = []
-                    for uuid in cluster.photo_uuids:
+                    if filtered_index is None:
                         # Use filtered photo set for consistency
                         filtered_photos, _ = scanner.get_unprocessed_photos(include_videos=False)
-                        for photo in filtered_photos:
-                            if photo.uuid == uuid:
-                                photos.append(photo)
-                                break
+                        filtered_index = {photo.uuid: photo for photo in filtered_photos}
+                    photos = [filtered_index[uuid] for uuid in cluster.photo_uuids if uuid in filtered_index]
                 except Exception as e:
                     print(f"❌ OSXPhotos error accessing database: {e}")
                     # Return empty result when OSXPhotos fails
@@ -3165,10 +2684,7 @@ def api_groups():
                 
                 if photos:
                     # Convert to PhotoData objects
-                    photo_data_list = []
-                    for photo in photos:
-                        photo_data = scanner.extract_photo_metadata(photo)
-                        photo_data_list.append(photo_data)
+                    photo_data_list = scanner.extract_photo_metadata_batch(photos)
                     
                     # Run enhanced grouping for this cluster
                     cluster_groups = scanner.group_photos_by_time_and_camera(photo_data_list, time_window_seconds=30)
@@ -3208,7 +2724,54 @@ def api_groups():
                 force_real = request.args.get('real', '').lower() in ['true', '1', 'yes']
                 from_filters = request.headers.get('Referer', '').endswith('/filters')
                 
-                if force_real or from_filters:
+                scan_limit = 5000  # Scan more photos to find duplicates
+                cached_result = get_cached_group_result(scan_limit) if (force_real or from_filters) else None
+                
+                if cached_result is not None:
+                    print(f"📋 Reusing {len(cached_result)} groups from previous {scan_limit}-photo analysis")
+                    groups = cached_result
+                    cached_groups = groups
+                    cached_timestamp = datetime.now()
+                    share_analysis_cache()
+                
+                elif (force_real or from_filters) and celery is not None:
+                    # Offloaded: start the task (or check on the running one) and let the client poll /api/progress
+                    task_id = request.args.get('task_id') or analysis_task_id
+                    if task_id is None:
+                        task_id = analysis_task_id = analyze_task.delay(scan_limit).id
+                        print(f"📨 REAL PHOTO ANALYSIS: queued Celery task {task_id}")
+                    result = celery.AsyncResult(task_id)
+                    if not result.ready():
+                        info = result.info if isinstance(result.info, dict) else {}
+                        return jsonify({
+                            'success': True,
+                            'groups': [],
+                            'total_groups': 0,
+                            'message': f"Photo analysis in progress: {info.get('step', 'Queued...')}",
+                            'progress_active': True,
+                            'progress': info.get('progress', 0),
+                            'step': info.get('step', 'Queued...'),
+                            'task_id': task_id,
+                            'should_wait': True
+                        })
+                    analysis_task_id = None
+                    try:
+                        groups = decode_analysis_value(result.get())
+                    except Exception as e:
+                        print(f"❌ Analysis task {task_id} failed: {e}")
+                        return jsonify({
+                            'success': False,
+                            'groups': [],
+                            'total_groups': 0,
+                            'error': f'Photo analysis failed: {str(e)[:200]}'
+                        })
+                    cached_groups = groups
+                    cached_timestamp = datetime.now()
+                    share_analysis_cache()
+                    store_group_result(scan_limit, groups)
+                    warm_group_thumbnails(groups)
+                
+                elif force_real or from_filters:
                     print("🔄 REAL PHOTO ANALYSIS: User requested real photo processing")
                     
                     # IMPORTANT: Check if analysis is already running
@@ -3231,8 +2794,6 @@ def api_groups():
                     update_progress("Initializing analysis", 0, 4, "Setting up photo deduplication analysis...")
                     
                     # Original analysis logic
-                    scan_limit = 5000  # Scan more photos to find duplicates
-                    
                     # Step 1: Scan photos
                     try:
                         update_progress("Scanning Photos library", 1, 4, "Scanning photos...")
@@ -3257,17 +2818,8 @@ def api_groups():
                             'message': 'Unable to scan Photos library. Please check compatibility.'
                         })
                     
-                    # Step 2: Group photos by time and camera
-                    update_progress("Grouping photos", 2, 4, f"Creating groups from {len(photos):,} photos using 10-second windows and camera matching...")
-                    groups = scanner.group_photos_by_time_and_camera(photos)
-                    
-                    # Step 3: Enhanced grouping with quality analysis
-                    update_progress("Analyzing image quality", 3, 4, f"Computing quality scores for {len(groups):,} photo groups using sharpness and composition analysis...")
-                    groups = scanner.enhanced_grouping_with_similarity(groups, progress_callback=update_progress)
-                    
-                    # Step 4: Visual similarity filtering
-                    update_progress("Filtering by visual similarity", 4, 4, f"Comparing visual similarity to prevent unrelated photos in same group (70% threshold)...")
-                    groups = scanner.filter_groups_by_visual_similarity(groups, similarity_threshold=50.0)
+                    # Steps 2-4: group by time and camera, score quality, filter by visual similarity
+                    groups = analyze_scanned_photos(photos)
                     
                     # Complete progress tracking
                     complete_progress()
@@ -3275,6 +2827,9 @@ def api_groups():
                     # Cache results
                     cached_groups = groups
                     cached_timestamp = datetime.now()
+                    share_analysis_cache()
+                    store_group_result(scan_limit, groups)
+                    warm_group_thumbnails(groups)
                 
                 else:
                     print("🧪 DEMO MODE: Generating test groups for deletion workflow demonstration")
@@ -3343,21 +2898,9 @@ def api_groups():
                 'group_id': group.group_id,
                 'photos': [
                     {
-                        'uuid': photo.uuid,
-                        'filename': photo.original_filename or photo.filename,
-                        'original_filename': photo.original_filename,
-                        'timestamp': photo.timestamp.isoformat() if photo.timestamp else None,
-                        'camera_model': photo.camera_model,
-                        'file_size': photo.file_size,
-                        'width': photo.width,
-                        'height': photo.height,
-                        'format': photo.format,
+                        **photo.api_fields,
                         'quality_score': photo.quality_score,
-                        'quality_method': getattr(photo, 'quality_method', 'unknown'),
-                        'organization_score': getattr(photo, 'organization_score', 0.0),
-                        'albums': getattr(photo, 'albums', []) or [],
-                        'folder_names': getattr(photo, 'folder_names', []) or [],
-                        'keywords': getattr(photo, 'keywords', []) or [],
+                        'quality_method': photo.quality_method,
                         'recommended': photo.uuid == group.recommended_photo_uuid
                     }
                     for photo in group.photos
@@ -3366,24 +2909,27 @@ def api_groups():
                 'time_window_end': group.time_window_end.isoformat(), 
                 'camera_model': group.camera_model,
                 'total_size_bytes': group.total_size_bytes,
-                'total_size_mb': round(group.total_size_bytes / (1024 * 1024), 2),
+                'total_size_mb': group.total_size_mb,
                 'potential_savings_bytes': group.potential_savings_bytes,
-                'potential_savings_mb': round(group.potential_savings_bytes / (1024 * 1024), 2),
+                'potential_savings_mb': group.potential_savings_mb,
                 'photo_count': len(group.photos)
             }
             groups_data.append(group_data)
         
-        return jsonify({
+        # Thumbnails for every photo on the page will be requested next - start them now
+        warm_thumbnails(photo.uuid for group in groups if not isinstance(group, dict) for photo in group.photos)
+        
+        payload = {
             'success': True,
             'groups': groups_data,
             'total_groups': len(groups_data),
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        return jsonify(payload)
         
     except Exception as e:
         error_msg = str(e)
-        print(f"Error in api_groups: {error_msg}")
-        print(traceback.format_exc())
+        app.logger.exception("api_groups failed")
         
         return jsonify({
             'success': False,
@@ -3419,158 +2965,61 @@ def api_analyze_filtered():
         'message': 'Navigate to /filters, apply your criteria, then go to /legacy and click "Analyze My Photos"'
     }), 410  # Gone - indicates the resource is no longer available
 
-@app.route('/api/thumbnail/<photo_uuid>')
+@app.route('/api/thumbnail/<photo_uuid>', methods=['GET'])
+@rate_limit(THUMBNAIL_RATE_LIMIT)
 def api_thumbnail(photo_uuid):
-    """Serve photo thumbnail by UUID."""
+    """Serve photo thumbnail by UUID (?w= selects 300, 600 or 1200px; default 600)."""
+    if not UUID_RE.fullmatch(photo_uuid):
+        return jsonify({'error': 'Invalid photo UUID'}), 400
+    
+    size = thumbnail_width(request.args.get('w', type=int))
+    
     try:
-        # Generate thumbnail cache filename
-        thumbnail_filename = f"{photo_uuid}_thumb.jpg"
-        thumbnail_path = os.path.join(THUMBNAIL_DIR, thumbnail_filename)
-        
-        # Check if thumbnail already exists
-        if os.path.exists(thumbnail_path):
-            return send_file(thumbnail_path, mimetype='image/jpeg')
-        
-        # Find the photo in our database using the photos list
-        db = scanner.get_photosdb()
-        photos = db.photos(intrash=False, movies=False)  # Photos only - no videos
-        photo = None
+        # Manifest hit: serve without touching the library or hashing the original
+        thumbnail_path = manifest_thumbnail_path(photo_uuid, size)
+        if thumbnail_path:
+            return serve_thumbnail(photo_uuid, thumbnail_path)
         
-        for p in photos:
-            if p.uuid == photo_uuid:
-                photo = p
-                break
+        # O(1) lookup instead of scanning every photo in the library
+        photo = scanner.photos_by_uuid.get(photo_uuid)
         
         if not photo:
-            print(f"Photo {photo_uuid} not found in database")
+            thumbnail_logger.debug("Photo %s not found in database", photo_uuid)
             return jsonify({'error': 'Photo not found'}), 404
         
-        # Try multiple approaches to get photo path
-        photo_path = None
-        
-        # Method 1: Direct path access
-        if photo.path and os.path.exists(photo.path):
-            photo_path = photo.path
-            print(f"Using direct path for {photo_uuid}: {photo_path}")
-        else:
-            # Method 2: Download iCloud photo if needed
-            print(f"Photo {photo_uuid} not locally available, attempting iCloud download...")
-            try:
-                temp_export_path = os.path.join(THUMBNAIL_DIR, f"{photo_uuid}_export")
-                os.makedirs(temp_export_path, exist_ok=True)
-                
-                # Force download from iCloud with explicit options
-                exported_paths = photo.export(
-                    temp_export_path, 
-                    overwrite=True,
-                    use_photos_export=True,  # Use Photos app export API (may download from iCloud)
-                    timeout=60  # 60 second timeout for downloads
-                )
-                
-                if exported_paths and len(exported_paths) > 0 and os.path.exists(exported_paths[0]):
-                    photo_path = exported_paths[0]
-                    print(f"✅ Successfully downloaded and using: {photo_path}")
-                    print(f"   File size: {os.path.getsize(photo_path)} bytes")
-                else:
-                    print(f"❌ Export returned no valid files for {photo_uuid}")
-                    print(f"   Exported paths: {exported_paths}")
-                    
-            except Exception as e:
-                print(f"❌ Download/export failed for {photo_uuid}: {e}")
-                import traceback
-                traceback.print_exc()
+        # Check if thumbnail already exists
+        thumbnail_path = thumbnail_path_for(photo, size)
+        if os.path.exists(thumbnail_path):
+            record_thumbnail(photo_uuid, thumbnail_path, size)
+            return serve_thumbnail(photo_uuid, thumbnail_path)
         
-        if not photo_path:
-            print(f"❌ No accessible path found for {photo_uuid} after all attempts")
-            return jsonify({'error': 'Photo file not accessible - download failed or restricted'}), 404
+        # Not cached yet - join the background job (pre-warmed by /api/groups) or start one
+        try:
+            thumbnail_path, data, error, status_code = submit_thumbnail(photo_uuid, size).result(timeout=THUMBNAIL_WAIT_SECONDS)
+        except FutureTimeoutError:
+            thumbnail_logger.info("Thumbnail for %s still generating after %ss", photo_uuid, THUMBNAIL_WAIT_SECONDS)
+            return jsonify({'error': 'Thumbnail still generating'}), 503
         
-        # Check if this is a video file
-        if photo_path.lower().endswith(('.mov', '.mp4', '.avi', '.m4v')):
-            print(f"Generating video thumbnail for {photo_uuid}: {photo_path}")
-            try:
-                # Create a simple video placeholder thumbnail
-                from PIL import Image, ImageDraw, ImageFont
-                
-                # Create a 600x400 placeholder image
-                img = Image.new('RGB', (600, 400), color=(64, 64, 64))
-                draw = ImageDraw.Draw(img)
-                
-                # Add video icon and text
-                # Draw a play button symbol
-                play_triangle = [(250, 150), (250, 250), (350, 200)]
-                draw.polygon(play_triangle, fill=(255, 255, 255))
-                
-                # Add text
-                try:
-                    font = ImageFont.load_default()
-                except:
-                    font = None
-                
-                text = f"VIDEO\n{photo_uuid[:8]}...\n{os.path.basename(photo_path)}"
-                if font:
-                    draw.text((300, 100), text, fill=(255, 255, 255), font=font, anchor="mm")
-                else:
-                    draw.text((300, 100), text, fill=(255, 255, 255), anchor="mm")
-                
-                # Save placeholder thumbnail
-                img.save(thumbnail_path, 'JPEG', quality=85, optimize=True)
-                print(f"Video placeholder thumbnail saved for {photo_uuid}: {thumbnail_path}")
-                
-                return send_file(thumbnail_path, mimetype='image/jpeg')
-                
-            except Exception as e:
-                print(f"Error generating video placeholder for {photo_uuid}: {e}")
-                return jsonify({'error': 'Could not generate video thumbnail'}), 500
+        if error:
+            return jsonify({'error': error}), status_code
         
-        # Generate thumbnail
-        try:
-            # Ensure PIL Image is available in this scope
-            from PIL import Image as PILImage
-            with PILImage.open(photo_path) as img:
-                print(f"Successfully opened image for {photo_uuid}: {img.size} {img.mode}")
-                
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'P', 'LA'):
-                    img = img.convert('RGB')
-                    print(f"Converted {photo_uuid} to RGB mode")
-                
-                # Calculate thumbnail size maintaining aspect ratio
-                # Use larger thumbnails for better quality assessment
-                original_size = img.size
-                img.thumbnail((600, 600), PILImage.Resampling.LANCZOS)
-                print(f"Thumbnail for {photo_uuid}: {original_size} -> {img.size}")
-                
-                # Save thumbnail to cache
-                img.save(thumbnail_path, 'JPEG', quality=85, optimize=True)
-                print(f"Thumbnail saved for {photo_uuid}: {thumbnail_path}")
-                
-                return send_file(thumbnail_path, mimetype='image/jpeg')
-                
-        except Exception as e:
-            print(f"Error generating thumbnail for {photo_uuid}: {e}")
-            print(f"Photo path was: {photo_path}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({'error': 'Could not generate thumbnail'}), 500
+        if data is not None:
+            return serve_thumbnail_bytes(data)
+        return serve_thumbnail(photo_uuid, thumbnail_path)
             
     except Exception as e:
-        print(f"Error in thumbnail endpoint: {e}")
-        traceback.print_exc()
+        thumbnail_logger.exception("Error in thumbnail endpoint for %s", photo_uuid)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/full-image/<photo_uuid>')
 def api_full_image(photo_uuid):
     """Serve full-resolution photo by UUID for preview modal."""
+    if not UUID_RE.fullmatch(photo_uuid):
+        return jsonify({'error': 'Invalid photo UUID'}), 400
+    
     try:
-        # Find the photo in our database using the photos list
-        db = scanner.get_photosdb()
-        photos = db.photos(intrash=False, movies=False)
-        photo = None
-        
-        for p in photos:
-            if p.uuid == photo_uuid:
-                photo = p
-                break
+        # Find the photo in our database
+        photo = scanner.photos_by_uuid.get(photo_uuid)
         
         if not photo:
             print(f"Photo {photo_uuid} not found in database")
@@ -3620,7 +3069,7 @@ def api_full_image(photo_uuid):
             return jsonify({'error': 'Photo file not accessible - download failed or restricted'}), 404
         
         # Check if this is a video file
-        if photo_path.lower().endswith(('.mov', '.mp4', '.avi', '.m4v')):
+        if os.path.splitext(photo_path)[1].lower() in VIDEO_EXTENSIONS:
             print(f"Skipping video file for {photo_uuid}: {photo_path}")
             return jsonify({'error': 'Full image not available for video files'}), 404
         
@@ -3654,16 +3103,12 @@ def api_full_image(photo_uuid):
 @app.route('/api/open-photo/<photo_uuid>', methods=['POST'])
 def api_open_photo(photo_uuid):
     """Open specific photo in Photos app using AppleScript."""
+    if not UUID_RE.fullmatch(photo_uuid):
+        return jsonify({'error': 'Invalid photo UUID'}), 400
+    
     try:
         # Find the photo in our database
-        db = scanner.get_photosdb()
-        photos = db.photos(intrash=False, movies=False)
-        photo = None
-        
-        for p in photos:
-            if p.uuid == photo_uuid:
-                photo = p
-                break
+        photo = scanner.photos_by_uuid.get(photo_uuid)
         
         if not photo:
             return jsonify({'success': False, 'error': 'Photo not found'}), 404
@@ -3811,6 +3256,7 @@ def api_mark_blur_photos_for_deletion():
         # Add UUIDs to persistent tracking to prevent reappearance
         if tagging_result.photos_tagged > 0:
             scanner.add_processed_uuids(photo_uuids)
+            clear_library_snapshots()
             print(f"💾 Added {len(photo_uuids)} UUIDs to persistent tracking")
         
         return jsonify({
@@ -3981,8 +3427,8 @@ def cancel_background_analysis():
         print(f"🛑 Cancelling background analysis: {progress_status['step']}")
         
         # Wait a short time for graceful cancellation
-        timeout_start = time.time()
-        while progress_status['active'] and (time.time() - timeout_start < 2.0):
+        timeout_start = time.monotonic()
+        while progress_status['active'] and (time.monotonic() - timeout_start < 2.0):
             time.sleep(0.1)
             
         # If still active after 2 seconds, force termination
@@ -4041,6 +3487,7 @@ def api_force_stop_analysis():
     progress_status['progress'] = 0
     progress_status['total'] = 0
     progress_status['start_time'] = None
+    progress_status['started_at'] = None
     progress_status['current_operation'] = ''
     progress_status['current_item'] = ''
     
@@ -4141,6 +3588,7 @@ def api_test_groups():
         # Cache the test groups
         cached_groups = test_groups
         cached_timestamp = datetime.now()
+        share_analysis_cache()
         
         total_photos = sum(len(g['photos']) for g in test_groups)
         print(f"🧪 Generated {len(test_groups)} test groups with {total_photos} photos total")
@@ -4192,6 +3640,7 @@ def api_complete_workflow():
         # Add UUIDs to persistent tracking to prevent reappearance
         if tagging_result.photos_tagged > 0:
             scanner.add_processed_uuids(photo_uuids)
+            clear_library_snapshots()
             print(f"💾 Added {len(photo_uuids)} UUIDs to persistent tracking")
         
         # Get photo details for export - ONLY for the specific photos being deleted
@@ -4538,21 +3987,9 @@ def api_cluster_analysis(cluster_id):
                 'group_id': f"{cluster_id}_{group.group_id}",
                 'photos': [
                     {
-                        'uuid': photo.uuid,
-                        'filename': photo.original_filename or photo.filename,
-                        'original_filename': photo.original_filename,
-                        'timestamp': photo.timestamp.isoformat() if photo.timestamp else None,
-                        'camera_model': photo.camera_model,
-                        'file_size': photo.file_size,
-                        'width': photo.width,
-                        'height': photo.height,
-                        'format': photo.format,
+                        **photo.api_fields,
                         'quality_score': photo.quality_score,
-                        'quality_method': getattr(photo, 'quality_method', 'unknown'),
-                        'organization_score': getattr(photo, 'organization_score', 0.0),
-                        'albums': getattr(photo, 'albums', []) or [],
-                        'folder_names': getattr(photo, 'folder_names', []) or [],
-                        'keywords': getattr(photo, 'keywords', []) or [],
+                        'quality_method': photo.quality_method,
                         'recommended': photo.uuid == group.recommended_photo_uuid
                     }
                     for photo in group.photos
@@ -4561,9 +3998,9 @@ def api_cluster_analysis(cluster_id):
                 'time_window_end': group.time_window_end.isoformat(),
                 'camera_model': group.camera_model,
                 'total_size_bytes': group.total_size_bytes,
-                'total_size_mb': round(group.total_size_bytes / (1024 * 1024), 2),
+                'total_size_mb': group.total_size_mb,
                 'potential_savings_bytes': group.potential_savings_bytes,
-                'potential_savings_mb': round(group.potential_savings_bytes / (1024 * 1024), 2),
+                'potential_savings_mb': group.potential_savings_mb,
                 'photo_count': len(group.photos),
                 'cluster_source': cluster_id
             }
@@ -4702,6 +4139,11 @@ def api_clear_cache():
         cached_library_stats = None
         cached_clusters = None
         cached_library_timestamp = None
+        share_analysis_cache()  # Other workers pick up the cleared state
+        group_cache.clear()
+        scanner.reset_photosdb()
+        clear_library_snapshots()
+        photo_source_paths.cache_clear()
         
         return jsonify({
             'success': True,
@@ -5145,6 +4587,71 @@ def sort_duplicate_groups(groups, sort_key='savings_desc'):
     sort_func = sort_functions.get(sort_key, sort_functions['savings_desc'])
     return sorted(groups, key=sort_func, reverse=True)
 
+def get_cached_group_result(key):
+    """Return cached analysis groups for key if still fresh, else None."""
+    entry = group_cache.get(key)
+    if entry is None:
+        return None
+    
+    if (datetime.now() - entry['timestamp']).total_seconds() >= GROUP_CACHE_TTL_SECONDS:
+        del group_cache[key]
+        return None
+    
+    entry['last_used'] = datetime.now()
+    return entry['groups']
+
+def naive_local_time(value):
+    """datetime (or ISO string) as naive local time, so Photos' aware dates compare with query params."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.astimezone().replace(tzinfo=None) if value.tzinfo else value
+
+def parse_time_window(value):
+    """Parse an ISO 8601 interval "<start>/<end>" into a (start, end) pair of naive local datetimes."""
+    start, separator, end = value.partition('/')
+    if not separator:
+        raise ValueError(f"Not a time window: {value}")
+    return naive_local_time(start), naive_local_time(end)
+
+def group_matches(group, group_id=None, camera_model=None, time_window=None):
+    """Whether an analysis group (PhotoGroup or test-group dict) falls under every given criterion."""
+    field = group.get if isinstance(group, dict) else lambda name: getattr(group, name, None)
+    if group_id and field('group_id') != group_id:
+        return False
+    if camera_model and field('camera_model') != camera_model:
+        return False
+    if time_window:
+        if not field('time_window_start') or not field('time_window_end'):
+            return False
+        window_start, window_end = time_window
+        if (naive_local_time(field('time_window_start')) > window_end or
+                naive_local_time(field('time_window_end')) < window_start):
+            return False
+    return True
+
+def evict_cached_groups(**criteria):
+    """Drop the analysis groups matching criteria from every group cache; returns how many were cached."""
+    global cached_groups
+    evicted = 0
+    if cached_groups:
+        kept = [group for group in cached_groups if not group_matches(group, **criteria)]
+        evicted = len(cached_groups) - len(kept)
+        cached_groups = kept
+    for entry in group_cache.values():
+        entry['groups'] = [group for group in entry['groups'] if not group_matches(group, **criteria)]
+    share_analysis_cache()
+    print(f"🧹 Evicted {evicted} cached groups matching {criteria}")
+    return evicted
+
+def store_group_result(key, groups):
+    """Cache analysis groups under key, evicting the least recently used entry when full."""
+    if key not in group_cache and len(group_cache) >= MAX_CACHED_GROUP_RESULTS:
+        oldest_key = min(group_cache.keys(), key=lambda k: group_cache[k]['last_used'])
+        del group_cache[oldest_key]
+    
+    now = datetime.now()
+    group_cache[key] = {'groups': groups, 'timestamp': now, 'last_used': now}
+
 def cache_analysis_results(groups, filter_criteria):
     """Cache complete analysis results with expiry management."""
     import uuid
@@ -5247,15 +4754,8 @@ def api_analyze_duplicates():
         
         print(f"🔍 Converting {len(analysis_photos_raw)} PhotoInfo objects to PhotoData...")
         
-        # Convert PhotoInfo objects to PhotoData objects
-        analysis_photos = []
-        for photo_info in analysis_photos_raw:
-            try:
-                photo_data = scanner.extract_photo_metadata(photo_info)
-                analysis_photos.append(photo_data)
-            except Exception as e:
-                print(f"⚠️ Skipping photo {getattr(photo_info, 'uuid', 'unknown')}: {e}")
-                continue
+        # Convert PhotoInfo objects to PhotoData objects (failures come back as minimal PhotoData)
+        analysis_photos = scanner.extract_photo_metadata_batch(analysis_photos_raw)
         
         print(f"✅ Successfully converted {len(analysis_photos)} photos for analysis")
         
@@ -5380,8 +4880,7 @@ def api_load_more_duplicates():
 def duplicates_interface():
     """New streamlined duplicates review interface."""
     try:
-        with open('/Users/urikogan/code/dedup/duplicates_interface.html', 'r') as f:
-            return f.read()
+        return html_page('duplicates_interface.html')
     except FileNotFoundError:
         return "Duplicates interface not found", 404
 
@@ -5713,26 +5212,37 @@ def api_photo_buckets():
         }), 500
 
 @app.route('/api/thumbnails/<uuid>')
+@rate_limit(THUMBNAIL_RATE_LIMIT)
 def api_get_thumbnail(uuid):
     """Get thumbnail for a specific photo UUID."""
+    if not UUID_RE.fullmatch(uuid):
+        return jsonify({'error': 'Invalid photo UUID'}), 400
+    
     try:
         # Find the photo by UUID
-        photos, excluded_count = scanner.get_unprocessed_photos(include_videos=False)
-        
-        target_photo = None
-        for photo in photos:
-            if photo.uuid == uuid:
-                target_photo = photo
-                break
+        target_photo = scanner.photos_by_uuid.get(uuid)
         
         if not target_photo or not target_photo.path or not os.path.exists(target_photo.path):
             return jsonify({'error': 'Photo not found'}), 404
         
-        # Generate or serve thumbnail
-        thumbnail_path = generate_thumbnail(target_photo.path, uuid)
+        # Serve cached thumbnail, or generate one if a decode slot frees up in time
+        thumbnail_path = blur_thumbnail_path(uuid)
+        if not os.path.exists(thumbnail_path):
+            if not _decode_semaphore.acquire(timeout=THUMBNAIL_DECODE_WAIT_SECONDS):
+                response = jsonify({'error': 'Too many thumbnails generating - retry shortly'})
+                response.headers['Retry-After'] = str(THUMBNAIL_DECODE_WAIT_SECONDS)
+                return response, 429
+            try:
+                thumbnail_path = generate_thumbnail(target_photo.path, uuid)
+            finally:
+                _decode_semaphore.release()
         
         if thumbnail_path and os.path.exists(thumbnail_path):
-            return send_file(thumbnail_path, mimetype='image/jpeg')
+            # Conditional send via nginx or sendfile(2), 304 when the browser's copy is current.
+            # Keyed by UUID rather than content, so revalidate instead of marking immutable.
+            mtime = int(os.path.getmtime(thumbnail_path))
+            return send_thumbnail_file(os.path.relpath(thumbnail_path, THUMBNAIL_DIR), 'image/jpeg',
+                                       f"{uuid}-{mtime}")
         else:
             return jsonify({'error': 'Thumbnail generation failed'}), 500
             
@@ -5740,19 +5250,17 @@ def api_get_thumbnail(uuid):
         print(f"❌ Error serving thumbnail for {uuid}: {e}")
         return jsonify({'error': str(e)}), 500
 
+def blur_thumbnail_path(uuid):
+    """Cache path of the small thumbnail shown in blur analysis results."""
+    return thumbnail_shard_path(os.path.join(THUMBNAIL_DIR, 'blur_analysis'), uuid)
+
 def generate_thumbnail(photo_path, uuid, size=(200, 200)):
     """Generate a thumbnail for a photo."""
     try:
         from PIL import Image
-        import hashlib
         
-        # Create thumbnail directory
-        thumb_dir = os.path.join(THUMBNAIL_DIR, 'blur_analysis')
-        os.makedirs(thumb_dir, exist_ok=True)
-        
-        # Generate thumbnail filename
-        thumb_filename = f"{uuid}_thumb.jpg"
-        thumb_path = os.path.join(thumb_dir, thumb_filename)
+        # Shard directories are created at startup
+        thumb_path = blur_thumbnail_path(uuid)
         
         # Return existing thumbnail if it exists
         if os.path.exists(thumb_path):
@@ -5760,15 +5268,21 @@ def generate_thumbnail(photo_path, uuid, size=(200, 200)):
         
         # Generate new thumbnail
         with Image.open(photo_path) as img:
-            # Convert to RGB if necessary (handles HEIC, PNG with transparency, etc.)
-            if img.mode != 'RGB':
+            # Palette/16-bit images need RGB before filtering; everything else converts once shrunk
+            if img.mode not in THUMBNAIL_RESAMPLE_MODES:
                 img = img.convert('RGB')
             
             # Create thumbnail
-            img.thumbnail(size, Image.Resampling.LANCZOS)
+            img.thumbnail(size, BLUR_THUMBNAIL_RESAMPLE)
+            
+            # Convert to RGB if necessary (handles HEIC, PNG with transparency, etc.)
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
             
             # Save as JPEG
-            img.save(thumb_path, 'JPEG', quality=85, optimize=True)
+            buffer = io.BytesIO()
+            img.save(buffer, 'JPEG', quality=85, progressive=False, subsampling='4:2:0')
+            atomic_write(thumb_path, buffer.getvalue())
             
             return thumb_path
             
@@ -5861,6 +5375,29 @@ def api_health():
         'version': '1.0.0'
     })
 
+def start_background_services():
+    """Start the helpers that must run once per serving process (dev server, wsgi.py or a forked gunicorn worker)."""
+    global thumbnail_log_listener, thumbnail_log_listener_pid
+    if thumbnail_log_listener_pid == os.getpid():
+        return
+    if thumbnail_log_listener_pid is not None:
+        # Forked from a preloaded gunicorn master - the listener thread didn't survive the fork
+        thumbnail_log_listener = QueueListener(thumbnail_log_queue, *thumbnail_log_listener.handlers)
+    thumbnail_log_listener.start()
+    thumbnail_log_listener_pid = os.getpid()
+    threading.Thread(target=warm_thumbnail_dirs, name='thumbnail-dir-warmup', daemon=True).start()
+
+def warm_thumbnail_dirs():
+    """List every thumbnail shard once, so the first lookups after startup hit a warm dentry cache."""
+    for shard in THUMBNAIL_SHARDS:
+        for base_dir in (THUMBNAIL_DIR, os.path.join(THUMBNAIL_DIR, 'blur_analysis')):
+            try:
+                with os.scandir(os.path.join(base_dir, shard)) as entries:
+                    for _ in entries:
+                        pass
+            except OSError:
+                pass
+
 if __name__ == '__main__':
     print("🚀 Starting RemoveBadPhotos - Blur Detection Tool")
     print("🔍 NEW: Computer vision blur detection with configurable thresholds!")
@@ -5870,5 +5407,11 @@ if __name__ == '__main__':
     print(f"📁 Thumbnails cached in: {THUMBNAIL_DIR}")
     print("=" * 60)
     
-    # Run Flask app
-    app.run(host='127.0.0.1', port=5003, debug=True)
\ No newline at end of file
+    start_background_services()
+    
+    # SIGHUP drops the in-memory thumbnail cache without a restart
+    signal.signal(signal.SIGHUP, lambda signum, frame: cached_photo_thumbnail.cache_clear())
+    
+    # Run Flask app - the Werkzeug debugger/reloader only with FLASK_DEBUG=1 (make dev).
+    # For anything beyond local use, serve wsgi.py with gunicorn instead.
+    app.run(host='127.0.0.1', port=5003, debug=os.environ.get('FLASK_DEBUG') == '1', threaded=True)
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+gunicorn settings for RemoveBadPhotos:
+
+    gunicorn -c gunicorn_conf.py wsgi:app        (or: make serve)
+
+Defaults to one gthread worker with 8 threads. Thumbnail decoding runs on real
+threads, and Pillow/OpenCV release the GIL while they work.
+
+GUNICORN_WORKER_CLASS=gevent switches to greenlets. Each worker then holds
+thousands of idle /api/progress/stream connections without a thread apiece,
+but CPU-bound thumbnail work no longer overlaps within a worker.
+
+WEB_CONCURRENCY sets the number of worker processes. Only raise it above 1 when
+PROGRESS_REDIS_URL (or CELERY_BROKER_URL) is set, so that progress and
+analysis results are shared between workers.
+"""
+
+import os
+
+bind = os.environ.get('BIND', '127.0.0.1:5003')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+threads = 8
+worker_connections = 1000
+timeout = 300
+
+# Import the app once in the master - pillow_heif registration, PhotoScanner and the
+# analyzers are initialized once and shared copy-on-write with the forked workers
+preload_app = True
+
+if worker_class == 'gevent':
+    # Patch before wsgi:app is preloaded, so the locks and queues it creates at import are cooperative
+    from gevent import monkey
+    monkey.patch_all()
+
+def post_fork(server, worker):
+    """Threads don't survive fork - restart the per-process helpers in each worker."""
+    from app import start_background_services
+    start_background_services()
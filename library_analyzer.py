@@ -61,14 +61,12 @@ class LibraryAnalyzer:
     """Fast metadata-only analysis for heatmap generation."""
     
     def __init__(self):
-        self.photosdb = None
         self.scanner = None
         
     def get_photosdb(self):
-        """Get or create PhotosDB connection."""
-        if self.photosdb is None:
-            self.photosdb = osxphotos.PhotosDB()
-        return self.photosdb
+        """Get the PhotosDB connection shared with PhotoScanner."""
+        from photo_scanner import get_shared_photosdb
+        return get_shared_photosdb()
     
     def get_photo_scanner(self):
         """Get or create PhotoScanner instance for filtering."""
@@ -5,17 +5,232 @@ Handles metadata extraction, time-based grouping, and similarity detection
 """
 
 import osxphotos
-from dataclasses import dataclass
-from typing import List, Dict, Optional, Tuple, Set
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import List, Dict, Optional, Tuple, Set, Callable
 from datetime import datetime, timedelta
-import imagehash
 from PIL import Image
 import hashlib
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+import copy
 import os
 import json
+import tempfile
+import threading
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# One PhotosDB per process - opening it parses Photos.sqlite, which is slow on big libraries
+_shared_photosdb = None
+_photosdb_lock = threading.RLock()
+
+def get_shared_photosdb():
+    """Get or create the process-wide PhotosDB connection."""
+    global _shared_photosdb
+    with _photosdb_lock:
+        if _shared_photosdb is None:
+            _shared_photosdb = osxphotos.PhotosDB()
+        return _shared_photosdb
+
+def reset_shared_photosdb():
+    """Drop the shared PhotosDB so the next caller reopens the library."""
+    global _shared_photosdb
+    with _photosdb_lock:
+        _shared_photosdb = None
+    clear_metadata_cache()
+
+# extract_photo_metadata() results by UUID, least recently used first - every exif_info/albums/keywords
+# read goes back to the Photos database, and the endpoints re-extract the same photos run after run
+METADATA_CACHE_SIZE = 200_000
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
+# Threads for extract_photo_metadata_batch - the time goes to Photos database / EXIF reads, not Python
+METADATA_WORKERS = 8
+
+def clear_metadata_cache():
+    """Forget extracted metadata, e.g. when the library is reopened."""
+    with _metadata_cache_lock:
+        _metadata_cache.clear()
+
+def _dct_basis(size: int = 32, keep: int = 8) -> np.ndarray:
+    """First `keep` rows of the orthonormal DCT-II matrix (same scaling as cv2.dct)."""
+    n = np.arange(size)
+    basis = np.cos(np.pi * (2 * n[None, :] + 1) * np.arange(keep)[:, None] / (2 * size))
+    basis *= np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+# Low-frequency 8x8 block of a 32x32 DCT, for every photo at once: D @ X @ D.T
+_PHASH_DCT = _dct_basis()
+
+# Decoded luma of images only PIL can open (HEIC via libheif is 5-10x slower than JPEG),
+# kept as .npy so repeat analyses memory-map it instead of decoding again
+LUMA_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'photo_dedup_luma')
+LUMA_CACHE_SIZE = 512  # Longest side, aspect ratio kept; covers quality analysis (512) and hashing (32)
+
+# Optional BK-tree index for large hash sets
+try:
+    import pybktree
+except ImportError:
+    pybktree = None
+    print("⚠️ pybktree not available - using dense Hamming matrix for all similarity grouping")
+
+# Below this many hashes the dense XOR matrix beats building a BK-tree
+BKTREE_MIN_HASHES = 500
+
+# Bit count of one int; int.bit_count (Python 3.10+) is a single POPCNT
+_popcount = getattr(int, 'bit_count', None) or (lambda x: bin(x).count('1'))
+
+HASH_EDGE_BLOCK_ROWS = 256  # Rows per parallel edge pass; bounds the edge buffer to 256 x N
+
+# Optional Numba kernel for hash grouping - native code, no GIL, no NxN matrix
+try:
+    import numba
+except ImportError:
+    numba = None
+    print("⚠️ numba not available - hash grouping will use NumPy/BK-tree")
+
+if numba is not None:
+    _M1 = np.uint64(0x5555555555555555)
+    _M2 = np.uint64(0x3333333333333333)
+    _M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+    _H01 = np.uint64(0x0101010101010101)
+    
+    @numba.njit(cache=True)
+    def _popcount64(x):
+        """SWAR popcount; LLVM lowers this to a single POPCNT where available."""
+        x = x - ((x >> np.uint64(1)) & _M1)
+        x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+        x = (x + (x >> np.uint64(4))) & _M4
+        return (x * _H01) >> np.uint64(56)
+    
+    @numba.njit(parallel=True, cache=True)
+    def _hash_edges(hashes, threshold, start, stop):
+        """Pairs (i, j > i) within threshold bits for rows start..stop-1, as CSR offsets + j.
+        
+        Rows are counted in parallel, then filled in parallel at their prefix-sum offsets,
+        so no thread ever appends to shared state.
+        """
+        n = hashes.shape[0]
+        rows = stop - start
+        counts = np.zeros(rows, dtype=np.int64)
+        for r in numba.prange(rows):
+            i = start + r
+            found = 0
+            for j in range(i + 1, n):
+                if _popcount64(hashes[i] ^ hashes[j]) <= threshold:
+                    found += 1
+            counts[r] = found
+        offsets = np.zeros(rows + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        neighbours = np.empty(offsets[rows], dtype=np.int64)
+        for r in numba.prange(rows):
+            i = start + r
+            k = offsets[r]
+            for j in range(i + 1, n):
+                if _popcount64(hashes[i] ^ hashes[j]) <= threshold:
+                    neighbours[k] = j
+                    k += 1
+        return offsets, neighbours
+    
+    @numba.njit(cache=True)
+    def _find_root(parent, i):
+        """Union-find root of i, halving the path on the way up."""
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    
+    @numba.njit(cache=True)
+    def _union_hash_edges(parent, start, offsets, neighbours):
+        """Merge every edge from _hash_edges; the smaller index becomes the root."""
+        for r in range(offsets.shape[0] - 1):
+            for k in range(offsets[r], offsets[r + 1]):
+                root_i = _find_root(parent, start + r)
+                root_j = _find_root(parent, neighbours[k])
+                if root_i < root_j:
+                    parent[root_j] = root_i
+                elif root_j < root_i:
+                    parent[root_i] = root_j
+    
+    @numba.njit(cache=True)
+    def _root_labels(parent):
+        """Final root of every index - the smallest index in its component."""
+        labels = np.empty(parent.shape[0], dtype=np.int64)
+        for i in range(parent.shape[0]):
+            labels[i] = _find_root(parent, i)
+        return labels
+    
+    def _assign_hash_groups(hashes, threshold):
+        """Connected-component labels for hashes linked within threshold bits.
+        
+        The O(N^2) pairwise popcounts run in parallel a block of rows at a time; the
+        resulting edges are merged by a serial union-find, so chains of near-duplicates
+        (bursts, slow pans) cost one sweep however long they are. Blocks bound the edge
+        buffer when many hashes are near-identical.
+        """
+        n = hashes.shape[0]
+        parent = np.arange(n)
+        for start in range(0, n, HASH_EDGE_BLOCK_ROWS):
+            offsets, neighbours = _hash_edges(hashes, threshold, start, min(start + HASH_EDGE_BLOCK_ROWS, n))
+            _union_hash_edges(parent, start, offsets, neighbours)
+        return _root_labels(parent)
+    
+    @numba.njit(cache=True)
+    def _sweep_time_windows(window_end):
+        """Native version of _sweep_time_windows_py."""
+        n = window_end.shape[0]
+        starts = np.empty(n, dtype=np.int64)
+        ends = np.empty(n, dtype=np.int64)
+        count = 0
+        k = 0
+        while k < n:
+            end = window_end[k]
+            if end - k > 1:
+                starts[count] = k
+                ends[count] = end
+                count += 1
+                k = end
+            else:
+                k += 1
+        return starts[:count], ends[:count]
+    
+    # Compile once at import so the first analysis doesn't pay the JIT cost
+    try:
+        _assign_hash_groups(np.zeros(2, dtype=np.uint64), np.uint64(0))
+        _sweep_time_windows(np.zeros(1, dtype=np.int64))
+    except Exception as e:
+        print(f"⚠️ numba hash grouping unavailable: {e}")
+        numba = None
+
+def _fit_within(luma: np.ndarray, size: int) -> np.ndarray:
+    """Downscale so the longest side is at most size, keeping the aspect ratio."""
+    height, width = luma.shape[:2]
+    scale = size / max(height, width)
+    if scale >= 1.0:
+        return luma
+    return cv2.resize(luma, (max(1, round(width * scale)), max(1, round(height * scale))),
+                      interpolation=cv2.INTER_AREA)
+
+def _sweep_time_windows_py(window_end: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Greedy [start, end) runs over one-camera, time-sorted photos.
+    
+    window_end[k] is one past the last photo within the time window of photo k. From each
+    start the whole window becomes a group if it holds 2+ photos, and the sweep resumes after it.
+    """
+    starts, ends = [], []
+    k, n = 0, len(window_end)
+    while k < n:
+        end = int(window_end[k])
+        if end - k > 1:
+            starts.append(k)
+            ends.append(end)
+            k = end
+        else:
+            k += 1
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
 
 @dataclass
 class PhotoData:
@@ -45,10 +260,36 @@ class PhotoData:
     # Optional fields with defaults
     original_filename: Optional[str] = None
     perceptual_hash: Optional[str] = None
+    phash_int: Optional[int] = None  # 64-bit pHash, hex form kept in perceptual_hash
     quality_score: float = 0.0
     quality_method: str = "unknown"  # "favorite", "quality", "inferred quality", "unknown"
     is_favorite: bool = False
     analyzed: bool = False
+    
+    # Pre-formatted for API responses so serialization doesn't call isoformat() per request
+    timestamp_iso: Optional[str] = field(default=None, repr=False)
+    # JSON-ready static fields; quality/recommendation are merged in per response
+    api_fields: Dict = field(default=None, repr=False, compare=False)
+    
+    def __post_init__(self):
+        if self.timestamp_iso is None and self.timestamp is not None:
+            self.timestamp_iso = self.timestamp.isoformat()
+        if self.api_fields is None:
+            self.api_fields = {
+                'uuid': self.uuid,
+                'filename': self.original_filename or self.filename,
+                'original_filename': self.original_filename,
+                'timestamp': self.timestamp_iso,
+                'camera_model': self.camera_model,
+                'file_size': self.file_size,
+                'width': self.width,
+                'height': self.height,
+                'format': self.format,
+                'organization_score': self.organization_score,
+                'albums': self.albums or [],
+                'folder_names': self.folder_names or [],
+                'keywords': self.keywords or []
+            }
 
 @dataclass
 class PhotoGroup:
@@ -61,19 +302,48 @@ class PhotoGroup:
     camera_model: str
     total_size_bytes: int
     potential_savings_bytes: int
+    
+    # Display sizes, fixed once the group is formed
+    total_size_mb: float = field(default=None)
+    potential_savings_mb: float = field(default=None)
+    
+    def __post_init__(self):
+        if self.total_size_mb is None:
+            self.total_size_mb = round(self.total_size_bytes / (1024 * 1024), 2)
+        if self.potential_savings_mb is None:
+            self.potential_savings_mb = round(self.potential_savings_bytes / (1024 * 1024), 2)
 
 class PhotoScanner:
     """Main photo scanning and analysis engine."""
     
     def __init__(self):
-        self.photosdb = None
         self._photo_cache = {}
         
     def get_photosdb(self):
-        """Get or create PhotosDB connection."""
-        if self.photosdb is None:
-            self.photosdb = osxphotos.PhotosDB()
-        return self.photosdb
+        """Get the shared PhotosDB connection (opened once per process)."""
+        return get_shared_photosdb()
+    
+    @cached_property
+    def photos_by_uuid(self) -> Dict[str, object]:
+        """Index of osxphotos PhotoInfo objects by UUID, built once per library load."""
+        db = self.get_photosdb()
+        return {p.uuid: p for p in db.photos(intrash=False, movies=False)}
+    
+    @cached_property
+    def media_by_uuid(self) -> Dict[str, object]:
+        """Like photos_by_uuid but videos included - clusters can hold video members."""
+        db = self.get_photosdb()
+        return {p.uuid: p for p in db.photos(intrash=False)}
+    
+    def clear_photo_index(self):
+        """Drop the memoized UUID indexes so the next lookup re-reads the library."""
+        self.__dict__.pop('photos_by_uuid', None)
+        self.__dict__.pop('media_by_uuid', None)
+    
+    def reset_photosdb(self):
+        """Reopen the Photos library on next use and drop everything derived from it."""
+        reset_shared_photosdb()
+        self.clear_photo_index()
     
     def get_unprocessed_photos(self, include_videos: bool = False):
         """Get photos excluding those in trash and already marked for deletion."""
@@ -162,73 +432,20 @@ class PhotoScanner:
         return photos, total_excluded
     
     def extract_photo_metadata(self, photo) -> PhotoData:
-        """Extract metadata from osxphotos Photo object."""
+        """Extract metadata from osxphotos Photo object (memoized per UUID, bounded by METADATA_CACHE_SIZE).
+        
+        Each call returns its own copy, so analysis results set on one run's PhotoData
+        (quality scores, hashes) don't leak into the next.
+        """
+        with _metadata_cache_lock:
+            cached = _metadata_cache.get(photo.uuid)
+            if cached is not None:
+                _metadata_cache.move_to_end(photo.uuid)
+        if cached is not None:
+            return copy.copy(cached)
+        
         try:
-            # Get basic metadata
-            uuid = photo.uuid
-            filename = photo.filename or photo.original_filename or f"{uuid}.unknown"
-            timestamp = photo.date
-            path = photo.path
-            
-            # Get camera info
-            camera_make = None
-            camera_model = None
-            if photo.exif_info:
-                camera_make = getattr(photo.exif_info, 'camera_make', None)
-                camera_model = getattr(photo.exif_info, 'camera_model', None)
-            
-            # Get technical properties
-            file_size = photo.original_filesize or 0  # Use original_filesize for accurate size
-            width = photo.width or 0
-            height = photo.height or 0
-            
-            if photo.original_filename:
-                format_str = photo.original_filename.split('.')[-1].upper() if '.' in photo.original_filename else "unknown"
-            elif photo.filename:
-                format_str = photo.filename.split('.')[-1].upper() if '.' in photo.filename else "unknown"
-            else:
-                format_str = "unknown"
-            
-            # Get organization metadata
-            albums = list(photo.albums) if photo.albums else []
-            folder_names = []
-            keywords = list(photo.keywords) if photo.keywords else []
-            
-            # Extract folder information from path
-            if path:
-                path_parts = path.split('/')
-                # Look for meaningful folder names (skip system folders)
-                meaningful_folders = []
-                for part in path_parts:
-                    if part and not part.startswith('.') and part not in ['Users', 'Pictures', 'Photos']:
-                        meaningful_folders.append(part)
-                folder_names = meaningful_folders[-3:] if len(meaningful_folders) > 3 else meaningful_folders
-            
-            # Calculate organization score
-            org_score = self.calculate_organization_score(albums, folder_names, keywords, path)
-            
-            # Check if photo is marked as favorite
-            is_favorite = getattr(photo, 'favorite', False)
-            
-            return PhotoData(
-                uuid=uuid,
-                path=path,
-                filename=filename,
-                original_filename=photo.original_filename,
-                timestamp=timestamp,
-                camera_model=camera_model,
-                camera_make=camera_make,
-                file_size=file_size,
-                width=width,
-                height=height,
-                format=format_str,
-                albums=albums,
-                folder_names=folder_names,
-                keywords=keywords,
-                organization_score=org_score,
-                is_favorite=is_favorite
-            )
-            
+            photo_data = self._extract_photo_metadata(photo)
         except Exception as e:
             print(f"Error extracting metadata for photo {photo.uuid}: {e}")
             # Return minimal data structure to avoid breaking
@@ -249,6 +466,84 @@ class PhotoScanner:
                 keywords=[],
                 organization_score=0.0
             )
+        
+        with _metadata_cache_lock:
+            _metadata_cache[photo.uuid] = copy.copy(photo_data)
+            if len(_metadata_cache) > METADATA_CACHE_SIZE:
+                _metadata_cache.popitem(last=False)
+        return photo_data
+    
+    def extract_photo_metadata_batch(self, photos) -> List[PhotoData]:
+        """extract_photo_metadata() for many photos on METADATA_WORKERS threads, in input order."""
+        with ThreadPoolExecutor(max_workers=METADATA_WORKERS) as executor:
+            return list(executor.map(self.extract_photo_metadata, photos))
+    
+    def _extract_photo_metadata(self, photo) -> PhotoData:
+        """Read a PhotoData's fields from the osxphotos Photo object."""
+        # Get basic metadata
+        uuid = photo.uuid
+        filename = photo.filename or photo.original_filename or f"{uuid}.unknown"
+        timestamp = photo.date
+        path = photo.path
+        
+        # Get camera info
+        camera_make = None
+        camera_model = None
+        if photo.exif_info:
+            camera_make = getattr(photo.exif_info, 'camera_make', None)
+            camera_model = getattr(photo.exif_info, 'camera_model', None)
+        
+        # Get technical properties
+        file_size = photo.original_filesize or 0  # Use original_filesize for accurate size
+        width = photo.width or 0
+        height = photo.height or 0
+        
+        if photo.original_filename:
+            format_str = photo.original_filename.split('.')[-1].upper() if '.' in photo.original_filename else "unknown"
+        elif photo.filename:
+            format_str = photo.filename.split('.')[-1].upper() if '.' in photo.filename else "unknown"
+        else:
+            format_str = "unknown"
+        
+        # Get organization metadata
+        albums = list(photo.albums) if photo.albums else []
+        folder_names = []
+        keywords = list(photo.keywords) if photo.keywords else []
+        
+        # Extract folder information from path
+        if path:
+            path_parts = path.split('/')
+            # Look for meaningful folder names (skip system folders)
+            meaningful_folders = []
+            for part in path_parts:
+                if part and not part.startswith('.') and part not in ['Users', 'Pictures', 'Photos']:
+                    meaningful_folders.append(part)
+            folder_names = meaningful_folders[-3:] if len(meaningful_folders) > 3 else meaningful_folders
+        
+        # Calculate organization score
+        org_score = self.calculate_organization_score(albums, folder_names, keywords, path)
+        
+        # Check if photo is marked as favorite
+        is_favorite = getattr(photo, 'favorite', False)
+        
+        return PhotoData(
+            uuid=uuid,
+            path=path,
+            filename=filename,
+            original_filename=photo.original_filename,
+            timestamp=timestamp,
+            camera_model=camera_model,
+            camera_make=camera_make,
+            file_size=file_size,
+            width=width,
+            height=height,
+            format=format_str,
+            albums=albums,
+            folder_names=folder_names,
+            keywords=keywords,
+            organization_score=org_score,
+            is_favorite=is_favorite
+        )
     
     def calculate_organization_score(self, albums: List[str], folder_names: List[str], 
                                    keywords: List[str], path: Optional[str]) -> float:
@@ -340,6 +635,77 @@ class PhotoScanner:
             print(f"Error analyzing image quality for {image_path}: {e}")
             return 0.0, "unknown"
     
+    def analyze_image_quality_batch(self, photos: List[PhotoData], batch_size: int = 64,
+                                    analysis_size: int = 512,
+                                    chunk_callback: Optional[Callable[[int, int], bool]] = None) -> Dict[str, Tuple[float, str]]:
+        """Score image quality for many photos at once. Returns {uuid: (score, method)}.
+        
+        Same metrics and weights as analyze_image_quality, but each photo is decoded
+        to luma with its longest side at analysis_size (aspect ratio kept) in a thread
+        pool, and the metrics are computed with NumPy operations on (N, H, W) stacks of
+        same-shaped photos. Every metric is per image, so a photo's score doesn't depend
+        on which other photos share its batch. chunk_callback(photos_done, photos_pending)
+        runs after every batch; returning False stops early with the scores so far.
+        """
+        results = {}
+        pending = []
+        for photo in photos:
+            if photo.is_favorite:
+                results[photo.uuid] = (100.0, "favorite")
+            elif photo.path and os.path.exists(photo.path):
+                pending.append(photo)
+        
+        def _load(photo):
+            try:
+                return _fit_within(self._load_luma(photo.path, draft_size=analysis_size), analysis_size)
+            except Exception as e:
+                print(f"Error analyzing image quality for {photo.path}: {e}")
+                return None
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                lumas = list(executor.map(_load, chunk))
+                loaded = [(photo, luma) for photo, luma in zip(chunk, lumas) if luma is not None]
+                for photo, luma in zip(chunk, lumas):
+                    if luma is None:
+                        results[photo.uuid] = (0.0, "unknown")
+                if not loaded:
+                    continue
+                
+                # Portrait and landscape photos differ in shape - stack each shape separately
+                by_shape = defaultdict(list)
+                for photo, luma in loaded:
+                    by_shape[luma.shape].append((photo, luma))
+                
+                for same_shape in by_shape.values():
+                    batch = np.stack([luma for _, luma in same_shape]).astype(np.float32)
+                    
+                    # 1. Sharpness: 4-neighbour Laplacian variance per image
+                    laplacian = (batch[:, :-2, 1:-1] + batch[:, 2:, 1:-1] +
+                                 batch[:, 1:-1, :-2] + batch[:, 1:-1, 2:] - 4 * batch[:, 1:-1, 1:-1])
+                    sharpness = np.minimum(laplacian.var(axis=(1, 2)) / 1000.0, 1.0)
+                    
+                    # 2. Brightness - penalize extremes
+                    brightness = 1.0 - np.abs(batch.mean(axis=(1, 2)) - 127.5) / 127.5
+                    
+                    # 3. Resolution from original dimensions (normalized to iPhone max res)
+                    pixels = np.array([photo.width * photo.height for photo, _ in same_shape], dtype=np.float64)
+                    resolution = np.minimum(pixels / (4032 * 3024), 1.0)
+                    
+                    # 4. Noise - std of the Gaussian-blur residual, blurred one image at a time
+                    blurred = np.stack([cv2.GaussianBlur(image, (5, 5), 0) for image in batch])
+                    noise = np.maximum(0.0, 1.0 - (batch - blurred).std(axis=(1, 2)) / 50.0)
+                    
+                    scores = np.clip((sharpness * 0.4 + brightness * 0.2 + resolution * 0.2 + noise * 0.2) * 100, 0.0, 100.0)
+                    for (photo, _), score in zip(same_shape, scores):
+                        results[photo.uuid] = (float(score), "quality")
+                
+                if chunk_callback and not chunk_callback(start + len(chunk), len(pending)):
+                    break
+        
+        return results
+    
     def scan_photos(self, limit: Optional[int] = None, prioritize_accessible: bool = True) -> List[PhotoData]:
         """Scan Photos library and extract metadata for all photos."""
         print("📡 Scanning Photos library...")
@@ -410,78 +776,164 @@ class PhotoScanner:
         valid_photos.sort(key=lambda p: p.timestamp)
         
         groups = []
-        used_photos = set()
+        if not valid_photos:
+            print("✅ Created 0 photo groups")
+            return groups
         
-        for i, base_photo in enumerate(valid_photos):
-            if base_photo.uuid in used_photos:
-                continue
-                
-            # Find photos within time window and same camera
-            group_photos = [base_photo]
-            time_window_end = base_photo.timestamp + timedelta(seconds=time_window_seconds)
+        # Photos only group with their own camera, so lay them out camera by camera (time order
+        # within each) and find every photo's window end with one binary search per camera
+        n = len(valid_photos)
+        camera_codes = {}
+        cameras = np.fromiter((camera_codes.setdefault(p.camera_model, len(camera_codes)) for p in valid_photos),
+                              dtype=np.int64, count=n)
+        times_us = np.fromiter((round(p.timestamp.timestamp() * 1_000_000) for p in valid_photos),
+                               dtype=np.int64, count=n)
+        order = np.lexsort((np.arange(n), cameras))
+        cameras, times_us = cameras[order], times_us[order]
+        
+        window_end = np.empty(n, dtype=np.int64)
+        segment_starts = np.flatnonzero(np.r_[True, cameras[1:] != cameras[:-1]])
+        for seg_start, seg_end in zip(segment_starts, np.r_[segment_starts[1:], n]):
+            segment = times_us[seg_start:seg_end]
+            window_end[seg_start:seg_end] = seg_start + np.searchsorted(
+                segment, segment + time_window_seconds * 1_000_000, side='right')
+        
+        sweep = _sweep_time_windows if numba is not None else _sweep_time_windows_py
+        starts, ends = sweep(window_end)
+        
+        # Number groups in order of their first photo, as the time-ordered scan always has
+        for start, end in sorted(zip(starts.tolist(), ends.tolist()), key=lambda run: order[run[0]]):
+            group_photos = [valid_photos[i] for i in order[start:end]]
+            base_photo = group_photos[0]
             
-            for j, candidate_photo in enumerate(valid_photos[i+1:], i+1):
-                if candidate_photo.uuid in used_photos:
-                    continue
-                    
-                # Check time window
-                if candidate_photo.timestamp > time_window_end:
-                    break  # Photos are sorted, no more candidates
-                
-                # Check camera model match (allow None matches)
-                if (base_photo.camera_model == candidate_photo.camera_model or 
-                    (base_photo.camera_model is None and candidate_photo.camera_model is None)):
-                    group_photos.append(candidate_photo)
-            
-            # Only create group if we have multiple photos
-            if len(group_photos) > 1:
-                # Mark photos as used
-                for photo in group_photos:
-                    used_photos.add(photo.uuid)
-                
-                # Calculate group statistics
-                total_size = sum(p.file_size for p in group_photos)
-                # Assume we keep the largest/newest photo, save the rest
-                potential_savings = total_size - max((p.file_size for p in group_photos), default=0)
-                
-                # Recommend newest photo (latest timestamp)
-                recommended_photo = max(group_photos, key=lambda p: p.timestamp)
-                
-                group = PhotoGroup(
-                    group_id=f"group_{len(groups)+1:04d}",
-                    photos=group_photos,
-                    recommended_photo_uuid=recommended_photo.uuid,
-                    time_window_start=base_photo.timestamp,
-                    time_window_end=group_photos[-1].timestamp,
-                    camera_model=base_photo.camera_model or "Unknown",
-                    total_size_bytes=total_size,
-                    potential_savings_bytes=potential_savings
-                )
-                
-                groups.append(group)
+            # Calculate group statistics
+            total_size = sum(p.file_size for p in group_photos)
+            # Assume we keep the largest/newest photo, save the rest
+            potential_savings = total_size - max((p.file_size for p in group_photos), default=0)
+            
+            # Recommend newest photo (latest timestamp)
+            recommended_photo = max(group_photos, key=lambda p: p.timestamp)
+            
+            group = PhotoGroup(
+                group_id=f"group_{len(groups)+1:04d}",
+                photos=group_photos,
+                recommended_photo_uuid=recommended_photo.uuid,
+                time_window_start=base_photo.timestamp,
+                time_window_end=group_photos[-1].timestamp,
+                camera_model=base_photo.camera_model or "Unknown",
+                total_size_bytes=total_size,
+                potential_savings_bytes=potential_savings
+            )
+            
+            groups.append(group)
         
         print(f"✅ Created {len(groups)} photo groups")
         return groups
     
-    def compute_perceptual_hash(self, photo_data: PhotoData) -> Optional[str]:
-        """Compute perceptual hash for similarity detection."""
-        if not photo_data.path or not os.path.exists(photo_data.path):
-            return None
-            
+    def _load_luma(self, path: str, draft_size: int = 64) -> Optional[np.ndarray]:
+        """Decode an image straight to single-channel luma for hashing/quality analysis."""
+        luma = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if luma is not None:
+            return luma
+        
+        # OpenCV can't decode HEIC and friends - fall back to PIL (pillow_heif registers the opener)
+        if draft_size <= LUMA_CACHE_SIZE:
+            return self._cached_luma(path)
+        with Image.open(path) as img:
+            img.draft('L', (draft_size, draft_size))
+            return np.asarray(img.convert('L'))
+    
+    def _cached_luma(self, path: str) -> np.ndarray:
+        """Luma decoded by PIL, longest side LUMA_CACHE_SIZE, memory-mapped from LUMA_CACHE_DIR after the first decode."""
+        stat = os.stat(path)
+        # "fit" keeps entries from the old square (stretched) layout from being reused
+        key = hashlib.blake2b(f"{path}:{stat.st_mtime_ns}:{stat.st_size}:fit".encode(), digest_size=16).hexdigest()
+        cache_path = os.path.join(LUMA_CACHE_DIR, f"{key}.npy")
         try:
-            # Open image and compute hash
-            with Image.open(photo_data.path) as img:
-                # Convert to RGB if needed
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # Compute perceptual hash
-                hash_obj = imagehash.phash(img)
-                return str(hash_obj)
+            return np.load(cache_path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+        
+        with Image.open(path) as img:
+            img.draft('L', (LUMA_CACHE_SIZE, LUMA_CACHE_SIZE))
+            luma = _fit_within(np.asarray(img.convert('L')), LUMA_CACHE_SIZE)
+        
+        try:
+            # Write then rename, so a concurrent reader never maps a half-written file
+            os.makedirs(LUMA_CACHE_DIR, exist_ok=True)
+            temp_path = f"{cache_path[:-4]}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            np.save(temp_path, luma)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️ Could not cache decoded luma for {path}: {e}")
+        return luma
+    
+    def _phash_input(self, path: str) -> np.ndarray:
+        """32x32 float32 luma of an image file, decoded at 1/8 scale where the codec allows it."""
+        luma = cv2.imread(path, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if luma is None:
+            luma = self._load_luma(path)
+        return cv2.resize(luma, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    
+    @staticmethod
+    def _phash_batch(inputs: np.ndarray) -> List[int]:
+        """64-bit DCT perceptual hashes for a (N, 32, 32) stack of luma thumbnails."""
+        low_freq = (_PHASH_DCT @ inputs @ _PHASH_DCT.T).reshape(len(inputs), 64)
+        
+        # Threshold against the median of the low-frequency block, ignoring the DC term
+        bits = low_freq > np.median(low_freq[:, 1:], axis=1, keepdims=True)
+        return [int(h) for h in np.packbits(bits, axis=1).view('>u8').ravel()]
+    
+    def compute_phashes(self, photos: List[PhotoData], batch_size: int = 256,
+                        chunk_callback: Optional[Callable[[int, int], bool]] = None) -> int:
+        """Compute perceptual hashes for a batch of photos in parallel.
+        
+        Hashes are cached on each PhotoData (phash_int + hex perceptual_hash) so
+        later grouping and similarity passes reuse them. Returns the number of
+        newly hashed photos. Photos are decoded batch_size at a time;
+        chunk_callback(photos_done, photos_pending) runs after every batch and
+        returning False stops early, leaving the rest unhashed.
+        """
+        pending = [p for p in photos
+                   if p.phash_int is None and p.path and os.path.exists(p.path)]
+        if not pending:
+            return 0
+        
+        def _load(photo):
+            try:
+                return self._phash_input(photo.path)
+            except Exception as e:
+                print(f"Error computing hash for {photo.filename}: {e}")
+                return None
+        
+        # OpenCV releases the GIL during decode/resize, so threads scale across cores;
+        # the DCT then runs once per batch as two matrix products
+        hashed = 0
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            for start in range(0, len(pending), batch_size):
+                chunk = pending[start:start + batch_size]
+                inputs = list(executor.map(_load, chunk))
+                loaded = [(photo, luma) for photo, luma in zip(chunk, inputs) if luma is not None]
+                if loaded:
+                    hashes = self._phash_batch(np.stack([luma for _, luma in loaded]))
+                    for (photo, _), phash in zip(loaded, hashes):
+                        photo.phash_int = phash
+                        photo.perceptual_hash = f"{phash:016x}"
+                    hashed += len(loaded)
                 
-        except Exception as e:
-            print(f"Error computing hash for {photo_data.filename}: {e}")
-            return None
+                if chunk_callback and not chunk_callback(start + len(chunk), len(pending)):
+                    break
+        
+        print(f"🔑 Computed perceptual hashes for {hashed}/{len(pending)} photos")
+        return hashed
+    
+    def compute_perceptual_hash(self, photo_data: PhotoData) -> Optional[str]:
+        """Compute perceptual hash for similarity detection."""
+        if photo_data.perceptual_hash:
+            return photo_data.perceptual_hash
+        
+        self.compute_phashes([photo_data])
+        return photo_data.perceptual_hash
     
     def calculate_visual_similarity(self, hash1: str, hash2: str) -> float:
         """Calculate visual similarity between two perceptual hashes.
@@ -490,12 +942,8 @@ class PhotoScanner:
             return 0.0
         
         try:
-            # Convert hash strings back to imagehash objects
-            h1 = imagehash.hex_to_hash(hash1)
-            h2 = imagehash.hex_to_hash(hash2)
-            
-            # Calculate Hamming distance
-            hamming_distance = h1 - h2
+            # Hamming distance straight from the 64-bit hex, no imagehash objects
+            hamming_distance = _popcount(int(hash1, 16) ^ int(hash2, 16))
             
             # Convert to similarity percentage
             # phash produces 64-bit hashes, so max distance is 64
@@ -508,6 +956,45 @@ class PhotoScanner:
             print(f"Error calculating similarity between hashes {hash1} and {hash2}: {e}")
             return 0.0
     
+    @staticmethod
+    def hamming_distance_matrix(hashes: np.ndarray) -> np.ndarray:
+        """Pairwise Hamming distances between 64-bit hashes (uint64 array) as an NxN matrix."""
+        xor = hashes[:, None] ^ hashes[None, :]
+        if hasattr(np, 'bitwise_count'):  # numpy >= 2.0 maps this to hardware POPCNT
+            return np.bitwise_count(xor).astype(np.int32)
+        return np.unpackbits(xor[..., None].view(np.uint8), axis=-1).sum(axis=-1, dtype=np.int32)
+    
+    def cluster_hashes(self, hashes: np.ndarray, max_distance: int) -> np.ndarray:
+        """Label hashes by connected component, linking pairs within max_distance bits."""
+        if numba is not None:
+            return _assign_hash_groups(hashes, np.uint64(max_distance))
+        
+        if len(hashes) < BKTREE_MIN_HASHES or pybktree is None:
+            # Only this no-numba path needs scipy, so it isn't imported at module load
+            from scipy.sparse.csgraph import connected_components
+            adjacency = self.hamming_distance_matrix(hashes) <= max_distance
+            _, labels = connected_components(adjacency, directed=False)
+            return labels
+        
+        # BK-tree: each lookup only visits subtrees that can hold a match (~O(log N))
+        parent = list(range(len(hashes)))
+        
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        
+        items = [(int(h), i) for i, h in enumerate(hashes)]
+        tree = pybktree.BKTree(lambda a, b: _popcount(a[0] ^ b[0]), items)
+        for item in items:
+            for _, (_, j) in tree.find(item, max_distance):
+                root_i, root_j = find(item[1]), find(j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+        
+        return np.array([find(i) for i in range(len(hashes))])
+    
     def analyze_photo_quality(self, photo_data: PhotoData) -> tuple[float, str]:
         """Enhanced quality assessment including organization metadata."""
         # Check for favorite first - favorites get max score
@@ -569,6 +1056,53 @@ class PhotoScanner:
         total_photos = sum(len(group.photos) for group in groups)
         photos_processed = 0
         
+        def chunk_reporter(step, tooltip):
+            """chunk_callback for the batch passes: report progress, stop once cancelled."""
+            def report(done, pending):
+                if progress_status.get('cancelled', False):
+                    return False
+                if progress_callback:
+                    progress_callback(
+                        step=step,
+                        progress=3,
+                        total=4,
+                        tooltip=tooltip,
+                        current_operation=step,
+                        items_processed=done,
+                        total_items=pending
+                    )
+                return True
+            return report
+        
+        # Hash every pending photo up front in parallel batches
+        if progress_status.get('cancelled', False):
+            return enhanced_groups
+        if progress_callback:
+            progress_callback(
+                step="Computing perceptual hashes",
+                progress=3,
+                total=4,
+                tooltip="Computing perceptual hashes for all grouped photos in parallel...",
+                current_operation="Computing perceptual hashes",
+                items_processed=0,
+                total_items=total_photos
+            )
+        self.compute_phashes([p for group in groups for p in group.photos if not p.analyzed],
+                             chunk_callback=chunk_reporter("Computing perceptual hashes",
+                                                           "Computing perceptual hashes for all grouped photos in parallel..."))
+        if progress_status.get('cancelled', False):
+            print("🛑 Analysis cancelled during perceptual hashing")
+            return enhanced_groups
+        
+        # Score image quality for all pending photos in vectorized batches
+        image_quality = self.analyze_image_quality_batch(
+            [p for group in groups for p in group.photos if not p.analyzed],
+            chunk_callback=chunk_reporter("Analyzing image quality",
+                                          "Decoding photos and scoring sharpness, exposure and noise in batches..."))
+        if progress_status.get('cancelled', False):
+            print("🛑 Analysis cancelled during image quality scoring")
+            return enhanced_groups
+        
         for group_idx, group in enumerate(groups):
             # Check for cancellation at group level (check both cancelled flag and active status)
             # Refresh progress status to get current values
@@ -612,12 +1146,9 @@ class PhotoScanner:
                             total_items=total_photos
                         )
                     
-                    photo.perceptual_hash = self.compute_perceptual_hash(photo)
-                    
-                    # Try image-based quality analysis first, fallback to metadata-based
-                    if photo.path and os.path.exists(photo.path):
-                        print(f"🔍 Analyzing image quality for {photo.filename}...")
-                        photo.quality_score, photo.quality_method = self.analyze_image_quality(photo.path, photo)
+                    # Use the batched image-based score if we have one, fallback to metadata-based
+                    if photo.uuid in image_quality:
+                        photo.quality_score, photo.quality_method = image_quality[photo.uuid]
                     else:
                         # Fallback to metadata-based quality analysis
                         photo.quality_score, photo.quality_method = self.analyze_photo_quality(photo)
@@ -661,12 +1192,9 @@ class PhotoScanner:
             print(f"📸 Analyzing visual similarity in group {group.group_id} ({len(group.photos)} photos)")
             
             # Compute perceptual hashes for all photos if not already done
+            self.compute_phashes(group.photos)
             photos_with_hashes = []
             for photo in group.photos:
-                if not photo.perceptual_hash:
-                    if photo.path and os.path.exists(photo.path):
-                        photo.perceptual_hash = self.compute_perceptual_hash(photo)
-                
                 if photo.perceptual_hash:
                     photos_with_hashes.append(photo)
                 else:
@@ -678,33 +1206,16 @@ class PhotoScanner:
                 refined_groups.append(group)
                 continue
             
-            # Group photos by visual similarity
-            subgroups = []
-            used_photos = set()
+            # Group photos by visual similarity: threshold the pairwise Hamming
+            # matrix into an adjacency mask and take its connected components
+            max_distance = int((1.0 - similarity_threshold / 100.0) * 64)
+            hashes = np.fromiter((int(p.perceptual_hash, 16) for p in photos_with_hashes),
+                                 dtype=np.uint64, count=len(photos_with_hashes))
+            labels = self.cluster_hashes(hashes, max_distance)
             
-            for i, base_photo in enumerate(photos_with_hashes):
-                if base_photo.uuid in used_photos:
-                    continue
-                
-                # Start a new subgroup with the base photo
-                similar_photos = [base_photo]
-                used_photos.add(base_photo.uuid)
-                
-                # Find photos similar to the base photo
-                for j, candidate_photo in enumerate(photos_with_hashes[i+1:], i+1):
-                    if candidate_photo.uuid in used_photos:
-                        continue
-                    
-                    # Calculate visual similarity
-                    similarity = self.calculate_visual_similarity(
-                        base_photo.perceptual_hash, 
-                        candidate_photo.perceptual_hash
-                    )
-                    
-                    if similarity >= similarity_threshold:
-                        similar_photos.append(candidate_photo)
-                        used_photos.add(candidate_photo.uuid)
-                        print(f"  📊 {candidate_photo.filename} is {similarity:.1f}% similar to {base_photo.filename}")
+            subgroups = []
+            for component in np.unique(labels):
+                similar_photos = [photos_with_hashes[i] for i in np.flatnonzero(labels == component)]
                 
                 # Create subgroup if we have multiple similar photos
                 if len(similar_photos) > 1:
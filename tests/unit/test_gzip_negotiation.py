@@ -0,0 +1,14 @@
+"""Pre-gzipped responses must honour q-values in Accept-Encoding, not just the substring."""
+import app
+
+
+def test_legacy_page_respects_gzip_q_zero():
+    client = app.app.test_client()
+    assert client.get('/legacy', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding') == 'gzip'
+    assert 'Content-Encoding' not in client.get('/legacy', headers={'Accept-Encoding': 'gzip;q=0, identity'}).headers
+
+
+def test_static_asset_respects_gzip_q_zero():
+    client = app.app.test_client()
+    assert client.get('/assets/legacy.css', headers={'Accept-Encoding': 'gzip'}).headers.get('Content-Encoding') == 'gzip'
+    assert 'Content-Encoding' not in client.get('/assets/legacy.css', headers={'Accept-Encoding': 'gzip;q=0'}).headers
@@ -0,0 +1,17 @@
+"""orjson-backed jsonify() must leave Flask's own JSON users (e.g. the session serializer) working."""
+import pytest
+
+pytest.importorskip('orjson')
+
+import app
+
+
+def test_request_with_orjson_provider():
+    assert type(app.app.json).__name__ == 'OrjsonProvider'
+    response = app.app.test_client().get('/api/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'healthy'
+
+
+def test_unsupported_dumps_options_fall_back_to_stdlib():
+    assert app.app.json.dumps({'b': 1, 'a': 2}, separators=(',', ':')) == '{"a":2,"b":1}'
@@ -0,0 +1,32 @@
+"""/api/thumbnail/<uuid> URLs don't change when the original is edited - responses must revalidate."""
+import os
+import uuid
+
+import app
+
+PHOTO_UUID = str(uuid.uuid4()).upper()
+
+
+def test_cached_thumbnail_is_not_immutable(monkeypatch):
+    thumbnail_path = app.thumbnail_shard_path(app.THUMBNAIL_DIR, PHOTO_UUID)
+    with open(thumbnail_path, 'wb') as f:
+        f.write(b'\xff\xd8\xff\xd9')
+    monkeypatch.setattr(app, 'manifest_thumbnail_path', lambda photo_uuid, size: thumbnail_path)
+    try:
+        client = app.app.test_client()
+        response = client.get(f'/api/thumbnail/{PHOTO_UUID}')
+        assert response.status_code == 200
+        assert not response.cache_control.immutable
+        assert response.cache_control.max_age == app.THUMBNAIL_REVALIDATE_MAX_AGE
+        
+        revalidated = client.get(f'/api/thumbnail/{PHOTO_UUID}', headers={'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
+    finally:
+        os.remove(thumbnail_path)
+
+
+def test_generated_thumbnail_bytes_are_not_immutable():
+    with app.app.test_request_context(f'/api/thumbnail/{PHOTO_UUID}'):
+        response = app.serve_thumbnail_bytes(b'\xff\xd8\xff\xd9')
+    assert not response.cache_control.immutable
+    assert response.cache_control.max_age == app.THUMBNAIL_REVALIDATE_MAX_AGE
@@ -0,0 +1,13 @@
+"""
+WSGI entry point for serving RemoveBadPhotos with a production server.
+
+Analysis progress, caches and the Photos library handle live in module globals,
+so run ONE worker process and scale with threads (Pillow/OpenCV release the GIL
+while decoding). gunicorn_conf.py holds the settings:
+
+    gunicorn -c gunicorn_conf.py wsgi:app
+"""
+
+from app import app, start_background_services
+
+start_background_services()